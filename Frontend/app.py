@@ -22,6 +22,26 @@ from views import (
 import base64
 from pathlib import Path
 
+# Logos are served by Streamlit's static file server (Frontend/static, enabled with
+# server.enableStaticServing) instead of being inlined as base64 into every rerun
+SPLASH_TEMPLATE = Path("Frontend/assets/splash_template.html")
+SPLASH_LOGO = Path("Frontend/static/hamma_logo.png")
+SPLASH_LOGO_URL = "app/static/hamma_logo.png"
+SIDEBAR_LOGO = "Frontend/static/hamma_sidebar.png"
+
+
+@st.cache_resource
+def splash_html():
+    """Splash overlay HTML with the logo filled in (built once per process)"""
+    if st.get_option("server.enableStaticServing"):
+        logo_uri = SPLASH_LOGO_URL
+    else:
+        # no static serving: inline the (downscaled) logo
+        logo_uri = f"data:image/png;base64,{base64.b64encode(SPLASH_LOGO.read_bytes()).decode()}"
+    if SPLASH_TEMPLATE.exists():
+        return SPLASH_TEMPLATE.read_text(encoding='utf-8').replace("{{LOGO_URI}}", logo_uri)
+    return f"<div style='display:flex;align-items:center;gap:0.75rem;padding:0.5rem 0;'><img src='{logo_uri}' width='48' style='border-radius:6px;'/><div><div style='font-size:1.25rem;font-weight:700;color:#1E3A5F;'>Procurement Assistant</div><div style='color:#64748B;font-size:0.9rem;margin-top:2px;'>Onsite procurement recommendations</div></div></div>"
+
 
 def main():
     """Main application entry point"""
@@ -31,35 +51,11 @@ def main():
         # Initialize session state
     init_session_state()
     
-    
-
-    # helper to build data URI for local logo
-    def img_to_data_uri(path: str) -> str:
-        p = Path(path)
-        if not p.exists():
-            return path
-        data = p.read_bytes()
-        mime = "image/png"
-        if p.suffix.lower() in (".jpg", ".jpeg"):
-            mime = "image/jpeg"
-        elif p.suffix.lower() == ".svg":
-            mime = "image/svg+xml"
-        return f"data:{mime};base64,{base64.b64encode(data).decode()}"
-
-    # Load splash HTML template and embed logo data URI; fallback to a simple inline block
-    tpl_path = Path("Frontend/assets/splash_template.html")
-    logo_path = "Frontend/assets/HAMMA_bluebg.png"
-    logo_uri = img_to_data_uri(logo_path)
-    if tpl_path.exists():
-        tpl = tpl_path.read_text(encoding='utf-8')
-        splash_html = tpl.replace("{{LOGO_URI}}", logo_uri)
-        st.markdown(splash_html, unsafe_allow_html=True)
-    else:
-        st.markdown(f"<div style='display:flex;align-items:center;gap:0.75rem;padding:0.5rem 0;'><img src='{logo_uri}' width='48' style='border-radius:6px;'/><div><div style='font-size:1.25rem;font-weight:700;color:#1E3A5F;'>Procurement Assistant</div><div style='color:#64748B;font-size:0.9rem;margin-top:2px;'>Onsite procurement recommendations</div></div></div>", unsafe_allow_html=True)
+    st.markdown(splash_html(), unsafe_allow_html=True)
 
     # Render sidebar navigation
     render_sidebar()
-    st.logo("Frontend/assets/HAMMA.png")
+    st.logo(SIDEBAR_LOGO)
     
     # Route to appropriate view
     if st.session_state.current_page == "Dashboard":
@@ -0,0 +1,83 @@
+"""
+Shopping cart keyed by product ID with incrementally maintained totals
+"""
+
+
+class Cart:
+    """
+    Cart lines keyed by product ID, in the order they were added.
+
+    The total, the per-supplier subtotals and the piece count are updated on every
+    mutation, so adding, changing or removing a line is O(1) and rendering the order
+    summary never re-sums the cart. Change quantities only through the methods below;
+    writing to a line's 'qty' directly would bypass the totals.
+    """
+
+    def __init__(self, lines=None):
+        self._lines = {}
+        self.total = 0.0
+        self.pieces = 0
+        self.supplier_totals = {}
+        self._supplier_lines = {}
+        for line in lines or []:
+            self.add(line, line['qty'])
+
+    def __iter__(self):
+        return iter(self._lines.values())
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __contains__(self, product_id):
+        return product_id in self._lines
+
+    def get(self, product_id):
+        """The cart line for a product, or None"""
+        return self._lines.get(product_id)
+
+    def add(self, product, qty):
+        """Add qty pieces of product (a new line, or on top of the existing one)"""
+        line = self._lines.get(product['id'])
+        current = line['qty'] if line else 0
+        self.set(product, current + qty)
+
+    def set(self, product, qty):
+        """Set the quantity of product; qty <= 0 removes the line"""
+        if qty <= 0:
+            self.remove(product['id'])
+            return
+        line = self._lines.get(product['id'])
+        if line is None:
+            line = self._lines[product['id']] = {**product, "qty": 0}
+            supplier = _supplier(line)
+            self._supplier_lines[supplier] = self._supplier_lines.get(supplier, 0) + 1
+        self._account(line, qty - line['qty'])
+        line['qty'] = qty
+
+    def remove(self, product_id):
+        """Remove a line (no-op if the product is not in the cart)"""
+        line = self._lines.pop(product_id, None)
+        if line is not None:
+            self._account(line, -line['qty'])
+            supplier = _supplier(line)
+            self._supplier_lines[supplier] -= 1
+            if not self._supplier_lines[supplier]:
+                del self._supplier_lines[supplier]
+                del self.supplier_totals[supplier]
+            if not self._lines:
+                self.total = 0.0  # start from an exact zero instead of carrying float residue
+
+    def lines(self):
+        """Copies of the cart lines, e.g. to store with a placed order"""
+        return [dict(line) for line in self._lines.values()]
+
+    def _account(self, line, delta_qty):
+        amount = line['price'] * delta_qty
+        self.total += amount
+        self.pieces += delta_qty
+        supplier = _supplier(line)
+        self.supplier_totals[supplier] = self.supplier_totals.get(supplier, 0.0) + amount
+
+
+def _supplier(line):
+    return line.get('supplier') or ""
@@ -0,0 +1,172 @@
+"""
+Local copy of the backend catalog, kept current with conditional requests
+
+The copy is shared by all sessions of the process and saved to disk, so browsing the
+catalog and showing cart prices and stock never wait on the backend. Refreshes run in a
+background thread: a delta request (/catalog/changes) that is an empty 304 while
+nothing changed, and full page loads (with If-None-Match) only for the first load or
+after the backend state was re-created.
+"""
+import json
+import os
+import threading
+import time
+
+import requests
+import streamlit as st
+
+from config import API_BASE_URL, CATALOG_CACHE_PATH, CATALOG_REFRESH_SECONDS
+
+CATALOG_TIMEOUT = 10
+
+
+class CatalogCache:
+    """Catalog rows by artikel_id, with the epoch/version of the backend state they reflect"""
+
+    def __init__(self, path=CATALOG_CACHE_PATH):
+        self.path = path
+        self.rows = {}
+        self.epoch = None
+        self.version = None
+        self.page_etags = {}
+        self.last_refresh = 0.0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._load()
+
+    def products(self, category=None):
+        """Catalog rows (optionally of one category), in catalog order"""
+        rows = list(self.rows.values())
+        if category:
+            rows = [row for row in rows if row.get("kategorie") == category]
+        return rows
+
+    def categories(self):
+        return sorted({row.get("kategorie", "") for row in self.rows.values()} - {""})
+
+    def get(self, artikel_id):
+        """The cached row for an article, or None"""
+        return self.rows.get(artikel_id)
+
+    def refresh_in_background(self):
+        """Start a refresh if the copy is older than CATALOG_REFRESH_SECONDS (never blocks)"""
+        with self._lock:
+            if self._refreshing or time.monotonic() - self.last_refresh < CATALOG_REFRESH_SECONDS:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh_quietly, name="catalog-refresh", daemon=True).start()
+
+    def refresh(self):
+        """
+        Bring the copy up to date: a delta since our version, or a full (conditional) load.
+
+        Returns:
+            "unchanged", "delta" or "full"
+        """
+        if self.version is None:
+            return self._load_pages()
+        response = requests.get(
+            f"{API_BASE_URL}/catalog/changes",
+            params={"since": self.version, "epoch": self.epoch},
+            timeout=CATALOG_TIMEOUT
+        )
+        if response.status_code == 304:
+            return "unchanged"
+        response.raise_for_status()
+        delta = response.json()
+        if delta.get("reset"):
+            self.page_etags = {}  # they name the old state
+            return self._load_pages()
+        rows = dict(self.rows)
+        for row in delta["items"]:
+            rows[row["artikel_id"]] = row
+        self._replace(rows, delta["epoch"], delta["version"], self.page_etags)
+        return "delta"
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+            self.last_error = None
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            self.last_error = str(e)  # keep serving the copy we have
+        finally:
+            with self._lock:
+                self.last_refresh = time.monotonic()
+                self._refreshing = False
+
+    def _load_pages(self):
+        rows, etags = {}, {}
+        page, pages = 1, 1
+        epoch = version = None
+        while page <= pages:
+            headers = {}
+            if self.version is not None and page in self.page_etags:
+                headers["If-None-Match"] = self.page_etags[page]
+            response = requests.get(f"{API_BASE_URL}/catalog", params={"page": page}, headers=headers,
+                                    timeout=CATALOG_TIMEOUT)
+            if response.status_code == 304 and version is None:
+                # our copy of this page is current, so the whole copy is (same epoch and version)
+                return "unchanged"
+            response.raise_for_status()
+            data = response.json()
+            if version is not None and (data["epoch"], data["version"]) != (epoch, version):
+                # stock changed while paging: start over at the new version
+                rows, etags, page = {}, {}, 1
+                epoch = version = None
+                continue
+            epoch, version, pages = data["epoch"], data["version"], data["pages"]
+            for row in data["items"]:
+                rows[row["artikel_id"]] = row
+            etags[page] = response.headers.get("ETag")
+            page += 1
+        self._replace(rows, epoch, version, etags)
+        return "full"
+
+    def _replace(self, rows, epoch, version, page_etags):
+        # swap in new objects, so readers iterating the old dict are not disturbed
+        self.rows, self.epoch, self.version, self.page_etags = rows, epoch, version, page_etags
+        self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.rows = {row["artikel_id"]: row for row in data["items"]}
+            self.epoch, self.version = data["epoch"], data["version"]
+            self.page_etags = {int(page): etag for page, etag in data.get("page_etags", {}).items()}
+        except (OSError, ValueError, KeyError):
+            pass  # no usable copy yet: the first refresh loads the catalog
+
+    def _save(self):
+        data = {"epoch": self.epoch, "version": self.version, "page_etags": self.page_etags,
+                "items": list(self.rows.values())}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass  # the in-memory copy still works
+
+
+@st.cache_resource
+def get_catalog():
+    """The process-wide catalog copy (refresh it with refresh_in_background())"""
+    return CatalogCache()
+
+
+def catalog_product(row):
+    """Cart product for a catalog row"""
+    return {
+        "id": row["artikel_id"],
+        "name": row.get("artikelname", row["artikel_id"]),
+        "price": row.get("preis_eur", 0),
+        "description": row.get("kategorie", ""),
+        "category": row.get("kategorie", ""),
+        "supplier": row.get("lieferant", ""),
+        "lagerbestand": row.get("lagerbestand", 0),
+        "is_preferred": row.get("is_preferred", False),
+        "lead_time_days": row.get("lead_time_days", 7),
+        "icon": "🔩",
+    }
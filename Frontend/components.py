@@ -3,7 +3,9 @@ Reusable UI components: sidebar, order summary, product description
 """
 import streamlit as st
 from utils import calculate_total, place_order, navigate_to
-from config import AUTO_APPROVAL_LIMIT, ADMIN_PASSWORD
+from config import AUTO_APPROVAL_LIMIT, ADMIN_PASSWORD, ORDER_SUMMARY_FRAGMENT, JOB_POLL_SECONDS
+from jobs import get_job, pop_job, cancel_job
+from catalog import get_catalog
 
 
 def render_sidebar():
@@ -27,10 +29,27 @@ def render_sidebar():
         st.caption("Hackathon Demo v2.0", text_alignment="center")
 
 
+def start_new_order():
+    """on_click callback for "New Order": clear the last status in every order summary"""
+    st.session_state.last_order_status = None
+    st.rerun(ORDER_SUMMARY_FRAGMENT)
+
+
+@st.fragment(key=ORDER_SUMMARY_FRAGMENT)
 def render_order_summary(key_prefix="default"):
-    """Render the order summary component"""
+    """
+    Render the order summary component.
+
+    A fragment: cart edits rerun just the summaries (all call sites share the key and
+    rerun together) instead of the whole app.
+    """
     st.markdown("### Order Summary")
     
+    # Toast from an add-to-cart callback (popped, so only the first summary shows it)
+    toast = st.session_state.pop("cart_toast", None)
+    if toast:
+        st.toast(toast)
+    
     # Show last order status banner if cart is empty
     if not st.session_state.cart:
         last_status = st.session_state.get('last_order_status')
@@ -61,28 +80,43 @@ def render_order_summary(key_prefix="default"):
                 """, unsafe_allow_html=True)
             
             # Button to clear status and start fresh
-            if st.button("🛒 New Order", use_container_width=True, key=f"{key_prefix}_new_order_btn"):
-                st.session_state.last_order_status = None
-                st.rerun()
+            st.button("🛒 New Order", use_container_width=True, key=f"{key_prefix}_new_order_btn",
+                      on_click=start_new_order)
         else:
             st.markdown("*Your cart is empty*")
         return
     
-    for item in st.session_state.cart:
+    cart = st.session_state.cart
+    catalog = get_catalog()  # local copy: stock hints without a backend call
+    for item in cart:
         col1, col2 = st.columns([3, 1])
         with col1:
             st.markdown(f"**{item['name']}**")
-            st.caption(f"{item['qty']} pcs")
+            row = catalog.get(item['id'])
+            if row is not None and row.get('lagerbestand', 0) < item['qty']:
+                st.caption(f"{item['qty']} pcs · ⚠️ {row.get('lagerbestand', 0)} in stock")
+            else:
+                st.caption(f"{item['qty']} pcs")
         with col2:
             subtotal = item['price'] * item['qty']
             st.markdown(f"€{subtotal:.2f}")
     
     st.markdown("---")
     
+    # Totals are kept up to date by the cart itself, nothing is re-summed here
+    if len(cart.supplier_totals) > 1:
+        for supplier, subtotal in cart.supplier_totals.items():
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                st.caption(supplier or "Other")
+            with col2:
+                st.caption(f"€{subtotal:.2f}")
+
     total = calculate_total()
     col1, col2 = st.columns([2, 1])
     with col1:
         st.markdown("**Total**")
+        st.caption(f"{len(cart)} items · {cart.pieces} pcs")
     with col2:
         st.markdown(f"**€{total:.2f}**")
     
@@ -135,6 +169,44 @@ def render_product_description(product):
     """, unsafe_allow_html=True)
 
 
+def cancel_job_callback(name, on_cancel=None):
+    """on_click callback for "Cancel": drop the job and redraw the fragment of the same name"""
+    cancel_job(name)
+    if on_cancel:
+        on_cancel()
+    st.rerun(name)
+
+
+def render_job_progress(name, apply_result, on_cancel=None):
+    """
+    Live progress of the background job `name`, with a Cancel button.
+
+    Polls every JOB_POLL_SECONDS without blocking the rest of the app (only while the
+    job exists). Once it is done, apply_result(job) folds its response into session
+    state and the app reruns.
+    """
+    if get_job(name) is not None:
+        _poll_job(name, apply_result, on_cancel)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _poll_job(name, apply_result, on_cancel):
+    job = get_job(name)
+    if job is None:
+        return
+    if job.done():
+        pop_job(name)
+        apply_result(job)
+        st.rerun()
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.info(f"🤖 {job.label} · {job.progress} · {job.elapsed():.0f}s")
+    with col2:
+        st.button("Cancel", key=f"{name}_cancel_job", use_container_width=True,
+                  on_click=cancel_job_callback, args=(name, on_cancel))
+
+
 def render_chat_message(role, content):
     """Render a single chat message bubble"""
     # Convert newlines and bullet points to HTML
@@ -1,20 +1,35 @@
 """
 Configuration, constants, and session state initialization
 """
+import os
+import tempfile
+
 import streamlit as st
 
-# Product data (simulating CSV)
-PRODUCTS = [
-    {"id": "C001", "name": "Screw A", "description": "M4×20 stainless", "category": "Fasteners", "price": 0.03, "supplier": "Supplier A", "icon": "🔩"},
-    {"id": "C002", "name": "Screw B", "description": "M4×25 stainless", "category": "Fasteners", "price": 0.04, "supplier": "Supplier A", "icon": "🔩"},
-    {"id": "C003", "name": "Screw C", "description": "M5×30 zinc", "category": "Fasteners", "price": 0.05, "supplier": "Supplier B", "icon": "🔩"},
-    {"id": "C004", "name": "Washer", "description": "for M4", "category": "Fasteners", "price": 0.01, "supplier": "Supplier B", "icon": "⚙️"},
-    {"id": "C005", "name": "Wall Plugs", "description": "6mm (Box 100)", "category": "Fasteners", "price": 10.00, "supplier": "Fischer", "icon": "🔧"},
-    {"id": "C006", "name": "Work Gloves", "description": "Size 9", "category": "PPE", "price": 2.50, "supplier": "Uvex", "icon": "🧤"},
-]
+from cart import Cart
 
 # API Configuration
 API_BASE_URL = "http://localhost:8000"
+SEARCH_SUGGESTION_LIMIT = 6  # type-ahead suggestions under the dashboard search box
+
+# Local catalog copy (see catalog.py), refreshed in the background with conditional requests
+CATALOG_CACHE_PATH = os.environ.get(
+    "HAMMERTIME_CATALOG_CACHE", os.path.join(tempfile.gettempdir(), "hammertime_catalog.json")
+)
+CATALOG_REFRESH_SECONDS = 30  # minimum age of the copy before asking the backend for changes
+
+# Fragment keys: cart edits rerun only the order summaries, chat turns only their pane
+ORDER_SUMMARY_FRAGMENT = "order_summary"
+DASHBOARD_SEARCH_FRAGMENT = "dashboard_search"
+VOICE_CHAT_FRAGMENT = "voice_chat"
+IMAGE_CHAT_FRAGMENT = "image_chat"
+
+# Background jobs for LLM-backed actions (see jobs.py)
+LLM_JOB_WORKERS = 8  # backend calls in flight at once, shared by all sessions
+JOB_POLL_SECONDS = 0.5  # how often a running job's progress is refreshed
+
+# Order pipeline (backend workers store orders, render contracts and update reports)
+PIPELINE_TIMEOUT = 3  # seconds to hand an order or approval to the backend
 
 # Order Settings
 AUTO_APPROVAL_LIMIT = 100  # Orders above this amount (EUR) require manual approval
@@ -24,7 +39,7 @@ ADMIN_PASSWORD = "admin123"  # Password required for orders over limit
 def init_session_state():
     """Initialize all session state variables"""
     if 'cart' not in st.session_state:
-        st.session_state.cart = []
+        st.session_state.cart = Cart()  # keyed by product ID, keeps its own totals
     if 'orders' not in st.session_state:
         st.session_state.orders = []
     if 'reports' not in st.session_state:
@@ -43,26 +58,32 @@ def init_session_state():
         st.session_state.recommendation = None
     if 'search_results' not in st.session_state:
         st.session_state.search_results = None
+    if 'search_error' not in st.session_state:
+        st.session_state.search_error = None  # (level, message) of the last failed AI search
     if 'last_search_query' not in st.session_state:
         st.session_state.last_search_query = ""
+    if 'jobs' not in st.session_state:
+        st.session_state.jobs = {}  # name -> jobs.Job, background LLM calls (named like the fragment showing them)
     if 'cart_version' not in st.session_state:
         st.session_state.cart_version = 0
     # Voice Chat Flow state
     if 'voice_chat_messages' not in st.session_state:
         st.session_state.voice_chat_messages = []  # List of {"role": "user"|"assistant", "content": "..."}
+    if 'voice_chat_session_id' not in st.session_state:
+        st.session_state.voice_chat_session_id = None  # Backend chat session holding the history
     if 'voice_chat_recommendations' not in st.session_state:
         st.session_state.voice_chat_recommendations = None  # Final recommendations from AI
-    if 'voice_chat_pending' not in st.session_state:
-        st.session_state.voice_chat_pending = False  # Flag to trigger AI response on next render
+    if 'voice_last_recording_id' not in st.session_state:
+        st.session_state.voice_last_recording_id = None  # Hash of the last transcribed recording
     # Image Chat Flow state
     if 'image_chat_messages' not in st.session_state:
         st.session_state.image_chat_messages = []  # Chat history for image analysis
+    if 'image_chat_session_id' not in st.session_state:
+        st.session_state.image_chat_session_id = None  # Backend chat session holding the history
     if 'image_chat_recommendations' not in st.session_state:
         st.session_state.image_chat_recommendations = None  # Final recommendations from image
-    if 'image_chat_pending' not in st.session_state:
-        st.session_state.image_chat_pending = False  # Flag for pending AI response
     if 'image_uploaded_data' not in st.session_state:
-        st.session_state.image_uploaded_data = None  # Base64 encoded image data
+        st.session_state.image_uploaded_data = None  # Handle for the backend image: image_id, media_type, name
     # Last order status for visual feedback
     if 'last_order_status' not in st.session_state:
         st.session_state.last_order_status = None  # "Auto-Approved", "Admin Approved", "Order Declined"
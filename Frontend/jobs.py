@@ -0,0 +1,75 @@
+"""
+Background jobs for slow backend (LLM) calls
+
+Calls run on one thread pool shared by all sessions, so a script run never waits for
+the backend: it submits a job, renders its progress and picks the result up once the
+job is done. Job functions must not touch st.session_state (they run outside the
+script thread); they get the Job to report progress and return the response.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from config import LLM_JOB_WORKERS
+
+
+@st.cache_resource
+def job_pool():
+    """Thread pool shared by all sessions of this process (created once)"""
+    return ThreadPoolExecutor(max_workers=LLM_JOB_WORKERS, thread_name_prefix="llm-job")
+
+
+class Job:
+    """One backend call on the job pool; the script thread only polls it"""
+
+    def __init__(self, label, fn, *args):
+        self.label = label
+        self.progress = "Queued"
+        self.cancelled = False
+        self.started = time.monotonic()
+        self.future = job_pool().submit(self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        if self.cancelled:
+            return None
+        self.progress = "Waiting for the AI"
+        return fn(self, *args)
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        """The job function's return value (re-raises its exception)"""
+        return self.future.result()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+
+def submit_job(name, label, fn, *args):
+    """Start fn(job, *args) in the background as this session's job `name` (replacing an older one)"""
+    cancel_job(name)
+    st.session_state.jobs[name] = Job(label, fn, *args)
+    return st.session_state.jobs[name]
+
+
+def get_job(name):
+    """This session's job `name`, or None"""
+    return st.session_state.jobs.get(name)
+
+
+def pop_job(name):
+    return st.session_state.jobs.pop(name, None)
+
+
+def cancel_job(name):
+    """
+    Forget job `name`. A queued job never runs; a running request cannot be interrupted,
+    its response is simply dropped.
+    """
+    job = pop_job(name)
+    if job is not None:
+        job.cancelled = True
+        job.future.cancel()
+    return job
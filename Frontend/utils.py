@@ -2,44 +2,57 @@
 Helper functions for cart management, orders, and navigation
 """
 import streamlit as st
-import random
+import uuid
+import requests
 from datetime import datetime
-from config import AUTO_APPROVAL_LIMIT
+from streamlit.errors import StreamlitAPIException
+from config import API_BASE_URL, AUTO_APPROVAL_LIMIT, ORDER_SUMMARY_FRAGMENT, PIPELINE_TIMEOUT
+from cart import Cart
 
 
 def add_to_cart(product, qty, add_mode=True):
     """Add product to cart. If add_mode=True, adds qty to existing. If False, sets qty."""
     if qty > 0:
-        for item in st.session_state.cart:
-            if item['id'] == product['id']:
-                if add_mode:
-                    item['qty'] += qty
-                else:
-                    item['qty'] = qty
-                return
-        st.session_state.cart.append({**product, "qty": qty})
+        if add_mode:
+            st.session_state.cart.add(product, qty)
+        else:
+            st.session_state.cart.set(product, qty)
 
 
 def set_cart_qty(product, qty):
-    """Set the quantity of a product in cart (replaces existing qty)"""
-    if qty > 0:
-        for item in st.session_state.cart:
-            if item['id'] == product['id']:
-                item['qty'] = qty
-                return
-        st.session_state.cart.append({**product, "qty": qty})
-    else:
-        remove_from_cart(product['id'])
+    """Set the quantity of a product in cart (replaces existing qty, removes it at 0)"""
+    st.session_state.cart.set(product, qty)
 
 
 def remove_from_cart(product_id):
     """Remove a product from the cart"""
-    st.session_state.cart = [item for item in st.session_state.cart if item['id'] != product_id]
+    st.session_state.cart.remove(product_id)
 
 
 def calculate_total():
-    """Calculate the total price of items in cart"""
-    return sum(item['price'] * item['qty'] for item in st.session_state.cart)
+    """Total price of items in cart (maintained by the cart, no re-summing)"""
+    return st.session_state.cart.total
+
+
+def add_to_cart_callback(products, message=None, also_rerun=()):
+    """
+    on_click callback for add-to-cart buttons: adds [(product, qty), ...] and reruns only
+    the order summary fragments (plus the fragments in also_rerun) instead of the whole app
+    """
+    for product, qty in products:
+        add_to_cart(product, qty)
+    if message:
+        # shown by the order summary: callbacks of a fragment rerun should not draw elements
+        st.session_state.cart_toast = message
+    st.rerun([ORDER_SUMMARY_FRAGMENT, *also_rerun])
+
+
+def rerun_fragment():
+    """Rerun only the calling fragment (a full rerun when it runs as part of a full-app run)"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
 
 
 def place_order(custom_status=None):
@@ -52,12 +65,13 @@ def place_order(custom_status=None):
         status = "Pending Approval" if total > AUTO_APPROVAL_LIMIT else "Auto-Approved"
     
     new_order = {
-        "Order ID": f"ORD-{random.randint(1000, 9999)}",
+        # unique across sessions: the backend pipeline keeps every session's orders
+        "Order ID": f"ORD-{uuid.uuid4().hex[:8].upper()}",
         "Date": datetime.now().strftime("%Y-%m-%d %H:%M"),
         "Requester": "Site Foreman",
         "Total (EUR)": total,
         "Status": status,
-        "Items": st.session_state.cart.copy()
+        "Items": st.session_state.cart.lines()
     }
     st.session_state.orders.insert(0, new_order)
     
@@ -65,23 +79,66 @@ def place_order(custom_status=None):
     if status == "Auto-Approved":
         st.session_state.reports.append(new_order)
     
-    st.session_state.cart = []
+    # Storing, contracts and report numbers happen in the backend pipeline, not in this script run
+    new_order["Synced"] = publish_order(new_order)
+    
+    st.session_state.cart = Cart()
     st.session_state.cart_version += 1
     return status
 
 
-def approve_order(order_id):
-    """Approve a pending order by its ID"""
+def approve_order(order_id, status="Approved"):
+    """Approve a pending or declined order by its ID; the backend pipeline renders its contract"""
     for order in st.session_state.orders:
-        if order['Order ID'] == order_id and order['Status'] == "Pending Approval":
-            order['Status'] = "Approved"
+        if order['Order ID'] == order_id and order['Status'] in ("Pending Approval", "Order Declined"):
+            order['Status'] = status
             # Add approved orders to reports
-            st.session_state.reports.append(order)
+            if order not in st.session_state.reports:
+                st.session_state.reports.append(order)
+            order["Synced"] = publish_approval(order_id, status)
             return True
     return False
 
 
+def publish_order(order):
+    """Hand the order to the backend pipeline (returns at once); False if the backend is unreachable"""
+    try:
+        response = requests.post(f"{API_BASE_URL}/orders", json={
+            "order_id": order["Order ID"],
+            "placed_at": order["Date"],
+            "requester": order["Requester"],
+            "total": order["Total (EUR)"],
+            "status": order["Status"],
+            "items": order["Items"],
+        }, timeout=PIPELINE_TIMEOUT)
+        return response.ok
+    except requests.exceptions.RequestException:
+        return False
+
+
+def publish_approval(order_id, status):
+    """Tell the backend pipeline an order was approved (its contract is rendered in the background)"""
+    try:
+        response = requests.post(f"{API_BASE_URL}/orders/{order_id}/approve", json={"status": status},
+                                 timeout=PIPELINE_TIMEOUT)
+        return response.ok
+    except requests.exceptions.RequestException:
+        return False
+
+
 def navigate_to(page):
     """Navigate to a different page"""
     st.session_state.current_page = page
 
+
+
+class BackendBusy(Exception):
+    """The backend shed the request (429); the message says when to retry"""
+
+
+def busy_message(response):
+    """User-facing text for a 429 from the backend (LLM capacity exhausted), else None"""
+    if response.status_code != 429:
+        return None
+    retry_after = response.headers.get("Retry-After", "a few")
+    return f"⏳ Lots of requests right now - please try again in {retry_after} seconds."
@@ -4,25 +4,83 @@ Image Search View - Analyze images (handwritten lists or photos of parts)
 import streamlit as st
 import requests
 import base64
-from config import API_BASE_URL
-from components import render_chat_message, render_order_summary
-from utils import add_to_cart
+import hashlib
+from config import API_BASE_URL, IMAGE_CHAT_FRAGMENT
+from components import render_chat_message, render_order_summary, render_job_progress
+from jobs import submit_job, get_job, cancel_job
+from utils import add_to_cart_callback, busy_message, rerun_fragment
 
 
-def process_image_response():
-    """Call the AI backend to analyze the image and process the response"""
+def upload_image(image_bytes: bytes, media_type: str) -> str:
+    """Upload the image once to the backend and return its image_id"""
+    response = requests.post(
+        f"{API_BASE_URL}/upload_image",
+        json={
+            "image_base64": base64.b64encode(image_bytes).decode('utf-8'),
+            "media_type": media_type
+        }
+    )
+    response.raise_for_status()
+    return response.json()["image_id"]
+
+
+def request_image_response(job, image_data: dict, messages: list, session_id, image_bytes):
+    """
+    Call the AI backend to analyze the image (runs as a background job: no session state here).
+
+    Returns:
+        (response, image_id) - image_id changes when the backend had evicted the image
+    """
+    # The backend keeps the history; only the new message is sent after the first turn
+    payload = {"image_id": image_data["image_id"]}
+    if session_id:
+        payload["session_id"] = session_id
+        payload["message"] = messages[-1]["content"]
+    else:
+        payload["messages"] = messages
+    response = requests.post(f"{API_BASE_URL}/analyze_image", json=payload)
+    
+    for _ in range(2):
+        if response.status_code != 404:
+            break
+        if "session_id" in response.json().get("detail", ""):
+            # Chat session expired - re-seed it with the full history
+            job.progress = "Restoring the conversation"
+            payload.pop("session_id", None)
+            payload.pop("message", None)
+            payload["messages"] = messages
+        elif image_bytes is not None:
+            # Backend evicted the image (TTL) - upload it again
+            job.progress = "Uploading the image again"
+            payload["image_id"] = upload_image(image_bytes, image_data["media_type"])
+        else:
+            break
+        response = requests.post(f"{API_BASE_URL}/analyze_image", json=payload)
+    return response, payload["image_id"]
+
+
+def start_image_job():
+    """Run the AI analysis of the current conversation in the background"""
+    uploaded_file = st.session_state.get("image_uploader")
+    submit_job(
+        IMAGE_CHAT_FRAGMENT, "AI is analyzing", request_image_response,
+        dict(st.session_state.image_uploaded_data),
+        list(st.session_state.image_chat_messages),
+        st.session_state.image_chat_session_id,
+        uploaded_file.getvalue() if uploaded_file is not None else None
+    )
+
+
+def process_image_response(job):
+    """Add the finished AI analysis job to the conversation"""
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/analyze_image",
-            json={
-                "image_base64": st.session_state.image_uploaded_data["base64"],
-                "media_type": st.session_state.image_uploaded_data["media_type"],
-                "messages": st.session_state.image_chat_messages
-            }
-        )
+        response, image_id = job.result()
+        if st.session_state.image_uploaded_data is not None:
+            st.session_state.image_uploaded_data["image_id"] = image_id
         
         if response.ok:
             result = response.json()
+            st.session_state.image_chat_session_id = result.get("session_id")
             
             if result["type"] == "question":
                 st.session_state.image_chat_messages.append({
@@ -44,210 +102,230 @@ def process_image_response():
         else:
             st.session_state.image_chat_messages.append({
                 "role": "assistant",
-                "content": f"❌ Backend Error: {response.status_code}"
+                "content": busy_message(response) or f"❌ Backend Error: {response.status_code}"
             })
     except Exception as e:
         st.session_state.image_chat_messages.append({
             "role": "assistant",
             "content": f"❌ Could not connect to backend: {e}"
         })
-    
-    st.session_state.image_chat_pending = False
+
+
+def forget_cancelled_message():
+    """After "Cancel": drop the unanswered message; the backend session may have seen it, so re-seed next turn"""
+    if st.session_state.image_chat_messages and st.session_state.image_chat_messages[-1]["role"] == "user":
+        st.session_state.image_chat_messages.pop()
+    st.session_state.image_chat_session_id = None
 
 
 def add_user_message(user_message: str):
-    """Add user message to chat and set pending flag"""
+    """Add user message to chat and start the AI reply in the background"""
     st.session_state.image_chat_messages.append({
         "role": "user",
         "content": user_message
     })
-    st.session_state.image_chat_pending = True
+    start_image_job()
 
 
-def image_search_view():
-    """Image search view with upload and chat-based analysis"""
+def recommended_product(item: dict) -> dict:
+    """Cart product for a recommended item from the backend"""
+    return {
+        'id': item.get('artikel_id', ''),
+        'name': item.get('artikelname', item.get('artikel_id', '')),
+        'price': item.get('preis_stk', 0),
+        'description': item.get('kategorie', ''),
+        'supplier': item.get('lieferant', ''),
+        'icon': '🔩'
+    }
+
+
+def add_all_recommendations(items: list):
+    """on_click callback for "Add All": fill the cart and close the recommendations"""
+    st.session_state.image_chat_recommendations = None
+    add_to_cart_callback([(recommended_product(item), item.get('anzahl', 1)) for item in items],
+                         "✅ All items added to cart!", also_rerun=[IMAGE_CHAT_FRAGMENT])
+
+
+@st.fragment(key=IMAGE_CHAT_FRAGMENT)
+def chat_pane():
+    """Upload, conversation and recommendations (a fragment: a chat turn reruns only this pane)"""
+    st.markdown("### Image Search")
+    st.caption("Upload a handwritten list or photo of parts. AI will analyze and help you order.")
     
-    # Two column layout
-    main_col, summary_col = st.columns([3, 1])
+    # One analysis at a time: inputs wait for the running one
+    waiting_for_reply = get_job(IMAGE_CHAT_FRAGMENT) is not None
     
-    with main_col:
-        st.markdown("### Image Search")
-        st.caption("Upload a handwritten list or photo of parts. AI will analyze and help you order.")
+    # Image Upload Section
+    with st.container(border=True):
+        uploaded_file = st.file_uploader(
+            "Upload Image",
+            type=["png", "jpg", "jpeg"],
+            label_visibility="collapsed",
+            key="image_uploader"
+        )
         
-        # Image Upload Section
-        with st.container(border=True):
-            uploaded_file = st.file_uploader(
-                "Upload Image",
-                type=["png", "jpg", "jpeg"],
-                label_visibility="collapsed",
-                key="image_uploader"
-            )
+        if uploaded_file is not None:
+            # Only keep a small handle; the image itself lives on the backend
+            image_bytes = uploaded_file.getvalue()
+            image_id = hashlib.sha256(image_bytes).hexdigest()
             
-            if uploaded_file is not None:
-                # Store image data
-                image_bytes = uploaded_file.read()
-                image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-                
-                # Determine media type
-                if uploaded_file.type:
-                    media_type = uploaded_file.type
-                else:
-                    ext = uploaded_file.name.split('.')[-1].lower()
-                    media_type = f"image/{ext}" if ext in ['png', 'jpg', 'jpeg'] else "image/jpeg"
-                
-                # Check if this is a new image
-                if (st.session_state.image_uploaded_data is None or 
-                    st.session_state.image_uploaded_data.get("base64") != image_base64):
+            # Determine media type
+            if uploaded_file.type:
+                media_type = uploaded_file.type
+            else:
+                ext = uploaded_file.name.split('.')[-1].lower()
+                media_type = f"image/{ext}" if ext in ['png', 'jpg', 'jpeg'] else "image/jpeg"
+            
+            # Check if this is a new image (image_id is the content hash)
+            if (st.session_state.image_uploaded_data is None or 
+                st.session_state.image_uploaded_data.get("image_id") != image_id):
+                try:
+                    image_id = upload_image(image_bytes, media_type)
                     st.session_state.image_uploaded_data = {
-                        "base64": image_base64,
+                        "image_id": image_id,
                         "media_type": media_type,
                         "name": uploaded_file.name
                     }
-                    # Reset chat for new image
-                    st.session_state.image_chat_messages = []
-                    st.session_state.image_chat_recommendations = None
-                
-                # Show uploaded image
-                col_img, col_action = st.columns([2, 1])
-                
-                with col_img:
-                    st.image(image_bytes, caption=uploaded_file.name, use_container_width=True)
-                
-                with col_action:
-                    st.markdown("**Ready to analyze!**")
-                    st.caption("Click below to have AI analyze your image.")
-                    
-                    if st.button("🔍 Analyze Image", type="primary", use_container_width=True, key="analyze_btn"):
-                        # Start analysis with initial message
-                        st.session_state.image_chat_messages = [{
-                            "role": "user",
-                            "content": "Please analyze this image and identify what materials I need to order."
-                        }]
-                        st.session_state.image_chat_pending = True
-                        st.rerun()
-        
-        # Chat History
-        if st.session_state.image_chat_messages:
-            st.markdown("---")
-            st.markdown("### 💬 Conversation")
-            
-            for msg in st.session_state.image_chat_messages:
-                render_chat_message(msg["role"], msg["content"])
-            
-            # Process pending AI response
-            if st.session_state.image_chat_pending:
-                with st.spinner("🤖 AI is analyzing..."):
-                    process_image_response()
-                st.rerun()
-            
-            # Text input for follow-up
-            st.markdown("---")
-            user_input = st.text_input(
-                "Reply to AI",
-                placeholder="e.g., 'I need the 5x60mm ones' or 'Yes, 10 of each'",
-                key="image_chat_text_input",
-                label_visibility="collapsed"
-            )
-            
-            col_send, col_clear = st.columns([1, 1])
-            
-            with col_send:
-                if st.button("Send", key="image_chat_send", use_container_width=True):
-                    if user_input and user_input.strip():
-                        add_user_message(user_input.strip())
-                        st.rerun()
-            
-            with col_clear:
-                if st.button("Clear", key="image_chat_clear", use_container_width=True):
-                    st.session_state.image_chat_messages = []
-                    st.session_state.image_chat_recommendations = None
-                    st.session_state.image_chat_pending = False
+                except Exception as e:
                     st.session_state.image_uploaded_data = None
-                    st.rerun()
-        
-        # Show Recommendations
-        if st.session_state.image_chat_recommendations:
-            st.markdown("---")
-            st.markdown("### 📦 Recommended Materials")
+                    st.error(f"Could not upload image to backend: {e}")
+                # Reset chat for new image
+                cancel_job(IMAGE_CHAT_FRAGMENT)
+                st.session_state.image_chat_messages = []
+                st.session_state.image_chat_session_id = None
+                st.session_state.image_chat_recommendations = None
+            
+            # Show uploaded image
+            col_img, col_action = st.columns([2, 1])
             
-            recommendations = st.session_state.image_chat_recommendations
-            items = recommendations.get("items", [])
+            with col_img:
+                st.image(image_bytes, caption=uploaded_file.name, use_container_width=True)
             
-            if items:
-                for item in items:
-                    col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 0.8, 0.8])
-                    
-                    with col1:
-                        is_preferred = item.get('is_preferred', False)
-                        supplier = item.get('lieferant', '')
-                        kategorie = item.get('kategorie', '')
-                        st.markdown(f"**{item.get('artikelname', item.get('artikel_id', 'Unknown'))}**")
-                        if is_preferred:
-                            st.markdown(f"""
-                            <span style="color: #64748B; font-size: 0.875rem;">{kategorie} | </span>
-                            <span style="display: inline-block; background: #FEF2F2; border: 1.5px solid #EF4444; border-radius: 4px; padding: 1px 6px; font-size: 0.75rem; color: #DC2626; font-weight: 600;">⭐ {supplier}</span>
-                            """, unsafe_allow_html=True)
-                        else:
-                            st.caption(f"{kategorie} | {supplier}")
-                    
-                    with col2:
-                        st.markdown(f"Qty: **{item.get('anzahl', 0)}**")
-                        lead_time = item.get('lead_time_days', 7)
-                        st.caption(f"🚚 {lead_time}d lead")
-                    
-                    with col3:
-                        # Show inventory status
-                        stock = item.get('lagerbestand', 0)
-                        qty_needed = item.get('anzahl', 0)
-                        needs = item.get('needs_order', qty_needed)
-                        if stock >= qty_needed:
-                            st.markdown(f"✅ **In Stock**")
-                            st.caption(f"{stock} avail.")
-                        elif stock > 0:
-                            st.markdown(f"⚠️ **Low**")
-                            st.caption(f"Need {needs}")
-                        else:
-                            st.markdown(f"❌ **Order**")
-                            st.caption(f"Need {needs}")
-                    
-                    with col4:
-                        st.markdown(f"**€{item.get('preis_gesamt', 0):.2f}**")
-                    
-                    with col5:
-                        if st.button("➕", key=f"add_img_{item.get('artikel_id', '')}"):
-                            product = {
-                                'id': item.get('artikel_id', ''),
-                                'name': item.get('artikelname', item.get('artikel_id', '')),
-                                'price': item.get('preis_stk', 0),
-                                'description': item.get('kategorie', ''),
-                                'supplier': item.get('lieferant', ''),
-                                'icon': '🔩'
-                            }
-                            add_to_cart(product, item.get('anzahl', 1))
-                            st.toast(f"Added {item.get('artikelname', '')} to cart!")
+            with col_action:
+                st.markdown("**Ready to analyze!**")
+                st.caption("Click below to have AI analyze your image.")
                 
-                # Total and Add All
-                st.markdown("---")
-                total = recommendations.get("total", 0)
+                if st.button("🔍 Analyze Image", type="primary", use_container_width=True, key="analyze_btn",
+                             disabled=st.session_state.image_uploaded_data is None or waiting_for_reply):
+                    # Start analysis with initial message
+                    st.session_state.image_chat_session_id = None
+                    st.session_state.image_chat_messages = [{
+                        "role": "user",
+                        "content": "Please analyze this image and identify what materials I need to order."
+                    }]
+                    start_image_job()
+                    rerun_fragment()
+    
+    # Chat History
+    if st.session_state.image_chat_messages:
+        st.markdown("---")
+        st.markdown("### 💬 Conversation")
+        
+        for msg in st.session_state.image_chat_messages:
+            render_chat_message(msg["role"], msg["content"])
+        
+        # Progress of the AI analysis (runs in the background; the page stays usable)
+        render_job_progress(IMAGE_CHAT_FRAGMENT, process_image_response, on_cancel=forget_cancelled_message)
+        
+        # Text input for follow-up
+        st.markdown("---")
+        user_input = st.text_input(
+            "Reply to AI",
+            placeholder="e.g., 'I need the 5x60mm ones' or 'Yes, 10 of each'",
+            key="image_chat_text_input",
+            label_visibility="collapsed"
+        )
+        
+        col_send, col_clear = st.columns([1, 1])
+        
+        with col_send:
+            if st.button("Send", key="image_chat_send", use_container_width=True, disabled=waiting_for_reply):
+                if user_input and user_input.strip():
+                    add_user_message(user_input.strip())
+                    rerun_fragment()
+        
+        with col_clear:
+            if st.button("Clear", key="image_chat_clear", use_container_width=True):
+                st.session_state.image_chat_messages = []
+                st.session_state.image_chat_session_id = None
+                st.session_state.image_chat_recommendations = None
+                cancel_job(IMAGE_CHAT_FRAGMENT)
+                st.session_state.image_uploaded_data = None
+                rerun_fragment()
+    
+    # Show Recommendations
+    if st.session_state.image_chat_recommendations:
+        st.markdown("---")
+        st.markdown("### 📦 Recommended Materials")
+        
+        recommendations = st.session_state.image_chat_recommendations
+        items = recommendations.get("items", [])
+        
+        if items:
+            for item in items:
+                col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 0.8, 0.8])
                 
-                col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.markdown(f"### Total: €{total:.2f}")
+                    is_preferred = item.get('is_preferred', False)
+                    supplier = item.get('lieferant', '')
+                    kategorie = item.get('kategorie', '')
+                    st.markdown(f"**{item.get('artikelname', item.get('artikel_id', 'Unknown'))}**")
+                    if is_preferred:
+                        st.markdown(f"""
+                        <span style="color: #64748B; font-size: 0.875rem;">{kategorie} | </span>
+                        <span style="display: inline-block; background: #FEF2F2; border: 1.5px solid #EF4444; border-radius: 4px; padding: 1px 6px; font-size: 0.75rem; color: #DC2626; font-weight: 600;">⭐ {supplier}</span>
+                        """, unsafe_allow_html=True)
+                    else:
+                        st.caption(f"{kategorie} | {supplier}")
+                
                 with col2:
-                    if st.button("🛒 Add All to Cart", key="add_all_img", type="primary", use_container_width=True):
-                        for item in items:
-                            product = {
-                                'id': item.get('artikel_id', ''),
-                                'name': item.get('artikelname', item.get('artikel_id', '')),
-                                'price': item.get('preis_stk', 0),
-                                'description': item.get('kategorie', ''),
-                                'supplier': item.get('lieferant', ''),
-                                'icon': '🔩'
-                            }
-                            add_to_cart(product, item.get('anzahl', 1))
-                        st.success("✅ All items added to cart!")
-                        st.session_state.image_chat_recommendations = None
-                        st.rerun()
+                    st.markdown(f"Qty: **{item.get('anzahl', 0)}**")
+                    lead_time = item.get('lead_time_days', 7)
+                    st.caption(f"🚚 {lead_time}d lead")
+                
+                with col3:
+                    # Show inventory status
+                    stock = item.get('lagerbestand', 0)
+                    qty_needed = item.get('anzahl', 0)
+                    needs = item.get('needs_order', qty_needed)
+                    if stock >= qty_needed:
+                        st.markdown(f"✅ **In Stock**")
+                        st.caption(f"{stock} avail.")
+                    elif stock > 0:
+                        st.markdown(f"⚠️ **Low**")
+                        st.caption(f"Need {needs}")
+                    else:
+                        st.markdown(f"❌ **Order**")
+                        st.caption(f"Need {needs}")
+                
+                with col4:
+                    st.markdown(f"**€{item.get('preis_gesamt', 0):.2f}**")
+                
+                with col5:
+                    product = recommended_product(item)
+                    st.button("➕", key=f"add_img_{item.get('artikel_id', '')}", on_click=add_to_cart_callback,
+                              args=([(product, item.get('anzahl', 1))], f"Added {item.get('artikelname', '')} to cart!"))
+            
+            # Total and Add All
+            st.markdown("---")
+            total = recommendations.get("total", 0)
+            
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                st.markdown(f"### Total: €{total:.2f}")
+            with col2:
+                st.button("🛒 Add All to Cart", key="add_all_img", type="primary", use_container_width=True,
+                          on_click=add_all_recommendations, args=(items,))
+
+
+def image_search_view():
+    """Image search view with upload and chat-based analysis"""
+    
+    # Two column layout
+    main_col, summary_col = st.columns([3, 1])
+    
+    with main_col:
+        chat_pane()
     
     # Order Summary
     with summary_col:
@@ -3,6 +3,7 @@ Orders View - Display order history
 """
 import streamlit as st
 from config import ADMIN_PASSWORD
+from utils import approve_order
 
 
 def orders_view():
@@ -16,6 +17,8 @@ def orders_view():
                 with col1:
                     st.markdown(f"**{order['Order ID']}**")
                     st.caption(f"{order['Date']} • {order['Requester']}")
+                    if order.get("Synced") is False:
+                        st.caption("⚠️ Not sent to the backend (offline) - no contract or report entry")
                 with col2:
                     st.markdown(f"€{order['Total (EUR)']:.2f}")
                 with col3:
@@ -44,11 +47,8 @@ def orders_view():
                             st.write("")  # Spacing
                             if st.button("✓ Re-approve", key=f"reapprove_btn_{order['Order ID']}_{idx}", type="primary"):
                                 if admin_pwd == ADMIN_PASSWORD:
-                                    # Update order status
-                                    order['Status'] = "Admin Approved"
-                                    # Add to reports for contract generation
-                                    if order not in st.session_state.reports:
-                                        st.session_state.reports.append(order)
+                                    # Update order status; the backend renders the contract
+                                    approve_order(order['Order ID'], status="Admin Approved")
                                     st.success("✅ Order re-approved!")
                                     st.rerun()
                                 else:
@@ -3,37 +3,68 @@ Reports View - Analytics and metrics
 """
 import streamlit as st
 import requests
-from config import API_BASE_URL
+from config import API_BASE_URL, PIPELINE_TIMEOUT
+
+
+def fetch_pipeline_reports():
+    """Report aggregates and contract status from the backend order pipeline, or None if unreachable"""
+    try:
+        summary = requests.get(f"{API_BASE_URL}/reports/summary", timeout=PIPELINE_TIMEOUT)
+        orders = requests.get(f"{API_BASE_URL}/orders", timeout=PIPELINE_TIMEOUT)
+        summary.raise_for_status()
+        orders.raise_for_status()
+        return summary.json(), {order["order_id"]: order for order in orders.json()["orders"]}
+    except requests.exceptions.RequestException:
+        return None
 
 
 def reports_view():
     """Display reports and analytics"""
     st.markdown("### Reports & Analytics")
-    
+
+    # Numbers are kept up to date by the backend workers; this page only reads them
+    reports = fetch_pipeline_reports()
+    if reports is not None:
+        summary, pipeline_orders = reports
+    else:
+        summary, pipeline_orders = None, {}
+        st.warning("Backend not reachable - showing this session's orders only, contracts unavailable.")
+
     col1, col2, col3 = st.columns(3)
-    
+
     with col1:
-        total_orders = len(st.session_state.orders)
+        total_orders = summary["total_orders"] if summary else len(st.session_state.orders)
         st.metric("Total Orders", total_orders)
-    
+
     with col2:
         # Only count approved orders (exclude declined)
-        total_spend = sum(
-            o['Total (EUR)'] for o in st.session_state.orders 
-            if o.get('Status') != 'Order Declined'
-        ) if st.session_state.orders else 0
+        if summary:
+            total_spend = summary["total_spend"]
+        else:
+            total_spend = sum(
+                o['Total (EUR)'] for o in st.session_state.orders
+                if o.get('Status') != 'Order Declined'
+            ) if st.session_state.orders else 0
         st.metric("Total Spend", f"€{total_spend:.2f}")
-    
+
     with col3:
-        pending = len([o for o in st.session_state.orders if o['Status'] == 'Pending Approval'])
+        if summary:
+            pending = summary["pending_approvals"]
+        else:
+            pending = len([o for o in st.session_state.orders if o['Status'] == 'Pending Approval'])
         st.metric("Pending Approvals", pending)
-    
+
+    if summary and summary.get("spend_by_supplier"):
+        with st.expander("Spend by supplier"):
+            for supplier, spend in sorted(summary["spend_by_supplier"].items(), key=lambda entry: -entry[1]):
+                st.caption(f"{supplier}: €{spend:.2f}")
+
     st.markdown("---")
-    
+
     # Auto-Approved Orders Section
     if st.session_state.reports:
         st.markdown("### Auto-Approved Orders")
-        
+
         for order in st.session_state.reports:
             with st.container(border=True):
                 col1, col2, col3 = st.columns([2, 1, 1])
@@ -43,46 +74,17 @@ def reports_view():
                 with col2:
                     st.markdown(f"€{order['Total (EUR)']:.2f}")
                 with col3:
-                    if st.button("Generate Contract", key=f"contract_{order['Order ID']}"):
-                        # Prepare parts list for the contract
-                        parts_list = []
-                        for item in order['Items']:
-                            parts_list.append({
-                                "id": item.get('id', ''),
-                                "name": item.get('name', ''),
-                                "description": item.get('description', ''),
-                                "quantity": item.get('qty', 0),
-                                "price": item.get('price', 0.0),
-                                "supplier": item.get('supplier', '')
-                            })
-                        
-                        # Call the backend endpoint
-                        try:
-                            response = requests.post(
-                                f"{API_BASE_URL}/generate_contract",
-                                json={
-                                    "order_number": order['Order ID'],
-                                    "parts_list": parts_list
-                                }
-                            )
-                            if response.status_code == 200:
-                                # Save the PDF file
-                                pdf_filename = f"contract_{order['Order ID']}.pdf"
-                                with open(pdf_filename, 'wb') as f:
-                                    f.write(response.content)
-                                st.success(f"Contract generated and saved as {pdf_filename}")
-                                
-                                # Provide download button
-                                st.download_button(
-                                    label="Download Contract",
-                                    data=response.content,
-                                    file_name=pdf_filename,
-                                    mime="application/pdf"
-                                )
-                            else:
-                                st.error(f"Failed to generate contract: {response.text}")
-                        except Exception as e:
-                            st.error(f"Error: {str(e)}")
+                    # Contracts are rendered by the pipeline as soon as an order is approved
+                    pipeline_order = pipeline_orders.get(order['Order ID'])
+                    if pipeline_order and pipeline_order["contract_ready"]:
+                        st.link_button("Download Contract",
+                                       f"{API_BASE_URL}/orders/{order['Order ID']}/contract",
+                                       use_container_width=True)
+                    elif reports is not None and order.get("Synced") is not False:
+                        st.caption("⏳ Contract is being generated")
+                        if st.button("Refresh", key=f"contract_refresh_{order['Order ID']}"):
+                            st.rerun()
+                    else:
+                        st.caption("Contract unavailable (order not sent to the backend)")
     else:
         st.info("No auto-approved orders yet.")
-
@@ -3,31 +3,53 @@ Voice Request View - Conversational chat with voice input
 """
 import streamlit as st
 import requests
-import speech_recognition as sr
-from config import API_BASE_URL
-from components import render_chat_message, render_chat_history, render_order_summary
-from utils import add_to_cart
+import hashlib
+import json
+from config import API_BASE_URL, VOICE_CHAT_FRAGMENT
+from components import render_chat_message, render_chat_history, render_order_summary, render_job_progress
+from jobs import submit_job, get_job, cancel_job
+from utils import add_to_cart_callback, busy_message, rerun_fragment
 
 
 def add_user_message(user_message: str):
-    """Add user message to chat and set pending flag for AI response"""
+    """Add user message to chat and start the AI reply in the background"""
     st.session_state.voice_chat_messages.append({
         "role": "user",
         "content": user_message
     })
-    st.session_state.voice_chat_pending = True
+    submit_job(
+        VOICE_CHAT_FRAGMENT, "AI is searching the catalog", request_ai_response,
+        list(st.session_state.voice_chat_messages), st.session_state.voice_chat_session_id
+    )
 
 
-def process_ai_response():
-    """Call the AI backend and process the response"""
-    try:
+def request_ai_response(job, messages: list, session_id):
+    """Call the AI backend for the next turn (runs as a background job: no session state here)"""
+    # The backend keeps the history; only the new message is sent after the first turn
+    if session_id:
+        payload = {"session_id": session_id, "message": messages[-1]["content"]}
+    else:
+        payload = {"messages": messages}
+    response = requests.post(f"{API_BASE_URL}/chat_request", json=payload)
+    
+    # Session expired on the backend - re-seed it with the full history once
+    if response.status_code == 404 and session_id:
+        job.progress = "Restoring the conversation"
         response = requests.post(
             f"{API_BASE_URL}/chat_request",
-            json={"messages": st.session_state.voice_chat_messages}
+            json={"messages": messages}
         )
+    return response
+
+
+def process_ai_response(job):
+    """Add the finished AI reply job to the chat"""
+    try:
+        response = job.result()
         
         if response.ok:
             result = response.json()
+            st.session_state.voice_chat_session_id = result.get("session_id")
             
             if result["type"] == "question":
                 # AI is asking a clarifying question
@@ -51,184 +73,215 @@ def process_ai_response():
         else:
             st.session_state.voice_chat_messages.append({
                 "role": "assistant",
-                "content": f"❌ Backend Error: {response.status_code}"
+                "content": busy_message(response) or f"❌ Backend Error: {response.status_code}"
             })
     except Exception as e:
         st.session_state.voice_chat_messages.append({
             "role": "assistant",
             "content": f"❌ Could not connect to backend: {e}"
         })
+
+
+def forget_cancelled_message():
+    """After "Cancel": drop the unanswered message; the backend session may have seen it, so re-seed next turn"""
+    if st.session_state.voice_chat_messages and st.session_state.voice_chat_messages[-1]["role"] == "user":
+        st.session_state.voice_chat_messages.pop()
+    st.session_state.voice_chat_session_id = None
+
+
+def transcribe_recording(audio_bytes: bytes, content_type: str, placeholder) -> str:
+    """Send browser-recorded audio to the backend STT endpoint, showing partial transcripts as they stream in"""
+    response = requests.post(
+        f"{API_BASE_URL}/transcribe",
+        data=audio_bytes,
+        headers={"Content-Type": content_type or "audio/wav"},
+        stream=True,
+        timeout=60
+    )
+    response.raise_for_status()
     
-    st.session_state.voice_chat_pending = False
+    text = ""
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            continue
+        event = json.loads(line)
+        if "partial" in event:
+            if event["partial"]:
+                placeholder.caption(f"🎙️ {event['partial']} …")
+        else:
+            text = event.get("text", "")
+            placeholder.caption(f"🎙️ {text}  ·  {event.get('latency_ms', 0):.0f} ms, RTF {event.get('rtf', 0):.2f}")
+    return text
 
 
-def voice_request_view():
-    """Voice request view with conversational chat"""
+def recommended_product(item: dict) -> dict:
+    """Cart product for a recommended item from the backend"""
+    return {
+        'id': item.get('artikel_id', ''),
+        'name': item.get('artikelname', item.get('artikel_id', '')),
+        'price': item.get('preis_stk', 0),
+        'description': item.get('kategorie', ''),
+        'supplier': item.get('lieferant', ''),
+        'icon': '🔩'
+    }
+
+
+def add_all_recommendations(items: list):
+    """on_click callback for "Add All": fill the cart and close the recommendations"""
+    st.session_state.voice_chat_recommendations = None
+    add_to_cart_callback([(recommended_product(item), item.get('anzahl', 1)) for item in items],
+                         "✅ All items added to cart!", also_rerun=[VOICE_CHAT_FRAGMENT])
+
+
+@st.fragment(key=VOICE_CHAT_FRAGMENT)
+def chat_pane():
+    """Chat, voice/text input and recommendations (a fragment: a chat turn reruns only this pane)"""
+    st.markdown("### Create request")
+    st.caption("Speak or type your material request. I'll ask clarifying questions if needed.")
     
-    # Two column layout: main content + order summary
-    main_col, summary_col = st.columns([3, 1])
+    # Chat History Container
+    chat_container = st.container()
     
-    with main_col:
-        st.markdown("### Create request")
-        st.caption("Speak or type your material request. I'll ask clarifying questions if needed.")
-        
-        # Chat History Container
-        chat_container = st.container()
-        
-        with chat_container:
-            if st.session_state.voice_chat_messages:
-                st.markdown("---")
-                render_chat_history()
-                
-                # Process pending AI response (shows user message first, then spinner)
-                if st.session_state.voice_chat_pending:
-                    with st.spinner("🤖 AI is searching the catalog..."):
-                        process_ai_response()
-                    st.rerun()
-            else:
-                st.info("💡 Start by clicking the microphone button or typing your request below.")
-        
-        # Voice Input Section
-        st.markdown("---")
-        col1, col2 = st.columns([1, 3])
+    with chat_container:
+        if st.session_state.voice_chat_messages:
+            st.markdown("---")
+            render_chat_history()
+            
+            # Progress of the AI reply (runs in the background; the page stays usable)
+            render_job_progress(VOICE_CHAT_FRAGMENT, process_ai_response, on_cancel=forget_cancelled_message)
+        else:
+            st.info("💡 Start by clicking the microphone button or typing your request below.")
+    
+    # Voice Input Section (one message at a time: input waits for the running reply)
+    waiting_for_reply = get_job(VOICE_CHAT_FRAGMENT) is not None
+    st.markdown("---")
+    col1, col2 = st.columns([1, 3])
+    
+    with col1:
+        # Recorded in the browser, transcribed offline on the backend
+        recording = st.audio_input("🎤 Speak", key="voice_chat_record", label_visibility="collapsed",
+                                   disabled=waiting_for_reply)
+        transcript_placeholder = st.empty()
         
-        with col1:
-            if st.button("🎤 Speak", key="voice_chat_record", use_container_width=True, type="primary"):
-                r = sr.Recognizer()
-                r.energy_threshold = 300
-                
+        if recording is not None:
+            audio_bytes = recording.getvalue()
+            recording_id = hashlib.sha256(audio_bytes).hexdigest()
+            # Each recording is transcribed once, not on every rerun
+            if st.session_state.get("voice_last_recording_id") != recording_id:
+                st.session_state.voice_last_recording_id = recording_id
                 try:
-                    with sr.Microphone() as source:
-                        with st.spinner("🤫 Calibrating..."):
-                            r.adjust_for_ambient_noise(source, duration=1)
-                        
-                        with st.spinner("🎙️ Listening..."):
-                            audio = r.listen(source, timeout=5, phrase_time_limit=10)
-                        
-                        # Google Speech to Text
-                        raw_text = r.recognize_google(audio)
+                    raw_text = transcribe_recording(audio_bytes, recording.type, transcript_placeholder)
+                    if raw_text:
                         st.toast(f"Heard: '{raw_text}'")
-                        
-                        # Add message and trigger AI response
                         add_user_message(raw_text)
-                        st.rerun()
-                        
-                except sr.WaitTimeoutError:
-                    st.warning("⚠️ No speech detected. Try speaking louder.")
-                except sr.UnknownValueError:
-                    st.warning("🤔 Could not understand audio. Try again.")
+                        rerun_fragment()
+                    else:
+                        st.warning("🤔 Could not understand audio. Try again.")
+                except requests.exceptions.HTTPError as e:
+                    st.error(f"Transcription failed: {e.response.text}")
                 except Exception as e:
                     st.error(f"Error: {e}")
+    
+    with col2:
+        # Text input for follow-up
+        user_input = st.text_input(
+            "Type your message",
+            placeholder="e.g., 'I need 10 M4 screws and 2 pairs of gloves'",
+            key="voice_chat_text_input",
+            label_visibility="collapsed"
+        )
+    
+    # Send button for text input
+    col_send, col_clear = st.columns([1, 1])
+    
+    with col_send:
+        if st.button("Send", key="voice_chat_send", use_container_width=True, disabled=waiting_for_reply):
+            if user_input and user_input.strip():
+                add_user_message(user_input.strip())
+                rerun_fragment()
+    
+    with col_clear:
+        if st.button("Clear Chat", key="voice_chat_clear", use_container_width=True):
+            st.session_state.voice_chat_messages = []
+            st.session_state.voice_chat_session_id = None
+            st.session_state.voice_chat_recommendations = None
+            cancel_job(VOICE_CHAT_FRAGMENT)
+            rerun_fragment()
+    
+    # Show Recommendations if available
+    if st.session_state.voice_chat_recommendations:
+        st.markdown("---")
+        st.markdown("### Recommended Materials")
         
-        with col2:
-            # Text input for follow-up
-            user_input = st.text_input(
-                "Type your message",
-                placeholder="e.g., 'I need 10 M4 screws and 2 pairs of gloves'",
-                key="voice_chat_text_input",
-                label_visibility="collapsed"
-            )
-        
-        # Send button for text input
-        col_send, col_clear = st.columns([1, 1])
-        
-        with col_send:
-            if st.button("Send", key="voice_chat_send", use_container_width=True):
-                if user_input and user_input.strip():
-                    add_user_message(user_input.strip())
-                    st.rerun()
-        
-        with col_clear:
-            if st.button("Clear Chat", key="voice_chat_clear", use_container_width=True):
-                st.session_state.voice_chat_messages = []
-                st.session_state.voice_chat_recommendations = None
-                st.session_state.voice_chat_pending = False
-                st.rerun()
+        recommendations = st.session_state.voice_chat_recommendations
+        items = recommendations.get("items", [])
         
-        # Show Recommendations if available
-        if st.session_state.voice_chat_recommendations:
-            st.markdown("---")
-            st.markdown("### Recommended Materials")
-            
-            recommendations = st.session_state.voice_chat_recommendations
-            items = recommendations.get("items", [])
-            
-            if items:
-                # Display items in a nice format
-                for item in items:
-                    col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 0.8, 0.8])
-                    
-                    with col1:
-                        is_preferred = item.get('is_preferred', False)
-                        supplier = item.get('lieferant', '')
-                        kategorie = item.get('kategorie', '')
-                        st.markdown(f"**{item.get('artikelname', item.get('artikel_id', 'Unknown'))}**")
-                        if is_preferred:
-                            st.markdown(f"""
-                            <span style="color: #64748B; font-size: 0.875rem;">{kategorie} | </span>
-                            <span style="display: inline-block; background: #FEF2F2; border: 1.5px solid #EF4444; border-radius: 4px; padding: 1px 6px; font-size: 0.75rem; color: #DC2626; font-weight: 600;">⭐ {supplier}</span>
-                            """, unsafe_allow_html=True)
-                        else:
-                            st.caption(f"{kategorie} | {supplier}")
-                    
-                    with col2:
-                        st.markdown(f"Qty: **{item.get('anzahl', 0)}**")
-                        lead_time = item.get('lead_time_days', 7)
-                        st.caption(f"🚚 {lead_time}d lead")
-                    
-                    with col3:
-                        # Show inventory status
-                        stock = item.get('lagerbestand', 0)
-                        qty_needed = item.get('anzahl', 0)
-                        needs = item.get('needs_order', qty_needed)
-                        if stock >= qty_needed:
-                            st.markdown(f"✅ **In Stock**")
-                            st.caption(f"{stock} avail.")
-                        elif stock > 0:
-                            st.markdown(f"⚠️ **Low**")
-                            st.caption(f"Need {needs}")
-                        else:
-                            st.markdown(f"❌ **Order**")
-                            st.caption(f"Need {needs}")
-                    
-                    with col4:
-                        st.markdown(f"**€{item.get('preis_gesamt', 0):.2f}**")
-                    
-                    with col5:
-                        if st.button("➕", key=f"add_chat_{item.get('artikel_id', '')}"):
-                            product = {
-                                'id': item.get('artikel_id', ''),
-                                'name': item.get('artikelname', item.get('artikel_id', '')),
-                                'price': item.get('preis_stk', 0),
-                                'description': item.get('kategorie', ''),
-                                'supplier': item.get('lieferant', ''),
-                                'icon': '🔩'
-                            }
-                            add_to_cart(product, item.get('anzahl', 1))
-                            st.toast(f"Added {item.get('artikelname', '')} to cart!")
-                
-                # Total and Add All button
-                st.markdown("---")
-                total = recommendations.get("total", 0)
+        if items:
+            # Display items in a nice format
+            for item in items:
+                col1, col2, col3, col4, col5 = st.columns([2, 1, 1, 0.8, 0.8])
                 
-                col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.markdown(f"### Total: €{total:.2f}")
+                    is_preferred = item.get('is_preferred', False)
+                    supplier = item.get('lieferant', '')
+                    kategorie = item.get('kategorie', '')
+                    st.markdown(f"**{item.get('artikelname', item.get('artikel_id', 'Unknown'))}**")
+                    if is_preferred:
+                        st.markdown(f"""
+                        <span style="color: #64748B; font-size: 0.875rem;">{kategorie} | </span>
+                        <span style="display: inline-block; background: #FEF2F2; border: 1.5px solid #EF4444; border-radius: 4px; padding: 1px 6px; font-size: 0.75rem; color: #DC2626; font-weight: 600;">⭐ {supplier}</span>
+                        """, unsafe_allow_html=True)
+                    else:
+                        st.caption(f"{kategorie} | {supplier}")
+                
                 with col2:
-                    if st.button("🛒 Add All to Cart", key="add_all_chat", type="primary", use_container_width=True):
-                        for item in items:
-                            product = {
-                                'id': item.get('artikel_id', ''),
-                                'name': item.get('artikelname', item.get('artikel_id', '')),
-                                'price': item.get('preis_stk', 0),
-                                'description': item.get('kategorie', ''),
-                                'supplier': item.get('lieferant', ''),
-                                'icon': '🔩'
-                            }
-                            add_to_cart(product, item.get('anzahl', 1))
-                        st.success("✅ All items added to cart!")
-                        st.session_state.voice_chat_recommendations = None
-                        st.rerun()
+                    st.markdown(f"Qty: **{item.get('anzahl', 0)}**")
+                    lead_time = item.get('lead_time_days', 7)
+                    st.caption(f"🚚 {lead_time}d lead")
+                
+                with col3:
+                    # Show inventory status
+                    stock = item.get('lagerbestand', 0)
+                    qty_needed = item.get('anzahl', 0)
+                    needs = item.get('needs_order', qty_needed)
+                    if stock >= qty_needed:
+                        st.markdown(f"✅ **In Stock**")
+                        st.caption(f"{stock} avail.")
+                    elif stock > 0:
+                        st.markdown(f"⚠️ **Low**")
+                        st.caption(f"Need {needs}")
+                    else:
+                        st.markdown(f"❌ **Order**")
+                        st.caption(f"Need {needs}")
+                
+                with col4:
+                    st.markdown(f"**€{item.get('preis_gesamt', 0):.2f}**")
+                
+                with col5:
+                    product = recommended_product(item)
+                    st.button("➕", key=f"add_chat_{item.get('artikel_id', '')}", on_click=add_to_cart_callback,
+                              args=([(product, item.get('anzahl', 1))], f"Added {item.get('artikelname', '')} to cart!"))
+            
+            # Total and Add All button
+            st.markdown("---")
+            total = recommendations.get("total", 0)
+            
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                st.markdown(f"### Total: €{total:.2f}")
+            with col2:
+                st.button("🛒 Add All to Cart", key="add_all_chat", type="primary", use_container_width=True,
+                          on_click=add_all_recommendations, args=(items,))
+
+
+def voice_request_view():
+    """Voice request view with conversational chat"""
+    
+    # Two column layout: main content + order summary
+    main_col, summary_col = st.columns([3, 1])
+    
+    with main_col:
+        chat_pane()
     
     # Order Summary on the right
     with summary_col:
@@ -0,0 +1,40 @@
+"""
+Multi-worker deployment: gunicorn -c backend/gunicorn_conf.py backend.main:app
+
+The app (catalog, prompts, imports) is loaded once in the master and forked into the
+workers, so those pages are shared copy-on-write instead of duplicated per worker.
+Stock lives in shared memory (backend/utils/shared_stock.py) and is the same in every worker.
+With HAMMERTIME_PIPELINE_WORKERS set, order pipeline workers (backend/utils/order_pipeline.py)
+are started once here, not per API worker.
+"""
+import gc
+import os
+
+# Read before the app is loaded; the API workers themselves must not start pipeline workers
+PIPELINE_WORKERS = int(os.environ.get("HAMMERTIME_PIPELINE_WORKERS", 0))
+os.environ["HAMMERTIME_PIPELINE_WORKERS"] = "0"
+_pipeline_workers = None
+
+bind = os.environ.get("HAMMERTIME_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# LLM calls can take a while; don't let gunicorn kill busy workers
+timeout = 120
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the GC's reach: collections would otherwise touch
+    # (and thereby copy) every shared page in every worker.
+    gc.freeze()
+
+    global _pipeline_workers
+    if PIPELINE_WORKERS > 0:
+        from backend.utils.order_pipeline import start_workers
+        _pipeline_workers = start_workers(PIPELINE_WORKERS)
+
+
+def on_exit(server):
+    if _pipeline_workers is not None:
+        from backend.utils.order_pipeline import stop_workers
+        stop_workers(_pipeline_workers)
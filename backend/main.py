@@ -1,15 +1,90 @@
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, Path
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse, JSONResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from typing import List
-from backend.utils.request_agent import process_procurement_request, clean_voice_transcript, chat_procurement_request, analyze_image_request
+from backend.utils.request_agent import process_procurement_request, clean_voice_transcript, chat_procurement_request, analyze_image_request, ocr_fast_path_stats, clean_voice_stats, express_lane_stats, agent_flights
 from typing import Optional
 from backend.pdf_generator import generate_pdf_contract
+from backend.utils.image_store import ImageStore, image_id_for
+from backend.utils.image_processing import preprocess_image, image_fingerprint, ImageResultCache, IMAGE_ERRORS
+from backend.utils.batch_planner import plan_tasks, BATCH_MAX_CONCURRENCY
+from backend.utils.speech import decode_audio, get_model, transcribe_stream, stt_summary, SpeechUnavailableError
+from backend.utils.chat_sessions import ChatSessionStore
+from backend.utils.cassette import CASSETTE_MODE, get_cassette
+from backend.utils.shared_stock import SharedStock
+from backend.utils.admission import admission, Overloaded
+from backend.utils.model_router import model_router
+from backend.utils import resilience
+from backend.utils.resilience import DeadlineExceeded, ProviderUnavailable
+from backend.utils.structured_output import structured_stats
+from backend.utils.product_search import get_product_index, DEFAULT_LIMIT, MAX_LIMIT
+from backend.utils.site_catalog import SiteCatalogs, load_site_overlays
+from backend.utils.order_pipeline import (ORDER_PLACED, ORDER_APPROVED, APPROVED_STATUSES, ORDER_ID_PATTERN,
+                                          PIPELINE_WORKERS, get_queue,
+                                          get_order, list_orders, get_aggregates, start_workers, stop_workers)
+from backend.utils.catalog_feed import (CATALOG_PAGE_SIZE, CATALOG_MAX_PAGE_SIZE, CATALOG_RESPONSES, catalog_etag,
+                                        catalog_response)
+from backend.utils.metrics import Gauge, Histogram, stage, render_metrics
+import base64
+import binascii
 import csv
+import json
 import os
+import time
 
 app = FastAPI()
 
+HTTP_REQUEST_SECONDS = Histogram(
+    "hammertime_http_request_seconds", "Latency per route until the response starts", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("hammertime_http_requests_in_flight", "Requests currently being handled")
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """LLM capacity is exhausted: shed the request instead of letting everyone time out together."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "reason": exc.reason, "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(ProviderUnavailable)
+async def provider_unavailable_handler(request: Request, exc: ProviderUnavailable):
+    """Circuit breaker is open and the route has no local fallback."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Route latency histogram and in-flight gauge (labelled by route template, not raw path)."""
+    HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
 # Mock data
 MOCK_PARTS = [
     {
@@ -34,13 +109,14 @@ MOCK_PARTS = [
 
 class PromptRequest(BaseModel):
     prompt: str
+    site: Optional[str] = None  # construction site whose assortment, prices and suppliers apply
 
 class OrderNumberRequest(BaseModel):
     order_number: str
     parts_list: list[dict]
 
 
-# Preferred suppliers - companies we have contracts with
+# Preferred suppliers - companies we have contracts with (sites can override, see backend/data/sites.json)
 PREFERRED_SUPPLIERS = ["Würth", "Fischer", "Hilti"]
 
 # Lead times by supplier (in business days)
@@ -56,8 +132,14 @@ SUPPLIER_LEAD_TIMES = {
 
 # data parsed once at startup
 import random
+
+# Mock stock is part of every prompt; a fixed seed keeps prompts (and cassette keys) identical across runs
+STOCK_SEED = os.environ.get("HAMMERTIME_STOCK_SEED", "0" if CASSETTE_MODE else None)
+
+CATALOG_CSV = 'backend/data/sample.csv'
+
 def parse_data():
-    with open('backend/data/sample.csv', 'r', encoding='utf-8') as f:
+    with open(CATALOG_CSV, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
         c_materials = []
         for row in reader:
@@ -76,9 +158,6 @@ def parse_data():
             for _k in ('verbrauchsart', 'gefahrgut', 'gefahrengut', 'lagerort'):
                 row.pop(_k, None)
             
-            # Add mock inventory data (simulating warehouse stock)
-            row['lagerbestand'] = random.randint(0, 500)  # Current stock
-            
             # Add supplier preference and lead time
             supplier = row.get('lieferant', '')
             row['is_preferred'] = supplier in PREFERRED_SUPPLIERS
@@ -88,22 +167,236 @@ def parse_data():
     
     return c_materials
 
-c_materials_catalog = parse_data()
+def mock_initial_stock(article_ids: list) -> list:
+    """Mock inventory data (simulating warehouse stock), generated once for all workers."""
+    stock_rng = random.Random(STOCK_SEED)
+    return [stock_rng.randint(0, 500) for _ in article_ids]
+
+
+def stock_source() -> bytes:
+    """What the initial stock derives from; a shared state seeded from anything else is re-seeded."""
+    with open(CATALOG_CSV, 'rb') as f:
+        return f.read() + f"\nstock_seed={STOCK_SEED}".encode('utf-8')
+
+
+# Static catalog rows; stock lives in shared memory so every worker sees the same numbers
+catalog_rows = parse_data()
+shared_stock = SharedStock([row['artikel_id'] for row in catalog_rows], mock_initial_stock, source=stock_source())
+get_product_index(catalog_rows)  # build the type-ahead index before the first keystroke
+_catalog_snapshot = (None, [])
+
+
+def catalog_snapshot() -> tuple:
+    """
+    (version, catalog rows with current stock).
+
+    Rebuilt only when another request or worker changed stock (shared version bump);
+    otherwise the same list object is returned, so caches keyed on it stay warm.
+    Treat the rows as read-only.
+    """
+    global _catalog_snapshot
+    if _catalog_snapshot[0] != shared_stock.version():
+        version, stock = shared_stock.snapshot()
+        rows = [{**row, 'lagerbestand': quantity} for row, quantity in zip(catalog_rows, stock)]
+        _catalog_snapshot = (version, rows)
+    return _catalog_snapshot
+
+
+def current_catalog() -> list:
+    """Catalog rows with current stock (see catalog_snapshot)."""
+    return catalog_snapshot()[1]
+
+
+# Per-site overlays on the shared catalog; views are built on first use per site and stock version
+site_catalogs = SiteCatalogs(load_site_overlays())
+
+
+def site_catalog(site: Optional[str], rows: list = None) -> list:
+    """
+    The catalog as seen by a construction site (the base catalog for no site).
+
+    Args:
+        site: site_id from backend/data/sites.json, or None
+        rows: base rows to view (default: current_catalog())
+
+    Returns:
+        read-only rows, the same list object for the same site and stock version
+    """
+    if site is not None and site not in site_catalogs:
+        raise HTTPException(status_code=404, detail=f"Unknown site {site}")
+    return site_catalogs.view(site, current_catalog() if rows is None else rows)
 
 
 @app.post("/receive_user_prompt")
 async def receive_user_prompt(request: PromptRequest):
     """Receives user prompt and returns list of parts with suppliers"""
-    suggested_materials = process_procurement_request(request.prompt, c_materials_catalog)
+    suggested_materials = await run_in_threadpool(process_procurement_request, request.prompt, site_catalog(request.site))
     #TODO: validate IDs are legit
     return suggested_materials
 
 
+class BatchTask(BaseModel):
+    id: Optional[str] = None
+    prompt: str
+
+class BatchPlanRequest(BaseModel):
+    tasks: List[BatchTask]
+    max_concurrency: int = BATCH_MAX_CONCURRENCY
+    site: Optional[str] = None
+
+# Upper bound for client-requested concurrency
+BATCH_CONCURRENCY_LIMIT = 16
+
+@app.post("/plan_batch")
+async def plan_batch(request: BatchPlanRequest):
+    """
+    Plans many tasks at once (e.g. a week across several sites).
+    Tasks run concurrently under `max_concurrency` and are merged into one
+    deduplicated, supplier-grouped order. `stats` compares wall time with sequential calls.
+    Results answered by the keyword fallback (LLM unavailable) are reported as "degraded" and not ordered.
+    """
+    tasks = [{"id": t.id, "prompt": t.prompt} for t in request.tasks]
+    concurrency = max(1, min(request.max_concurrency, BATCH_CONCURRENCY_LIMIT))
+    try:
+        return await run_in_threadpool(plan_tasks, tasks, site_catalog(request.site), concurrency)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/agent_stats")
+async def agent_stats():
+    """
+    How often the express lane answered /receive_user_prompt without the LLM, and its latency.
+    `coalescing` counts agent calls actually executed vs. identical requests that shared an in-flight call.
+    `models` shows the model router's latency estimates and per-route calls, latency and cost.
+    `resilience` shows the circuit breaker, route deadlines and current hedging thresholds.
+    `structured_output` counts parse failures, invalid order lines and repair calls per agent function.
+    """
+    cassette = get_cassette()
+    return {
+        "express_lane": express_lane_stats.summary(),
+        "coalescing": agent_flights.stats(),
+        "cassette": cassette.stats() if cassette is not None else {"mode": "off"},
+        "admission": admission.stats(),
+        "models": model_router.stats(),
+        "resilience": resilience.stats(),
+        "structured_output": structured_stats.stats(),
+    }
+
+
+class StockUpdate(BaseModel):
+    artikel_id: str
+    lagerbestand: Optional[int] = None  # new absolute stock
+    delta: Optional[int] = None  # or a change, e.g. -20 after a withdrawal
+
+@app.post("/stock")
+async def update_stock(request: StockUpdate):
+    """Updates stock for one article; visible to every worker (bumps the shared catalog version)."""
+    if request.artikel_id not in shared_stock:
+        raise HTTPException(status_code=404, detail=f"Unknown artikel_id {request.artikel_id}")
+    try:
+        if request.lagerbestand is not None:
+            version = shared_stock.set(request.artikel_id, max(0, request.lagerbestand))
+        elif request.delta is not None:
+            version = shared_stock.adjust(request.artikel_id, request.delta)
+        else:
+            raise HTTPException(status_code=400, detail="Either lagerbestand or delta is required")
+    except ValueError as e:  # beyond what a stock slot holds
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "artikel_id": request.artikel_id,
+        "lagerbestand": shared_stock.get(request.artikel_id),
+        "catalog_version": version,
+    }
+
+
+@app.get("/search")
+async def search_products(q: str = "", limit: int = DEFAULT_LIMIT, site: Optional[str] = None):
+    """
+    Type-ahead product search (no LLM): prefix/token match on name, article ID, category and supplier.
+
+    The index covers the static catalog rows (of `site`'s view, one index per site); stock
+    comes live from shared memory.
+    """
+    start = time.perf_counter()
+    rows = site_catalog(site, catalog_rows)
+    with stage("search_products", "lookup"):
+        hits = get_product_index(rows).search(q, max(1, min(limit, MAX_LIMIT)))
+    results = [{**row, "lagerbestand": shared_stock.get(row["artikel_id"]), "score": score} for row, score in hits]
+    return {"query": q, "results": results, "took_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+
+@app.get("/sites")
+async def sites():
+    """Configured construction sites (their overrides) and the site view cache."""
+    return {
+        "sites": [overlay.summary() for overlay in site_catalogs.overlays.values()],
+        "views": site_catalogs.stats(),
+    }
+
+
+@app.get("/catalog")
+async def catalog_page(request: Request, page: int = 1, page_size: int = CATALOG_PAGE_SIZE):
+    """
+    One page of the catalog with current stock, for clients keeping a local copy.
+
+    The ETag names the shared state's epoch and catalog version, so a client re-sending it
+    in If-None-Match gets an empty 304 until stock changes. Bodies are gzip- or
+    Brotli-compressed (Accept-Encoding) and encoded once per version.
+    After the first load, /catalog/changes keeps the copy current.
+    """
+    page_size = max(1, min(page_size, CATALOG_MAX_PAGE_SIZE))
+    pages = max(1, -(-len(catalog_rows) // page_size))
+    if not 1 <= page <= pages:
+        raise HTTPException(status_code=404, detail=f"page must be between 1 and {pages}")
+    version, rows = catalog_snapshot()
+    epoch = shared_stock.epoch()
+    start = (page - 1) * page_size
+    etag = catalog_etag(epoch, version, f"page{page}-{page_size}")
+    return catalog_response(request, "page", etag, lambda: {
+        "epoch": f"{epoch:x}",
+        "version": version,
+        "page": page,
+        "pages": pages,
+        "page_size": page_size,
+        "total": len(rows),
+        "items": rows[start:start + page_size],
+    })
+
+
+@app.get("/catalog/changes")
+async def catalog_changes(request: Request, since: int, epoch: Optional[str] = None):
+    """
+    Delta feed: catalog rows whose stock changed after version `since`.
+
+    304 when nothing changed. `reset: true` when the client's copy is from another epoch
+    (the shared state was re-created) or from the future; it then reloads /catalog.
+    """
+    current_epoch = shared_stock.epoch()
+    version, changed = shared_stock.changes_since(since)
+    if (epoch is not None and epoch != f"{current_epoch:x}") or since > version:
+        CATALOG_RESPONSES.inc(endpoint="changes", outcome="reset", encoding="identity")
+        return {"epoch": f"{current_epoch:x}", "version": version, "reset": True, "items": []}
+
+    etag = catalog_etag(current_epoch, version, f"since{since}")
+    if not changed:
+        CATALOG_RESPONSES.inc(endpoint="changes", outcome="not_modified", encoding="none")
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return catalog_response(request, "changes", etag, lambda: {
+        "epoch": f"{current_epoch:x}",
+        "version": version,
+        "since": since,
+        "reset": False,
+        "items": [{**catalog_rows[i], "lagerbestand": quantity} for i, quantity in changed],
+    }, outcome="delta")
+
+
 @app.post("/generate_contract")
 async def generate_contract(request: OrderNumberRequest):
     """Generates PDF contract for the approved parts and returns the PDF file."""
     filename = f"contract_{request.order_number}.pdf"
-    pdf = generate_pdf_contract(request.parts_list, filename)
+    with stage("generate_pdf_contract", "render"):
+        pdf = generate_pdf_contract(request.parts_list, filename)
     
     # Check if file exists and return it
     if os.path.exists(filename):
@@ -116,6 +409,105 @@ async def generate_contract(request: OrderNumberRequest):
         return {"status": "error", "message": "Failed to generate PDF"}
 
 
+# Orders go through the event pipeline (backend/utils/order_pipeline.py): the API only records
+# the event, worker processes store the order, render the contract and update the reports
+order_events = get_queue()
+_pipeline_workers = None
+PIPELINE_LAG = Gauge("hammertime_pipeline_lag_seconds", "Age of the oldest unclaimed order pipeline event", ("topic",))
+PIPELINE_DEPTH = Gauge("hammertime_pipeline_events", "Open order pipeline events", ("topic", "state"))
+PIPELINE_THROUGHPUT = Gauge("hammertime_pipeline_events_per_second",
+                            "Order pipeline events completed per second (last minute)", ("worker",))
+
+
+@app.on_event("startup")
+def start_pipeline_workers():
+    """Embedded pipeline workers, only with HAMMERTIME_PIPELINE_WORKERS set (and a single uvicorn process)."""
+    global _pipeline_workers
+    workers = int(os.environ.get("HAMMERTIME_PIPELINE_WORKERS", PIPELINE_WORKERS))
+    if workers > 0:
+        _pipeline_workers = start_workers(workers, order_events.path)
+
+
+@app.on_event("shutdown")
+def stop_pipeline_workers():
+    if _pipeline_workers is not None:
+        stop_workers(_pipeline_workers)
+
+
+class OrderPlacedRequest(BaseModel):
+    order_id: str = Field(pattern=ORDER_ID_PATTERN)  # "ORD-1A2B3C4D"
+    total: float
+    status: str  # "Auto-Approved", "Admin Approved", "Pending Approval" or "Order Declined"
+    items: list[dict]  # cart lines: id, name, qty, price, supplier, ...
+    requester: str = "Site Foreman"
+    placed_at: Optional[str] = None
+    site: Optional[str] = None
+
+class OrderApprovalRequest(BaseModel):
+    status: str = "Approved"
+
+@app.post("/orders", status_code=202)
+async def place_order(request: OrderPlacedRequest):
+    """
+    Publishes order.placed and returns right away; the workers store the order and, once it is
+    approved, render its contract and update the reports. Re-sending a still unprocessed order is a no-op.
+    """
+    event_id = await run_in_threadpool(order_events.publish, ORDER_PLACED, request.model_dump(),
+                                       f"{ORDER_PLACED}:{request.order_id}")
+    return {"order_id": request.order_id, "event_id": event_id, "queued": event_id is not None}
+
+
+@app.post("/orders/{order_id}/approve", status_code=202)
+async def approve_order(request: OrderApprovalRequest, order_id: str = Path(pattern=ORDER_ID_PATTERN)):
+    """Publishes order.approved (e.g. an admin re-approving a declined order); the contract follows."""
+    if request.status not in APPROVED_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(APPROVED_STATUSES)}")
+    event_id = await run_in_threadpool(order_events.publish, ORDER_APPROVED, {"order_id": order_id, "status": request.status},
+                                       f"{ORDER_APPROVED}:{order_id}")
+    return {"order_id": order_id, "event_id": event_id, "queued": event_id is not None}
+
+
+@app.get("/orders")
+async def orders(limit: int = 100):
+    """Orders as processed by the pipeline, newest change first (`contract_ready` once the PDF exists)."""
+    return {"orders": await run_in_threadpool(list_orders, order_events, max(1, min(limit, 1000)))}
+
+
+@app.get("/orders/{order_id}/contract")
+async def order_contract(order_id: str = Path(pattern=ORDER_ID_PATTERN)):
+    """The contract PDF rendered by the pipeline; 404 until it is ready."""
+    order = await run_in_threadpool(get_order, order_events, order_id)
+    if order is None or order["contract_path"] is None or not os.path.exists(order["contract_path"]):
+        raise HTTPException(status_code=404, detail=f"No contract for {order_id} yet")
+    return FileResponse(path=order["contract_path"], media_type="application/pdf",
+                        filename=os.path.basename(order["contract_path"]))
+
+
+@app.get("/reports/summary")
+async def reports_summary():
+    """Report aggregates kept up to date by the pipeline workers."""
+    return await run_in_threadpool(get_aggregates, order_events)
+
+
+@app.get("/pipeline_stats")
+async def pipeline_stats():
+    """
+    Order pipeline health: open events per topic (ready, retrying, in flight, dead), lag of the
+    oldest unclaimed event, and events completed per topic and per worker over the last minute.
+    """
+    return await run_in_threadpool(order_events.stats)
+
+
+def _update_pipeline_metrics():
+    stats = order_events.stats()
+    for topic, entry in stats["topics"].items():
+        PIPELINE_LAG.set(entry["lag_seconds"], topic=topic)
+        for state in ("ready", "retrying", "in_flight", "dead"):
+            PIPELINE_DEPTH.set(entry.get(state, 0), topic=topic, state=state)
+    for worker, entry in stats["workers"].items():
+        PIPELINE_THROUGHPUT.set(entry["per_second"], worker=worker)
+
+
 @app.post("/send_foreman_approval")
 async def send_foreman_approval(approval_data: dict):
     """Handles foreman approval button click."""
@@ -140,6 +532,13 @@ async def get_procurement_approvals():
     return MOCK_PARTS
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format: route/stage latency histograms, LLM tokens, parse failures, fuzzy fallbacks, pipeline lag."""
+    await run_in_threadpool(_update_pipeline_metrics)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -150,52 +549,263 @@ class CleanVoiceRequest(BaseModel):
 
 @app.post("/clean_voice_input")
 async def clean_voice_input(request: CleanVoiceRequest):
-    """Refines raw voice text using Claude"""
-    cleaned_text = clean_voice_transcript(request.text)
+    """Refines raw voice text (rule-based, Claude only for ambiguous transcripts)"""
+    cleaned_text = await run_in_threadpool(clean_voice_transcript, request.text)
     return {"cleaned": cleaned_text}
 
 
+@app.post("/transcribe")
+async def transcribe(request: Request):
+    """
+    Offline speech-to-text for audio recorded in the browser.
+
+    Send the raw audio as the request body (WAV, or webm/ogg if ffmpeg is installed).
+    Streams newline-delimited JSON: {"partial": ...} events while decoding, then
+    {"text": ..., "latency_ms": ..., "rtf": ...}.
+    """
+    data = await request.body()
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty audio body")
+    try:
+        # loading the model (first call) and decoding block for a while: keep the event loop free
+        await run_in_threadpool(get_model)
+    except SpeechUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        pcm, rate = await run_in_threadpool(decode_audio, data, request.headers.get("content-type", "audio/wav"))
+    except Exception as e:
+        raise HTTPException(status_code=415, detail=f"Could not decode audio: {e}")
+
+    def events():
+        for event in transcribe_stream(pcm, rate):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.get("/voice_stats")
+async def voice_stats():
+    """Speech-to-text latency and real-time factor, and /clean_voice_input latency by path (local vs LLM)."""
+    return {"transcribe": stt_summary(), "clean_voice_input": clean_voice_stats.summary()}
+
+
 class ChatMessage(BaseModel):
     role: str
     content: str
 
 class ChatRequest(BaseModel):
-    messages: List[ChatMessage]
+    session_id: Optional[str] = None  # server-side history from a previous turn (preferred)
+    message: Optional[str] = None  # the new user message when using session_id
+    messages: Optional[List[ChatMessage]] = None  # legacy / re-seed: full history every turn
+    site: Optional[str] = None  # construction site; kept for later turns of the session
+
+# Chat histories kept server-side and compacted to a token budget
+chat_sessions = ChatSessionStore()
+
+
+def _begin_chat_turn(session_id: Optional[str], message: Optional[str], messages: Optional[List[ChatMessage]],
+                     **context) -> str:
+    """
+    Resolve the session for a chat turn and add the new user message to it.
+
+    A full `messages` history starts a new session seeded with it (legacy clients, or
+    re-seeding after the old session expired). Otherwise `message` is appended to
+    `session_id`, or starts a new session when no id is given.
+    """
+    if messages:
+        return chat_sessions.create([{"role": m.role, "content": m.content} for m in messages], **context)
+    if not message:
+        raise HTTPException(status_code=400, detail="Either message or messages is required")
+    if session_id is None:
+        return chat_sessions.create([{"role": "user", "content": message}], **context)
+    if not chat_sessions.add_message(session_id, "user", message):
+        # expired - client has to resend the full history once
+        raise HTTPException(status_code=404, detail="Unknown or expired session_id")
+    return session_id
+
+
+def _session_catalog(session_id: str, site: Optional[str]) -> list:
+    """Catalog for a chat turn: the request's site, else the site the session started with."""
+    context = chat_sessions.context(session_id)
+    if site is not None:
+        context["site"] = site
+    return site_catalog(context.get("site"))
+
+
+def _finish_chat_turn(session_id: str, result: dict) -> dict:
+    """Record the assistant reply in the session and tag the result with the session."""
+    if result.get("type") == "error":
+        # forget the unanswered user turn so a retry does not send it twice
+        chat_sessions.drop_last_message(session_id)
+    elif result.get("type") == "recommendations":
+        content = result["content"]
+        items = ", ".join(f"{item.get('anzahl')}x {item.get('artikel_id')}" for item in content.get("items", []))
+        chat_sessions.add_message(session_id, "assistant", f"Recommended: {items}. {content.get('explanation', '')}".strip())
+    else:
+        chat_sessions.add_message(session_id, "assistant", str(result.get("content", "")))
+    result["session_id"] = session_id
+    result["history_tokens"] = chat_sessions.history_tokens(session_id)
+    return result
+
 
 @app.post("/chat_request")
 async def chat_request(request: ChatRequest):
     """
     Conversational chat endpoint for procurement requests.
     AI will ask clarifying questions or return final recommendations.
+    Send `session_id` + `message` after the first turn; the backend keeps the history.
     """
-    messages = [{"role": m.role, "content": m.content} for m in request.messages]
-    result = chat_procurement_request(messages, c_materials_catalog)
-    return result
+    if request.site is not None:
+        site_catalog(request.site)  # unknown site: 404 before the turn is recorded
+    session_id = _begin_chat_turn(request.session_id, request.message, request.messages)
+    catalog = _session_catalog(session_id, request.site)
+    messages = chat_sessions.history(session_id)
+    try:
+        result = await run_in_threadpool(chat_procurement_request, messages, catalog)
+    except Overloaded:
+        chat_sessions.drop_last_message(session_id)
+        raise
+    return _finish_chat_turn(session_id, result)
 
 
-class ImageAnalysisRequest(BaseModel):
+@app.get("/chat_stats")
+async def chat_stats():
+    """Open chat sessions and the size of the history sent to the model per turn."""
+    return chat_sessions.stats()
+
+
+# Uploaded images live here, so chat turns only need to send the image_id
+image_store = ImageStore()
+# Analysis results per image content and conversation
+image_result_cache = ImageResultCache()
+
+
+def _decode_image(image_base64: str) -> bytes:
+    try:
+        return base64.b64decode(image_base64, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="image_base64 is not valid base64")
+
+
+def _store_normalized_image(data: bytes, enhance_contrast: bool = False) -> dict:
+    """
+    Normalize raw upload bytes and store them under the hash of the original.
+
+    Decodes and re-encodes the image: call it via run_in_threadpool from async handlers.
+    """
+    image_id = image_id_for(data)
+    existing = image_store.get(image_id)
+    if existing is not None:
+        return {"image_id": image_id, "media_type": existing[1]}
+    try:
+        normalized = preprocess_image(data, enhance_contrast=enhance_contrast)
+    except IMAGE_ERRORS:
+        raise HTTPException(status_code=400, detail="Unsupported or corrupt image")
+    image_store.put(normalized["data"], normalized["media_type"], image_id=image_id)
+    return {"image_id": image_id, **{k: v for k, v in normalized.items() if k != "data"}}
+
+
+class ImageUploadRequest(BaseModel):
     image_base64: str
     media_type: str  # e.g., "image/jpeg", "image/png"
-    messages: List[ChatMessage]
+    enhance_contrast: bool = False  # boost contrast for handwritten lists
+
+@app.post("/upload_image")
+async def upload_image(request: ImageUploadRequest):
+    """
+    Store an image server-side once and return its content-hash `image_id`.
+    The image is normalized (EXIF rotation, capped resolution, JPEG re-encode) before storing.
+    Follow-up /analyze_image turns reference the image by this id.
+    """
+    data = _decode_image(request.image_base64)
+    stored = await run_in_threadpool(_store_normalized_image, data, request.enhance_contrast)
+    return {"image_id": stored["image_id"], "media_type": stored["media_type"], "size": len(data)}
+
+
+class ImageAnalysisRequest(BaseModel):
+    image_id: Optional[str] = None  # from /upload_image (preferred)
+    image_base64: Optional[str] = None  # legacy: full image with every turn
+    media_type: Optional[str] = None  # e.g., "image/jpeg", "image/png"
+    session_id: Optional[str] = None  # server-side history from a previous turn (preferred)
+    message: Optional[str] = None  # the new user message when using session_id
+    messages: Optional[List[ChatMessage]] = None  # legacy / re-seed: full history every turn
+    site: Optional[str] = None  # construction site; kept for later turns of the session
 
 @app.post("/analyze_image")
 async def analyze_image(request: ImageAnalysisRequest):
     """
     Analyze an uploaded image (handwritten list or photo of parts).
     AI will describe what it sees and ask clarifying questions or provide recommendations.
+    The same image with the same conversation is answered from cache.
+    Send `session_id` + `message` after the first turn; the backend keeps the history and image.
     """
-    messages = [{"role": m.role, "content": m.content} for m in request.messages]
-    result = analyze_image_request(
-        request.image_base64,
-        request.media_type,
-        messages,
-        c_materials_catalog
-    )
-    return result
-
+    if request.image_id:
+        image_id = request.image_id
+    elif request.image_base64:
+        image_id = (await run_in_threadpool(_store_normalized_image, _decode_image(request.image_base64)))["image_id"]
+    elif request.session_id and chat_sessions.exists(request.session_id):
+        image_id = chat_sessions.context(request.session_id).get("image_id")
+    else:
+        raise HTTPException(status_code=400, detail="Either image_id or image_base64 is required")
+
+    stored = image_store.get(image_id)
+    if stored is None:
+        # expired or evicted - client has to upload the image again
+        raise HTTPException(status_code=404, detail="Unknown or expired image_id")
+    data, media_type = stored
+    if request.site is not None:
+        site_catalog(request.site)  # unknown site: 404 before the turn is recorded
+
+    session_id = _begin_chat_turn(request.session_id, request.message, request.messages, image_id=image_id)
+    # a re-uploaded image gets a new id; keep the session pointing at it
+    chat_sessions.context(session_id)["image_id"] = image_id
+    catalog = _session_catalog(session_id, request.site)
+    site = chat_sessions.context(session_id).get("site") or ""
+    messages = chat_sessions.history(session_id)
+    fingerprint = await run_in_threadpool(image_fingerprint, data)
+
+    result = image_result_cache.lookup(fingerprint["content_hash"], messages, scope=site,
+                                      phash=fingerprint["phash"])
+    if result is not None:
+        result["cached"] = True
+    else:
+        try:
+            result = await run_in_threadpool(
+                analyze_image_request,
+                base64.b64encode(data).decode("utf-8"),
+                media_type,
+                messages,
+                catalog
+            )
+        except Overloaded:
+            chat_sessions.drop_last_message(session_id)
+            raise
+        if result.get("source") != "local_ocr":
+            image_result_cache.record_image(fingerprint["vision_tokens"])
+        if result.get("type") != "error":
+            image_result_cache.store(fingerprint["content_hash"], messages, result, scope=site,
+                                     phash=fingerprint["phash"])
+        result["cached"] = False
+
+    result["image_id"] = image_id
+    result["vision_tokens"] = fingerprint["vision_tokens"]
+    return _finish_chat_turn(session_id, result)
+
+
+@app.get("/image_stats")
+async def image_stats():
+    """Image store occupancy, result cache hit rate, vision tokens per image and local OCR usage."""
+    return {
+        "store": image_store.stats(),
+        "analysis_cache": image_result_cache.stats(),
+        "local_ocr": ocr_fast_path_stats.summary(),
+    }
 
 if __name__ == "__main__":
     import uvicorn
     # Run with: python -m backend.main
     # Or: uvicorn backend.main:app --reload
+    # A single process here, so it can run the order pipeline itself (multi-process setups run
+    # `python -m backend.utils.order_pipeline` instead)
+    os.environ.setdefault("HAMMERTIME_PIPELINE_WORKERS", "1")
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -7,11 +7,7 @@ from datetime import date
 from functools import partial
 
 
-doc = SimpleDocTemplate("example.pdf", pagesize=A4)
 styles = getSampleStyleSheet()
-elements = []
-
-elements.append(Paragraph("Contracted Products", styles["Heading3"]))
 
 def create_table(data: list[dict]) -> tuple[Table, float]:
     """
@@ -148,8 +144,8 @@ def generate_pdf_contract(contract_data: list[dict], output_path: str):
         ("ALIGN", (2,1), (-1,-1), "CENTER"),
     ]))
 
-    print(contract_data)
-
+    # a fresh list per contract: long-running workers render many contracts in one process
+    elements = [Paragraph("Contracted Products", styles["Heading3"])]
     elements.append(table)
     
     # Add some space
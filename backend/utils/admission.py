@@ -0,0 +1,181 @@
+import os
+import math
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+
+from backend.utils.metrics import Counter, Gauge, Histogram
+
+
+# Provider limits we stay under (overridable via environment)
+LLM_MAX_CONCURRENCY = int(os.environ.get("HAMMERTIME_LLM_MAX_CONCURRENCY", 8))
+LLM_CALLS_PER_MINUTE = int(os.environ.get("HAMMERTIME_LLM_PER_MINUTE", 50))
+# Waiting calls beyond this are rejected right away (429)
+LLM_MAX_QUEUE = int(os.environ.get("HAMMERTIME_LLM_MAX_QUEUE", 64))
+
+# Lower rank is served first; max_wait is how long a call may queue before it is shed
+PRIORITIES = {
+    "interactive": {"rank": 0, "max_wait": float(os.environ.get("HAMMERTIME_LLM_MAX_WAIT_INTERACTIVE", 30))},
+    "bulk": {"rank": 1, "max_wait": float(os.environ.get("HAMMERTIME_LLM_MAX_WAIT_BULK", 600))},
+}
+
+# Priority of LLM calls made in the current request/thread (set by endpoints and the batch planner)
+llm_priority = contextvars.ContextVar("llm_priority", default="interactive")
+
+QUEUE_DEPTH = Gauge("hammertime_admission_queue_depth", "LLM calls waiting for admission", ("priority",))
+WAIT_SECONDS = Histogram("hammertime_admission_wait_seconds", "Time LLM calls spent queued", ("priority",))
+REJECTED = Counter("hammertime_admission_rejected_total", "LLM calls shed with 429", ("priority", "reason"))
+
+
+class Overloaded(Exception):
+    """Raised when an LLM call is shed; `retry_after` is a suggested wait in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"LLM capacity exhausted ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Priority queue in front of the LLM: caps concurrent calls and calls per minute.
+
+    Calls wait in priority order (interactive before bulk, FIFO within a priority).
+    The head of the queue is admitted once a concurrency slot is free and the
+    per-minute token bucket has a token. Calls are shed with `Overloaded` when the
+    queue is full or when they waited longer than their priority's `max_wait`.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, per_minute: int = LLM_CALLS_PER_MINUTE,
+                 max_queue: int = LLM_MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.per_minute = per_minute
+        self.max_queue = max_queue
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (rank, seq)
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._tokens = float(per_minute)
+        self._refilled = time.monotonic()
+        self._avg_call_seconds = 5.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def slot(self, priority: str = None):
+        """Context manager holding one admitted LLM call."""
+        return _Slot(self, priority or llm_priority.get())
+
+    def acquire(self, priority: str, max_wait: float = None):
+        """Wait for a slot; shed after the priority's max_wait (or `max_wait`, if shorter)."""
+        config = PRIORITIES.get(priority, PRIORITIES["interactive"])
+        start = time.monotonic()
+        deadline = start + min(config["max_wait"], max_wait if max_wait is not None else config["max_wait"])
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self._reject(priority, "queue_full")
+            entry = (config["rank"], next(self._seq))
+            heapq.heappush(self._queue, entry)
+            QUEUE_DEPTH.inc(priority=priority)
+            try:
+                while True:
+                    self._refill()
+                    if self._queue[0] == entry and self._in_flight < self.max_concurrency and self._tokens >= 1:
+                        break
+                    now = time.monotonic()
+                    if now >= deadline:
+                        self._queue.remove(entry)
+                        heapq.heapify(self._queue)
+                        self._cond.notify_all()
+                        self._reject(priority, "timeout")
+                    timeout = deadline - now
+                    if self._tokens < 1:
+                        timeout = min(timeout, (1 - self._tokens) * 60 / self.per_minute)
+                    self._cond.wait(timeout)
+                heapq.heappop(self._queue)
+                self._tokens -= 1
+                self._in_flight += 1
+                self.admitted += 1
+                # the next waiter may be admissible too
+                self._cond.notify_all()
+            finally:
+                QUEUE_DEPTH.dec(priority=priority)
+        WAIT_SECONDS.observe(time.monotonic() - start, priority=priority)
+
+    def try_acquire(self, priority: str) -> bool:
+        """Take a slot only if one is free right now and nobody is queued (for optional extra calls)."""
+        with self._cond:
+            self._refill()
+            if self._queue or self._in_flight >= self.max_concurrency or self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self._in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self, seconds: float):
+        with self._cond:
+            self._in_flight -= 1
+            self._avg_call_seconds = 0.9 * self._avg_call_seconds + 0.1 * seconds
+            self._cond.notify_all()
+
+    def retry_after(self) -> int:
+        """Rough seconds until a newly queued call would be served."""
+        with self._cond:
+            return self._retry_after()
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill()
+            depth = {}
+            for rank, _ in self._queue:
+                name = next(n for n, c in PRIORITIES.items() if c["rank"] == rank)
+                depth[name] = depth.get(name, 0) + 1
+            return {
+                "in_flight": self._in_flight,
+                "queued": depth,
+                "tokens_left": round(self._tokens, 1),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "max_concurrency": self.max_concurrency,
+                "per_minute": self.per_minute,
+                "max_queue": self.max_queue,
+                "avg_call_seconds": round(self._avg_call_seconds, 2),
+            }
+
+    # --- internals (caller holds the lock) ---
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(float(self.per_minute), self._tokens + (now - self._refilled) * self.per_minute / 60)
+        self._refilled = now
+
+    def _retry_after(self) -> int:
+        waves = (len(self._queue) + 1) / max(1, self.max_concurrency)
+        by_concurrency = waves * self._avg_call_seconds
+        by_rate = len(self._queue) * 60 / max(1, self.per_minute)
+        return max(1, math.ceil(max(by_concurrency, by_rate)))
+
+    def _reject(self, priority: str, reason: str):
+        self.rejected += 1
+        REJECTED.inc(priority=priority, reason=reason)
+        raise Overloaded(reason, self._retry_after())
+
+
+class _Slot:
+    def __init__(self, controller: AdmissionController, priority: str):
+        self.controller = controller
+        self.priority = priority
+
+    def __enter__(self):
+        self.controller.acquire(self.priority)
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.controller.release(time.monotonic() - self._start)
+        return False
+
+
+admission = AdmissionController()
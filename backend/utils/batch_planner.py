@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from backend.utils.request_agent import process_procurement_request
+from backend.utils.admission import llm_priority
+
+
+# Parallel LLM calls per batch; keep below the provider's concurrency limit
+BATCH_MAX_CONCURRENCY = int(os.environ.get("HAMMERTIME_BATCH_CONCURRENCY", 4))
+
+
+def task_id_for(task: dict) -> str:
+    """Stable id for a task: its own id, or a hash of the prompt (so resumed runs line up)."""
+    explicit = task.get("id") or task.get("request_id")
+    if explicit:
+        return str(explicit)
+    return hashlib.sha1(task_prompt(task).encode("utf-8")).hexdigest()[:12]
+
+
+def task_prompt(task: dict) -> str:
+    """Prompt text of a task; accepts {"prompt"} or requests.jsonl-style {"title", "body"}."""
+    return task.get("prompt") or task.get("body") or task.get("title", "")
+
+
+def load_checkpoint(path: str) -> dict:
+    """Completed task results from a previous run, keyed by task id (degraded or failed ones run again)."""
+    done = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written last line of an interrupted run
+            if entry.get("status") == "ok":
+                done[entry["id"]] = entry
+    return done
+
+
+def plan_tasks(tasks: list, catalog: list, max_concurrency: int = BATCH_MAX_CONCURRENCY,
+               checkpoint_path: str = None, on_result=None) -> dict:
+    """
+    Run many procurement tasks concurrently and merge them into one order.
+
+    Args:
+        tasks: list of {"id"?, "prompt"} (or {"request_id", "title", "body"})
+        catalog: C-materials catalog passed to the agent
+        max_concurrency: maximum parallel agent calls
+        checkpoint_path: optional JSONL file; finished tasks are appended as they
+            complete and skipped when the same run is started again
+        on_result: optional callback(entry) per finished task (progress output)
+
+    Returns:
+        dict with 'order' (merged, supplier-grouped), 'tasks' (per-task entries) and 'stats'
+
+    Raises:
+        ValueError: if two tasks share an id but not the prompt
+    """
+    prompts = {}
+    for task in tasks:
+        tid, prompt = task_id_for(task), task_prompt(task)
+        if prompts.setdefault(tid, prompt) != prompt:
+            raise ValueError(f"Task id {tid!r} is used for two different prompts")
+
+    done = load_checkpoint(checkpoint_path)
+    entries = {}
+    pending = []
+    for tid, prompt in prompts.items():
+        # an edited prompt under the same id is a new task
+        if tid in done and done[tid]["prompt"] == prompt:
+            entries[tid] = {**done[tid], "resumed": True}
+        else:
+            entries[tid] = None
+            pending.append((tid, prompt))
+
+    lock = threading.Lock()
+    checkpoint = open(checkpoint_path, "a", encoding="utf-8") if checkpoint_path else None
+
+    def run(tid, prompt):
+        # executor threads don't inherit the request context; batch work always queues behind chat
+        llm_priority.set("bulk")
+        start = time.perf_counter()
+        try:
+            result = process_procurement_request(prompt, catalog)
+            # keyword fallback while the LLM was unavailable: kept out of the order and retried on resume
+            status = "degraded" if result.get("source") == "degraded" else "ok"
+            entry = {"id": tid, "prompt": prompt, "status": status, "result": result}
+        except Exception as e:
+            entry = {"id": tid, "prompt": prompt, "status": "error", "error": str(e)}
+        entry["latency_s"] = round(time.perf_counter() - start, 3)
+        return entry
+
+    wall_start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+            futures = [pool.submit(run, tid, prompt) for tid, prompt in pending]
+            for future in as_completed(futures):
+                entry = future.result()
+                with lock:
+                    entries[entry["id"]] = entry
+                    if checkpoint:
+                        checkpoint.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                        checkpoint.flush()
+                if on_result:
+                    on_result(entry)
+    finally:
+        if checkpoint:
+            checkpoint.close()
+    wall = time.perf_counter() - wall_start
+
+    ran = [e for e in entries.values() if e and not e.get("resumed")]
+    sequential = sum(e["latency_s"] for e in ran)
+    stats = {
+        "tasks": len(entries),
+        "completed": sum(1 for e in entries.values() if e and e["status"] == "ok"),
+        "failed": sum(1 for e in ran if e["status"] == "error"),
+        "degraded": sum(1 for e in ran if e["status"] == "degraded"),
+        "resumed": sum(1 for e in entries.values() if e and e.get("resumed")),
+        "max_concurrency": max_concurrency,
+        "wall_seconds": round(wall, 3),
+        # what the same calls would have taken one after another
+        "sequential_seconds": round(sequential, 3),
+        "speedup": round(sequential / wall, 2) if wall > 0 and ran else 0.0,
+        "tasks_per_minute": round(len(ran) / wall * 60, 1) if wall > 0 and ran else 0.0,
+    }
+
+    ordered = [entries[tid] for tid in entries]
+    return {"order": merge_results(ordered), "tasks": ordered, "stats": stats}
+
+
+def merge_results(entries: list, approval_threshold: float = 500.0) -> dict:
+    """
+    Merge per-task results into one deduplicated order grouped by supplier.
+
+    Identical articles are summed across tasks; `needs_order` is recomputed
+    against stock for the combined quantity.
+    """
+    merged = {}
+    for entry in entries:
+        if not entry or entry.get("status") != "ok":
+            continue
+        for item in entry["result"].get("items", []):
+            key = item.get("artikel_id")
+            if key in merged:
+                line = merged[key]
+                line["anzahl"] += item.get("anzahl", 0)
+                line["tasks"].append(entry["id"])
+            else:
+                merged[key] = {**item, "tasks": [entry["id"]]}
+
+    suppliers = {}
+    total = 0.0
+    for line in merged.values():
+        line["preis_gesamt"] = round(line["anzahl"] * line.get("preis_stk", 0.0), 2)
+        line["needs_order"] = max(0, line["anzahl"] - line.get("lagerbestand", 0))
+        total += line["preis_gesamt"]
+
+        supplier = line.get("lieferant") or "Unknown"
+        group = suppliers.setdefault(supplier, {
+            "lieferant": supplier,
+            "is_preferred": line.get("is_preferred", False),
+            "lead_time_days": line.get("lead_time_days", 7),
+            "subtotal": 0.0,
+            "items": [],
+        })
+        group["items"].append(line)
+        group["subtotal"] = round(group["subtotal"] + line["preis_gesamt"], 2)
+
+    # preferred suppliers first, then by order value
+    grouped = sorted(suppliers.values(), key=lambda g: (not g["is_preferred"], -g["subtotal"]))
+    total = round(total, 2)
+    return {
+        "total": total,
+        "requireApproval": total > approval_threshold,
+        "suppliers": grouped,
+        "line_count": len(merged),
+    }
+
+
+def read_jsonl(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan a batch of procurement tasks into one merged order.")
+    parser.add_argument("tasks", help="JSONL file, one task per line ({'id', 'prompt'} or {'request_id', 'title', 'body'})")
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY, help="parallel agent calls")
+    parser.add_argument("--checkpoint", default=None, help="checkpoint JSONL (default: <tasks>.checkpoint.jsonl)")
+    parser.add_argument("--out", default="batch_order.json", help="where to write the merged order")
+    args = parser.parse_args()
+
+    # Catalog is loaded the same way the API does it
+    from backend.main import current_catalog
+
+    tasks = read_jsonl(args.tasks)
+    checkpoint = args.checkpoint or f"{os.path.splitext(args.tasks)[0]}.checkpoint.jsonl"
+
+    def progress(entry):
+        status = entry["status"]
+        if status == "error":
+            status = f"error: {entry.get('error')}"
+        elif status == "degraded":
+            status = "degraded (LLM unavailable, rerun to retry)"
+        print(f"[{entry['id']}] {entry['latency_s']:.2f}s {status}")
+
+    try:
+        plan = plan_tasks(tasks, current_catalog(), args.concurrency, checkpoint, on_result=progress)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+
+    stats = plan["stats"]
+    order = plan["order"]
+    print(f"\n{stats['completed']}/{stats['tasks']} tasks ok ({stats['resumed']} resumed, "
+          f"{stats['failed']} failed, {stats['degraded']} degraded)")
+    print(f"Wall time {stats['wall_seconds']}s vs {stats['sequential_seconds']}s sequential "
+          f"(x{stats['speedup']}, {stats['tasks_per_minute']} tasks/min)")
+    for group in order["suppliers"]:
+        print(f"  {group['lieferant']}: {len(group['items'])} lines, €{group['subtotal']:.2f}")
+    print(f"Total €{order['total']:.2f} -> {args.out}")
+
+
+# Example usage:
+#   python -m backend.utils.batch_planner monday_tasks.jsonl --concurrency 4
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+from anthropic.types import Message
+
+
+# "record" appends every LLM exchange to the cassette file, "replay" answers from it without
+# network access, "replay_timed" also sleeps for the recorded latency. Empty = off.
+CASSETTE_MODE = os.environ.get("HAMMERTIME_LLM_CASSETTE_MODE", "").lower()
+CASSETTE_PATH = os.environ.get("HAMMERTIME_LLM_CASSETTE", "llm_cassette.jsonl")
+
+CASSETTE_MODES = ("record", "replay", "replay_timed")
+
+
+class CassetteMiss(LookupError):
+    """Replay mode got a request that was never recorded."""
+
+
+def request_key(kwargs: dict) -> str:
+    """
+    Hash of the request (system, messages, tools, limits).
+
+    The model is left out: the router picks it from live latencies and a probe counter,
+    so a replay may route differently than the recording did for the same request.
+    """
+    payload = json.dumps({k: v for k, v in kwargs.items() if k != "model"},
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Append-only JSONL recording of LLM request/response pairs, keyed by request hash.
+
+    Each line holds the key, calling function, model, measured latency and the full
+    response. When a key was recorded more than once, replay serves the latest entry.
+    """
+
+    def __init__(self, path: str = CASSETTE_PATH, mode: str = CASSETTE_MODE):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}, expected one of {CASSETTE_MODES}")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._entries = self._load() if mode != "record" else {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode in ("replay", "replay_timed")
+
+    def record(self, function: str, kwargs: dict, response, latency_seconds: float):
+        entry = {
+            "key": request_key(kwargs),
+            "function": function,
+            "model": kwargs.get("model"),
+            "latency_s": round(latency_seconds, 4),
+            "recorded_at": time.time(),
+            "response": response.model_dump(mode="json"),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.recorded += 1
+
+    def replay(self, function: str, kwargs: dict) -> Message:
+        """Recorded response for this exact request; raises CassetteMiss instead of calling the API."""
+        key = request_key(kwargs)
+        entry = self._entries.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None:
+            raise CassetteMiss(f"No recorded response for {function} (key {key[:12]}) in {self.path}")
+        if self.mode == "replay_timed":
+            time.sleep(entry["latency_s"])
+        return Message.model_validate(entry["response"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"mode": self.mode, "path": self.path, "entries": len(self._entries),
+                    "hits": self.hits, "misses": self.misses, "recorded": self.recorded}
+
+    def _load(self) -> dict:
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partially written last line of an interrupted recording
+                entries[entry["key"]] = entry
+        return entries
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    """The process-wide cassette, or None when record/replay is off."""
+    global _cassette
+    if not CASSETTE_MODE:
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette()
+    return _cassette
@@ -0,0 +1,115 @@
+import os
+import gzip
+import json
+import threading
+from collections import OrderedDict
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from backend.utils.metrics import Counter
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli (gzip is used otherwise)
+    brotli = None
+
+
+CATALOG_PAGE_SIZE = int(os.environ.get("HAMMERTIME_CATALOG_PAGE_SIZE", 200))
+CATALOG_MAX_PAGE_SIZE = 1000
+# Bodies smaller than this are sent uncompressed (the headers would eat the gain)
+MIN_COMPRESS_BYTES = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Encoded bodies kept per (ETag, encoding); pages only change with the catalog version
+ENCODED_CACHE_SIZE = 256
+
+CATALOG_RESPONSES = Counter("hammertime_catalog_responses_total", "Catalog API responses",
+                            ("endpoint", "outcome", "encoding"))
+
+
+def catalog_etag(epoch: int, version: int, part: str) -> str:
+    """ETag of one catalog resource (a page or a delta) at one version of the shared state."""
+    return f'"{epoch:x}-{version}-{part}"'
+
+
+def choose_encoding(accept_encoding: str):
+    """Best encoding the client accepts: br (when installed), then gzip, else None."""
+    accepted = {token.split(";")[0].strip().lower() for token in (accept_encoding or "").split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True when the client's If-None-Match already names `etag`."""
+    header = request.headers.get("if-none-match", "")
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+
+class EncodedBodyCache:
+    """Small LRU of encoded (JSON + compressed) bodies keyed by (ETag, encoding)."""
+
+    def __init__(self, size: int = ENCODED_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_encode(self, etag: str, encoding, payload) -> bytes:
+        key = (etag, encoding)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                return body
+        body = encode_body(payload(), encoding)
+        with self._lock:
+            self._entries[key] = body
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return body
+
+
+def encode_body(data, encoding) -> bytes:
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if encoding == "br":
+        return brotli.compress(raw, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    return raw
+
+
+encoded_bodies = EncodedBodyCache()
+
+
+def catalog_response(request: Request, endpoint: str, etag: str, payload, outcome: str = "full") -> Response:
+    """
+    Conditional, compressed JSON response for a versioned catalog resource.
+
+    Args:
+        request: the incoming request (If-None-Match, Accept-Encoding)
+        endpoint: metrics label
+        etag: from catalog_etag(); equal ETags must mean equal payloads
+        payload: callable returning the JSON data, only called on a cache miss
+        outcome: metrics label for a 200 response
+
+    Returns:
+        304 without body when the client is current, else the (cached) encoded body
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if not_modified(request, etag):
+        CATALOG_RESPONSES.inc(endpoint=endpoint, outcome="not_modified", encoding="none")
+        return Response(status_code=304, headers=headers)
+
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    body = encoded_bodies.get_or_encode(etag, encoding, payload)
+    if encoding is not None and len(body) >= MIN_COMPRESS_BYTES:
+        headers["Content-Encoding"] = encoding
+    elif encoding is not None:
+        # tiny body: the uncompressed form is cheaper to send
+        body = encoded_bodies.get_or_encode(etag, None, payload)
+        encoding = None
+    CATALOG_RESPONSES.inc(endpoint=endpoint, outcome=outcome, encoding=encoding or "identity")
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,336 @@
+import os
+import re
+import json
+import hashlib
+import difflib
+import threading
+from collections import OrderedDict
+from backend.utils.transcript_cleaner import normalize_numbers, normalize_units
+
+
+# Quantity units/markers that may follow a leading quantity ("50x", "2 Stk", "3 Paar")
+QTY_UNITS = r"(?:x|×|stk\.?|stück|st\.?|pcs|pc|paar|rollen?|dosen?|flaschen?|eimer)"
+# "10m Installationsdraht" is a length to order; a trailing "10m" is a size spec
+LEADING_QTY_UNITS = r"(?:x|×|stk\.?|stück|st\.?|pcs|pc|paar|rollen?|dosen?|flaschen?|eimer|m|meter)"
+
+LEADING_QTY_RE = re.compile(rf"^(\d+)\s*{LEADING_QTY_UNITS}?\s+(.+)$", re.IGNORECASE)
+TRAILING_QTY_RE = re.compile(rf"^(.+?)\s*[:\-]?\s+(?:(\d+)\s*{QTY_UNITS}|(?:x|×)\s*(\d+)|(\d+))\.?$", re.IGNORECASE)
+# A bare trailing number after these belongs to a size spec ("Bit TX 20", "Schraube 4 x 40"), not a quantity
+SPEC_PREFIX_RE = re.compile(r"(?:\b(?:tx|pz|ph|sw|m|gr\.?)|\d\s*[x×])$", re.IGNORECASE)
+BULLET_RE = re.compile(r"^\s*(?:[-•*·]+|\d+[.)](?=\s+\d))\s*")
+
+# Words in an item line that carry no product information
+STOP_WORDS = {
+    "der", "die", "das", "den", "dem", "ein", "eine", "einen", "und", "mit", "fuer", "von",
+    "the", "a", "an", "and", "with", "for", "of", "stk", "stueck", "pcs", "paar", "bitte", "please",
+}
+
+# How far the best match has to be ahead of the runner-up to count as unambiguous
+AMBIGUITY_MARGIN = 0.1
+
+# Catalog lists (base snapshot, per-site views) whose matcher, index and prompt JSON are kept
+CATALOG_VIEW_CACHE_SIZE = int(os.environ.get("HAMMERTIME_CATALOG_VIEWS", 64))
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, fold umlauts and glue size specs together ("4 x 40" -> "4x40", "6 mm" -> "6mm", "TX 20" -> "tx20")."""
+    text = text.lower().replace("×", "x")
+    for umlaut, folded in (("ä", "ae"), ("ö", "oe"), ("ü", "ue"), ("ß", "ss")):
+        text = text.replace(umlaut, folded)
+    text = re.sub(r"(\d),(\d)", r"\1.\2", text)
+    text = re.sub(r"(\d)\s*x\s*(\d)", r"\1x\2", text)
+    text = re.sub(r"(\d)\s+(mm|cm|m|l)\b", r"\1\2", text)
+    text = re.sub(r"\b(tx|m|gr\.?)\s+(\d)", r"\1\2", text)
+    text = text.replace("gr.", "gr")
+    text = re.sub(r"[^\w.\-]+", " ", text)
+    return " ".join(text.split())
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for tok in normalize_text(text).split():
+        tok = tok.strip(".-")
+        if tok and tok not in STOP_WORDS:
+            tokens.append(tok)
+    return tokens
+
+
+def is_spec(token: str) -> bool:
+    """Size/type specs contain a digit (4x40, 6mm, m8, tx20, 10l, gr9, 120)."""
+    return any(ch.isdigit() for ch in token)
+
+
+def parse_order_line(line: str):
+    """
+    Split one order line into (quantity, item text).
+
+    Understands "50x Schraube TX20 4x40", "2 Silikon transparent", "Zollstock x2",
+    "Zollstock 2 Stk", "Panzertape silber 2" and bare items ("Zollstock" -> quantity 1).
+    Returns None for empty lines.
+    """
+    line = BULLET_RE.sub("", line).strip(" \t.,;:")
+    if not line:
+        return None
+
+    m = LEADING_QTY_RE.match(line)
+    if m:
+        return int(m.group(1)), m.group(2).strip()
+
+    m = TRAILING_QTY_RE.match(line)
+    if m:
+        item = m.group(1).strip()
+        # "Schraube 4 x 40" and "Bit TX 20" end in a size, not a quantity
+        is_size = (m.group(3) and item[-1].isdigit()) or (m.group(4) and SPEC_PREFIX_RE.search(item))
+        if not is_size:
+            return int(m.group(2) or m.group(3) or m.group(4)), item
+
+    return 1, line
+
+
+def parse_order_lines(text: str) -> list:
+    """Parse a multi-line list (one item per line) into [(quantity, item text), ...]."""
+    parsed = []
+    for line in text.splitlines():
+        entry = parse_order_line(line)
+        if entry:
+            parsed.append(entry)
+    return parsed
+
+
+# Item separators in free text: "50x Schraube TX20 4x40, 2 Silikon transparent und Zollstock"
+ITEM_SEPARATOR_RE = re.compile(r"[;\n]|,\s+|\s+(?:und|and|plus|\+|&)\s+", re.IGNORECASE)
+
+
+def parse_free_text_order(text: str) -> list:
+    """
+    Split a free-text order into [(quantity, item text), ...].
+
+    Items are separated by commas, semicolons, newlines or "und"/"and";
+    spoken numbers and units are normalized first ("zwei Silikon" -> 2 Silikon).
+    """
+    text = normalize_units(normalize_numbers(text))
+    parsed = []
+    for chunk in ITEM_SEPARATOR_RE.split(text):
+        entry = parse_order_line(chunk)
+        if entry:
+            parsed.append(entry)
+    return parsed
+
+
+def _word_similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    # German plurals and inflections: "schrauben" ~ "schraube"
+    if len(a) >= 4 and len(b) >= 4 and (a.startswith(b) or b.startswith(a)):
+        return 0.9
+    # compounds: "handschuhe" ~ "arbeitshandschuhe"
+    if len(a) >= 5 and len(b) >= 5 and (a in b or b in a):
+        return 0.8
+    ratio = difflib.SequenceMatcher(None, a, b).ratio()
+    return ratio if ratio >= 0.8 else 0.0
+
+
+def _spec_similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    # "6" vs "6mm": same number, unit left out
+    digits_a = re.sub(r"\D", "", a)
+    digits_b = re.sub(r"\D", "", b)
+    if digits_a and digits_a == digits_b and (a.isdigit() or b.isdigit()):
+        return 0.8
+    return 0.0
+
+
+def _best(query_tokens: list, row_tokens: list, similarity) -> list:
+    """For each row token, the best similarity against any query token."""
+    return [max((similarity(q, r) for q in query_tokens), default=0.0) for r in row_tokens]
+
+
+class CatalogMatcher:
+    """
+    Resolves free-text item descriptions against the catalog by article ID,
+    product name and size spec, with a confidence in [0, 1].
+
+    Confidence is low when the text fits several products equally well
+    ("Schraube" without a size), so callers can fall back to the LLM.
+    """
+
+    def __init__(self, catalog: list):
+        self.by_id = {}
+        self._rows = []
+        for row in catalog:
+            artikel_id = str(row.get("artikel_id", "")).strip().upper()
+            if artikel_id:
+                self.by_id[artikel_id] = row
+            tokens = tokenize(row.get("artikelname", ""))
+            self._rows.append((
+                row,
+                [t for t in tokens if not is_spec(t)],
+                [t for t in tokens if is_spec(t)],
+            ))
+
+    @staticmethod
+    def score(q_words: list, q_specs: list, words: list, specs: list) -> float:
+        """Similarity of a tokenized query to one catalog row (name words + size specs)."""
+        if not q_words:
+            return 0.0
+        word_precision = sum(_best(words, q_words, _word_similarity)) / len(q_words)
+        if word_precision == 0:
+            return 0.0
+        word_recall = sum(_best(q_words, words, _word_similarity)) / len(words) if words else 0.0
+
+        if specs:
+            spec_match = sum(_best(q_specs, specs, _spec_similarity)) / len(specs)
+        else:
+            spec_match = 1.0
+        # a size the product does not have is a strong sign of the wrong product
+        if q_specs and specs and not any(_best(specs, q_specs, _spec_similarity)):
+            spec_match = 0.0
+        if q_specs and not specs:
+            spec_match = 0.5
+        # every size mentioned fits exactly ("Schrauben 5x60" without the TX20)
+        if q_specs and specs and all(max(_best(specs, [q], _spec_similarity)) == 1.0 for q in q_specs):
+            spec_match = max(spec_match, 0.9)
+
+        return 0.35 * word_recall + 0.35 * word_precision + 0.3 * spec_match
+
+    def resolve(self, item_text: str, allow_ambiguous: bool = False):
+        """
+        Find the catalog row for an item description.
+
+        Args:
+            item_text: free-text item description
+            allow_ambiguous: score the best row on its own, even if others fit equally well
+
+        Returns:
+            (row, confidence) - row is None when nothing fits
+        """
+        tokens = [t for t in (t.strip(".-") for t in normalize_text(item_text).split()) if t]
+        if any(t.upper() in self.by_id for t in tokens):
+            if len(tokens) == 1:
+                return self.by_id[tokens[0].upper()], 1.0
+            # an ID amid other words ("C001 ersetzen durch ...", "no C021 please") is no order for it
+            return None, 0.0
+
+        query = tokenize(item_text)
+        q_words = [t for t in query if not is_spec(t)]
+        q_specs = [t for t in query if is_spec(t)]
+
+        scored = []
+        for row, words, specs in self._rows:
+            s = self.score(q_words, q_specs, words, specs)
+            if s > 0:
+                scored.append((s, row))
+        if not scored:
+            return None, 0.0
+
+        scored.sort(key=lambda x: x[0], reverse=True)
+        best_score, best_row = scored[0]
+        runner_up = scored[1][0] if len(scored) > 1 else 0.0
+        gap = best_score - runner_up
+        confidence = best_score if gap >= AMBIGUITY_MARGIN or allow_ambiguous else best_score * gap / AMBIGUITY_MARGIN
+        return best_row, round(confidence, 3)
+
+    @staticmethod
+    def covers(row: dict, item_text: str) -> bool:
+        """
+        Whether the row's name accounts for every word and number of the item text.
+
+        Each word needs its own name word ("Kabelbinder für 200 Kabel" has a second
+        "Kabel" that "Kabelbinder 200mm" does not explain) and each spec a fitting size.
+        """
+        query = tokenize(item_text)
+        if [t.upper() for t in query] == [str(row.get("artikel_id", "")).upper()]:
+            return True
+        tokens = tokenize(row.get("artikelname", ""))
+        words = [t for t in tokens if not is_spec(t)]
+        specs = [t for t in tokens if is_spec(t)]
+        for q in query:
+            if is_spec(q):
+                if not any(_spec_similarity(q, spec) for spec in specs):
+                    return False
+                continue
+            best = max(words, key=lambda w: _word_similarity(q, w), default=None)
+            if best is None or _word_similarity(q, best) == 0:
+                return False
+            words.remove(best)
+        return True
+
+    def resolve_lines(self, lines: list, allow_ambiguous: bool = False) -> list:
+        """
+        Resolve parsed [(quantity, item text), ...] lines.
+
+        Returns a list of dicts with 'text', 'anzahl', 'artikel_id' (or None), 'confidence'
+        and 'covered' (see covers()).
+        """
+        resolved = []
+        for qty, text in lines:
+            row, confidence = self.resolve(text, allow_ambiguous)
+            resolved.append({
+                "text": text,
+                "anzahl": qty,
+                "artikel_id": row.get("artikel_id") if row else None,
+                "confidence": confidence,
+                "covered": row is not None and self.covers(row, text),
+            })
+        return resolved
+
+
+class PerCatalogCache:
+    """
+    Data derived from a catalog list (matcher, search index, prompt JSON), kept for the
+    `size` most recently used lists.
+
+    Lists are matched by identity, so callers pass the same list object for the same
+    catalog (catalog snapshots and site views are cached for that reason). Entries
+    hold a reference to their list, so an id is never reused while it is cached.
+    """
+
+    def __init__(self, build, size: int = CATALOG_VIEW_CACHE_SIZE):
+        self.build = build
+        self.size = size
+        self._entries = OrderedDict()  # id(catalog) -> (catalog, value)
+        self._lock = threading.Lock()
+
+    def get(self, catalog: list):
+        key = id(catalog)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is catalog:
+                self._entries.move_to_end(key)
+                return entry[1]
+        return self.refresh(catalog)
+
+    def refresh(self, catalog: list):
+        """Rebuild and store the value for `catalog`."""
+        value = self.build(catalog)
+        with self._lock:
+            self._entries[id(catalog)] = (catalog, value)
+            self._entries.move_to_end(id(catalog))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+
+_matchers = PerCatalogCache(CatalogMatcher)
+
+
+def get_matcher(catalog: list) -> CatalogMatcher:
+    """CatalogMatcher for `catalog`, built once per catalog list (see PerCatalogCache)."""
+    return _matchers.get(catalog)
+
+
+def _fingerprint(catalog: list) -> tuple:
+    payload = json.dumps(catalog, ensure_ascii=False, sort_keys=True, default=str)
+    return len(catalog), hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+_versions = PerCatalogCache(_fingerprint)
+
+
+def catalog_version(catalog: list) -> str:
+    """Short content fingerprint of a catalog (recomputed only for a different list or length)."""
+    length, version = _versions.get(catalog)
+    if length != len(catalog):
+        length, version = _versions.refresh(catalog)
+    return version
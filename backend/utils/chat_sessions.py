@@ -0,0 +1,165 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+
+# Defaults for server-side chat sessions (overridable via environment)
+CHAT_HISTORY_TOKEN_BUDGET = int(os.environ.get("HAMMERTIME_CHAT_HISTORY_TOKENS", 1500))
+CHAT_SESSION_TTL_SECONDS = int(os.environ.get("HAMMERTIME_CHAT_SESSION_TTL", 30 * 60))
+CHAT_MAX_SESSIONS = int(os.environ.get("HAMMERTIME_CHAT_MAX_SESSIONS", 2000))
+
+# Most recent messages that are never folded into the summary
+KEEP_RECENT_MESSAGES = 4
+# Length of one folded turn in the summary
+SUMMARY_LINE_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for German/English text (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _fold(message: dict) -> str:
+    text = " ".join(message["content"].split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS - 1] + "…"
+    return f"- {message['role']}: {text}"
+
+
+class ChatSessionStore:
+    """
+    Server-side chat histories, so clients only send the newest message per turn.
+
+    Each session keeps the first user message (the original request, which also
+    carries the image for image chats), a short summary of older turns and the
+    most recent messages. Whenever the history exceeds `token_budget`, the oldest
+    exchange after the first message is folded into the summary; the oldest summary
+    lines are dropped once the summary itself outgrows a quarter of the budget.
+    Sessions expire `ttl_seconds` after their last use.
+    """
+
+    def __init__(self, token_budget: int = CHAT_HISTORY_TOKEN_BUDGET, ttl_seconds: int = CHAT_SESSION_TTL_SECONDS,
+                 max_sessions: int = CHAT_MAX_SESSIONS):
+        self.token_budget = token_budget
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        # session_id -> {"messages": [...], "summary": [...], "context": {...}, "turns": int, "last_used": float}
+        self._sessions = OrderedDict()
+        self._compactions = 0
+
+    def create(self, messages: list = None, **context) -> str:
+        """Start a session (optionally seeded with an existing history) and return its id."""
+        session_id = uuid.uuid4().hex
+        session = {"messages": [], "summary": [], "context": dict(context), "turns": 0, "last_used": time.time()}
+        for message in messages or []:
+            session["messages"].append({"role": message["role"], "content": message["content"]})
+        with self._lock:
+            self._purge_expired()
+            self._compact(session)
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            self._purge_expired()
+            return session_id in self._sessions
+
+    def add_message(self, session_id: str, role: str, content: str) -> bool:
+        """Append a message and compact the history; False if the session is unknown or expired."""
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                return False
+            session["messages"].append({"role": role, "content": content})
+            if role == "user":
+                session["turns"] += 1
+            self._compact(session)
+            return True
+
+    def drop_last_message(self, session_id: str):
+        """Remove the newest message (e.g. a user turn the model failed to answer, so it can be retried)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session and session["messages"]:
+                session["messages"].pop()
+
+    def history(self, session_id: str):
+        """
+        Messages to send to the model, with older turns folded into the first message.
+
+        Returns:
+            list of {"role", "content"} dicts, or None if the session is unknown or expired
+        """
+        with self._lock:
+            session = self._touch(session_id)
+            if session is None:
+                return None
+            return self._render(session)
+
+    def context(self, session_id: str) -> dict:
+        """Mutable per-session context (e.g. the image_id of an image chat)."""
+        with self._lock:
+            session = self._touch(session_id)
+            return session["context"] if session is not None else {}
+
+    def history_tokens(self, session_id: str) -> int:
+        history = self.history(session_id) or []
+        return sum(estimate_tokens(m["content"]) for m in history)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._purge_expired()
+            tokens = [sum(estimate_tokens(m["content"]) for m in self._render(s)) for s in self._sessions.values()]
+            return {
+                "sessions": len(self._sessions),
+                "compactions": self._compactions,
+                "history_tokens_max": max(tokens, default=0),
+                "history_tokens_mean": round(sum(tokens) / len(tokens), 1) if tokens else 0.0,
+                "token_budget": self.token_budget,
+            }
+
+    # --- internals (caller holds the lock) ---
+
+    def _touch(self, session_id: str):
+        self._purge_expired()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session["last_used"] = time.time()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def _render(self, session: dict) -> list:
+        messages = [dict(m) for m in session["messages"]]
+        if session["summary"] and messages:
+            messages[0]["content"] += "\n\n[Earlier in this conversation]\n" + "\n".join(session["summary"])
+        return messages
+
+    def _tokens(self, session: dict) -> int:
+        return sum(estimate_tokens(m["content"]) for m in self._render(session))
+
+    def _compact(self, session: dict):
+        messages = session["messages"]
+        # fold (assistant, user) pairs right after the first message, which keeps roles alternating
+        while self._tokens(session) > self.token_budget and len(messages) > 1 + KEEP_RECENT_MESSAGES:
+            folded = messages[1:3]
+            del messages[1:3]
+            session["summary"].extend(_fold(m) for m in folded)
+            self._compactions += 1
+
+        summary_budget = self.token_budget // 4
+        while len(session["summary"]) > 1 and estimate_tokens("\n".join(session["summary"])) > summary_budget:
+            session["summary"].pop(0)
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        # ordered by last use, so expired sessions sit at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session["last_used"] >= cutoff:
+                break
+            self._sessions.popitem(last=False)
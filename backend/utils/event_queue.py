@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+
+
+# Durable event queue shared by the API and the pipeline worker processes
+EVENT_DB_PATH = os.environ.get(
+    "HAMMERTIME_EVENT_DB", os.path.join(tempfile.gettempdir(), "hammertime_events.sqlite3")
+)
+# A claimed event is redelivered when its worker has not finished it within the lease
+EVENT_LEASE_SECONDS = int(os.environ.get("HAMMERTIME_EVENT_LEASE", 120))
+EVENT_MAX_ATTEMPTS = int(os.environ.get("HAMMERTIME_EVENT_MAX_ATTEMPTS", 5))
+# Failed events are retried after 2s, 4s, 8s, ...
+RETRY_BASE_SECONDS = 2.0
+# Window for the throughput numbers in stats()
+THROUGHPUT_WINDOW_SECONDS = 60
+# Finished events are kept this long (for stats and debugging), then purged
+DONE_RETENTION_SECONDS = 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    dedupe_key TEXT,
+    created_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_until REAL,
+    started_at REAL,
+    done_at REAL,
+    done_by TEXT,
+    dead INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS events_open ON events (done_at, dead, available_at);
+CREATE INDEX IF NOT EXISTS events_done ON events (done_at);
+-- at most one not-yet-claimed event per dedupe key (e.g. one pending aggregates refresh)
+CREATE UNIQUE INDEX IF NOT EXISTS events_dedupe ON events (dedupe_key)
+    WHERE dedupe_key IS NOT NULL AND done_at IS NULL AND dead = 0 AND lease_owner IS NULL;
+"""
+
+
+class EventQueue:
+    """
+    Durable at-least-once event queue in a local SQLite file.
+
+    Any process can publish; worker processes claim events under a lease, and an
+    event is only gone once its worker completes it. A worker that crashes or hangs
+    loses the lease and the event is delivered again, so handlers must be
+    idempotent. Failed events are retried with exponential backoff and parked as
+    dead after `max_attempts`. Follow-up events are published in the same
+    transaction that completes an event, so a pipeline step is never lost between
+    two stages.
+    """
+
+    def __init__(self, path: str = EVENT_DB_PATH, lease_seconds: int = EVENT_LEASE_SECONDS,
+                 max_attempts: int = EVENT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        conn = self.connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")  # readers never block the writer
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        A new connection (cheap; connections are not shared between threads or processes).
+
+        Autocommit mode: use `with conn:` or an explicit BEGIN for transactions.
+        """
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def publish(self, topic: str, payload: dict, dedupe_key: str = None, conn: sqlite3.Connection = None):
+        """
+        Append an event.
+
+        Args:
+            topic: e.g. "order.placed"
+            payload: JSON-serializable event data
+            dedupe_key: while an event with this key waits unclaimed, publishing another is a no-op
+            conn: publish inside this connection's open transaction
+
+        Returns:
+            the event id, or None when deduplicated
+        """
+        own = conn is None
+        conn = conn or self.connect()
+        try:
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO events (topic, payload, dedupe_key, created_at, available_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (topic, json.dumps(payload, ensure_ascii=False), dedupe_key, now, now),
+            )
+            return cursor.lastrowid if cursor.rowcount else None
+        finally:
+            if own:
+                conn.close()
+
+    def claim(self, worker: str):
+        """
+        Lease the oldest ready event for `worker`.
+
+        Returns:
+            {"id", "topic", "payload", "attempts", "created_at"} or None when nothing is ready
+        """
+        conn = self.connect()
+        try:
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, topic, payload, attempts, created_at FROM events "
+                "WHERE done_at IS NULL AND dead = 0 AND available_at <= ? "
+                "AND (lease_until IS NULL OR lease_until < ?) ORDER BY available_at, id LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE events SET lease_owner = ?, lease_until = ?, started_at = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (worker, now + self.lease_seconds, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+            return {
+                "id": row["id"],
+                "topic": row["topic"],
+                "payload": json.loads(row["payload"]),
+                "attempts": row["attempts"] + 1,
+                "created_at": row["created_at"],
+            }
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def complete(self, event: dict, worker: str, follow_ups=()) -> bool:
+        """
+        Mark an event done and publish its follow-up events, atomically.
+
+        Args:
+            follow_ups: (topic, payload, dedupe_key) tuples
+
+        Returns:
+            False if `worker` no longer holds the event (its lease expired and another worker
+            claimed or finished it)
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            done = conn.execute(
+                "UPDATE events SET done_at = ?, done_by = ?, lease_until = NULL "
+                "WHERE id = ? AND lease_owner = ? AND done_at IS NULL",
+                (time.time(), worker, event["id"], worker),
+            ).rowcount
+            if done:
+                for topic, payload, dedupe_key in follow_ups:
+                    self.publish(topic, payload, dedupe_key, conn=conn)
+            conn.execute("COMMIT")
+            return bool(done)
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def fail(self, event: dict, worker: str, error: str) -> bool:
+        """
+        Release a failed event for a retry with backoff, or park it as dead after max_attempts.
+
+        Returns:
+            True if the event is dead; False also when `worker` no longer holds the event
+            (then the worker that claimed it after the lease expired decides)
+        """
+        dead = event["attempts"] >= self.max_attempts
+        retry_at = time.time() + RETRY_BASE_SECONDS * 2 ** (event["attempts"] - 1)
+        conn = self.connect()
+        try:
+            try:
+                owned = conn.execute(
+                    "UPDATE events SET lease_owner = NULL, lease_until = NULL, available_at = ?, dead = ?, "
+                    "last_error = ? WHERE id = ? AND lease_owner = ? AND done_at IS NULL",
+                    (retry_at, int(dead), f"{worker}: {error}"[:1000], event["id"], worker),
+                ).rowcount
+            except sqlite3.IntegrityError:
+                # an identical event (same dedupe key) is already waiting: let that one run instead
+                owned = conn.execute(
+                    "UPDATE events SET done_at = ?, done_by = ?, last_error = ? "
+                    "WHERE id = ? AND lease_owner = ? AND done_at IS NULL",
+                    (time.time(), worker, f"superseded after: {error}"[:1000], event["id"], worker),
+                ).rowcount
+                dead = False
+            return dead and bool(owned)
+        finally:
+            conn.close()
+
+    def purge(self, older_than: float = DONE_RETENTION_SECONDS) -> int:
+        """Delete events finished more than `older_than` seconds ago."""
+        conn = self.connect()
+        try:
+            return conn.execute("DELETE FROM events WHERE done_at < ?", (time.time() - older_than,)).rowcount
+        finally:
+            conn.close()
+
+    def stats(self, window: float = THROUGHPUT_WINDOW_SECONDS) -> dict:
+        """
+        Queue depth and lag per topic, and throughput per topic and worker over the last `window` seconds.
+
+        Lag is the age of the oldest event that is ready but not yet claimed.
+        """
+        now = time.time()
+        since = now - window
+        conn = self.connect()
+        try:
+            topics = {}
+            for row in conn.execute(
+                "SELECT topic, "
+                "SUM(available_at <= ? AND (lease_until IS NULL OR lease_until < ?)) AS ready, "
+                "SUM(available_at > ? AND lease_owner IS NULL) AS retrying, "
+                "SUM(lease_until >= ?) AS in_flight, "
+                "MIN(CASE WHEN available_at <= ? AND (lease_until IS NULL OR lease_until < ?) "
+                "THEN available_at END) AS oldest_ready "
+                "FROM events WHERE done_at IS NULL AND dead = 0 GROUP BY topic",
+                (now, now, now, now, now, now),
+            ):
+                topics[row["topic"]] = {
+                    "ready": row["ready"] or 0,
+                    "retrying": row["retrying"] or 0,
+                    "in_flight": row["in_flight"] or 0,
+                    "lag_seconds": round(now - row["oldest_ready"], 3) if row["oldest_ready"] else 0.0,
+                }
+            for row in conn.execute("SELECT topic, COUNT(*) AS n FROM events WHERE dead = 1 GROUP BY topic"):
+                topics.setdefault(row["topic"], {"ready": 0, "retrying": 0, "in_flight": 0, "lag_seconds": 0.0})
+                topics[row["topic"]]["dead"] = row["n"]
+            for row in conn.execute(
+                "SELECT topic, COUNT(*) AS n, AVG(done_at - started_at) AS handle, "
+                "AVG(done_at - created_at) AS end_to_end FROM events WHERE done_at >= ? GROUP BY topic",
+                (since,),
+            ):
+                topic = topics.setdefault(row["topic"], {"ready": 0, "retrying": 0, "in_flight": 0,
+                                                         "lag_seconds": 0.0})
+                topic["processed"] = row["n"]
+                topic["per_second"] = round(row["n"] / window, 3)
+                topic["avg_handle_seconds"] = round(row["handle"] or 0.0, 4)
+                topic["avg_end_to_end_seconds"] = round(row["end_to_end"] or 0.0, 4)
+            workers = {
+                row["done_by"]: {"processed": row["n"], "per_second": round(row["n"] / window, 3)}
+                for row in conn.execute(
+                    "SELECT done_by, COUNT(*) AS n FROM events WHERE done_at >= ? GROUP BY done_by", (since,))
+            }
+        finally:
+            conn.close()
+        return {
+            "window_seconds": window,
+            "lag_seconds": max((t["lag_seconds"] for t in topics.values()), default=0.0),
+            "topics": topics,
+            "workers": workers,
+        }
@@ -0,0 +1,196 @@
+import os
+import re
+import json
+import uuid
+import random
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+# Behaviour of the stand-in model (overridable via environment or CLI flags)
+FAKE_LLM_LATENCY_MS = float(os.environ.get("FAKE_LLM_LATENCY_MS", 400))  # time to first token
+FAKE_LLM_JITTER_MS = float(os.environ.get("FAKE_LLM_JITTER_MS", 100))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", 80))
+# Chat/image conversations get a QUESTION: reply until this many user turns were sent
+FAKE_LLM_QUESTION_TURNS = int(os.environ.get("FAKE_LLM_QUESTION_TURNS", 1))
+FAKE_LLM_ERROR_RATE = float(os.environ.get("FAKE_LLM_ERROR_RATE", 0.0))
+# Tail latency: this fraction of responses is delayed by an extra FAKE_LLM_SLOW_MS
+FAKE_LLM_SLOW_RATE = float(os.environ.get("FAKE_LLM_SLOW_RATE", 0.0))
+FAKE_LLM_SLOW_MS = float(os.environ.get("FAKE_LLM_SLOW_MS", 10000))
+# Optional JSON file {"procurement": "...", "chat_question": "...", ...} overriding the canned replies
+FAKE_LLM_RESPONSES = os.environ.get("FAKE_LLM_RESPONSES")
+
+ARTICLE_ID_RE = re.compile(r'"artikel_id":\s*"(C\d{3})"')
+REPAIR_CANDIDATE_RE = re.compile(r"^- (C\d{3}):", re.M)
+
+DEFAULT_RESPONSES = {
+    "procurement": None,  # built from the catalog in the prompt
+    "chat_question": "QUESTION: Welche Größe brauchst du: 4x40 oder 5x60?",
+    "image_question": "QUESTION: • What I see: a handwritten list\n• Identified: screws, silicone\n• Need to know: which length?",
+    "recommendation": None,
+    "clean_voice": None,  # echoes the raw input
+}
+
+app = FastAPI()
+config = {
+    "latency_ms": FAKE_LLM_LATENCY_MS,
+    "jitter_ms": FAKE_LLM_JITTER_MS,
+    "tokens_per_second": FAKE_LLM_TOKENS_PER_SECOND,
+    "question_turns": FAKE_LLM_QUESTION_TURNS,
+    "error_rate": FAKE_LLM_ERROR_RATE,
+    "slow_rate": FAKE_LLM_SLOW_RATE,
+    "slow_ms": FAKE_LLM_SLOW_MS,
+    "responses": dict(DEFAULT_RESPONSES),
+}
+counters = {"requests": 0, "errors": 0, "slow": 0, "cancelled": 0, "input_tokens": 0, "output_tokens": 0}
+
+
+def load_responses(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        config["responses"].update(json.load(f))
+
+
+def _text_of(content) -> str:
+    if isinstance(content, str):
+        return content
+    return " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _recommendation(catalog_text: str) -> str:
+    ids = ARTICLE_ID_RE.findall(catalog_text)[:3] or ["C001"]
+    return json.dumps({
+        "materials": [[artikel_id, 10 * (i + 1)] for i, artikel_id in enumerate(ids)],
+        "explanation": "Fake LLM: first catalog articles in standard quantities",
+    }, ensure_ascii=False)
+
+
+def as_tool_call(text: str, tools: list):
+    """Turn a canned text reply into the tool_use block the agents request (None if it does not fit)."""
+    names = {tool["name"] for tool in tools}
+    block = {"type": "tool_use", "id": f"toolu_fake_{uuid.uuid4().hex[:20]}"}
+    if text.upper().startswith("QUESTION:") and "ask_question" in names:
+        return {**block, "name": "ask_question", "input": {"question": text[9:].strip()}}
+    fence = re.search(r"```(?:json)?\s*(.*?)```", text, re.S)
+    try:
+        data = json.loads(fence.group(1) if fence else text)
+    except json.JSONDecodeError:
+        return None
+    materials = [{"artikel_id": artikel_id, "quantity": quantity} for artikel_id, quantity in data.get("materials", [])]
+    return {**block, "name": "submit_order", "input": {"materials": materials, "explanation": data.get("explanation", "")}}
+
+
+def canned_reply(body: dict) -> str:
+    """Pick a reply in the format the calling agent function expects."""
+    responses = config["responses"]
+    system = _text_of(body.get("system") or "")
+    messages = body.get("messages", [])
+    last = _text_of(messages[-1]["content"]) if messages else ""
+
+    if not system:
+        if "could not be accepted" in last:
+            # repair_order: take the first candidate offered
+            ids = REPAIR_CANDIDATE_RE.findall(last)[:1]
+            return json.dumps({"materials": [[artikel_id, 1] for artikel_id in ids], "explanation": "Fake LLM: repaired"})
+        if "raw voice transcription" in last:
+            match = re.search(r'Raw Input: "(.*)"', last, re.S)
+            return responses["clean_voice"] or (match.group(1) if match else last)
+        # process_procurement_request: one prompt with catalog + task, JSON in a fence
+        return responses["procurement"] or f"```json\n{_recommendation(last)}\n```"
+
+    user_turns = sum(1 for m in messages if m["role"] == "user")
+    if user_turns <= config["question_turns"]:
+        return responses["image_question"] if "vision" in system else responses["chat_question"]
+    return responses["recommendation"] or _recommendation(system)
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    """Minimal Anthropic messages API: same request/response shape, canned content."""
+    body = await request.json()
+    counters["requests"] += 1
+    if config["error_rate"] and random.random() < config["error_rate"]:
+        counters["errors"] += 1
+        return JSONResponse(status_code=500, content={
+            "type": "error", "error": {"type": "api_error", "message": "fake LLM injected error"}})
+
+    text = canned_reply(body)
+    prompt = _text_of(body.get("system") or "") + " ".join(_text_of(m["content"]) for m in body.get("messages", []))
+    input_tokens = _count_tokens(prompt)
+    output_tokens = min(_count_tokens(text), int(body.get("max_tokens", 4096)))
+    counters["input_tokens"] += input_tokens
+    counters["output_tokens"] += output_tokens
+
+    delay = config["latency_ms"] + random.uniform(-config["jitter_ms"], config["jitter_ms"])
+    delay = max(0.0, delay) / 1000
+    if config["tokens_per_second"] > 0:
+        delay += output_tokens / config["tokens_per_second"]
+    if config["slow_rate"] and random.random() < config["slow_rate"]:
+        counters["slow"] += 1
+        delay += config["slow_ms"] / 1000
+    try:
+        await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        counters["cancelled"] += 1  # client gave up (deadline or losing hedge)
+        raise
+
+    content, stop_reason = [{"type": "text", "text": text}], "end_turn"
+    tool_call = as_tool_call(text, body["tools"]) if body.get("tools") else None
+    if tool_call is not None:
+        content, stop_reason = [tool_call], "tool_use"
+
+    return {
+        "id": f"msg_fake_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "fake"),
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return {**counters, "config": {k: v for k, v in config.items() if k != "responses"}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Anthropic messages API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"], help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"])
+    parser.add_argument("--tokens-per-second", type=float, default=config["tokens_per_second"], help="0 = instant")
+    parser.add_argument("--question-turns", type=int, default=config["question_turns"],
+                        help="chat turns answered with QUESTION: before recommending")
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"], help="fraction of 500 responses")
+    parser.add_argument("--slow-rate", type=float, default=config["slow_rate"],
+                        help="fraction of responses delayed by --slow-ms (tail latency)")
+    parser.add_argument("--slow-ms", type=float, default=config["slow_ms"])
+    parser.add_argument("--responses", default=FAKE_LLM_RESPONSES, help="JSON file overriding canned replies")
+    args = parser.parse_args()
+
+    config.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tokens_per_second=args.tokens_per_second,
+                  question_turns=args.question_turns, error_rate=args.error_rate,
+                  slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+    if args.responses:
+        load_responses(args.responses)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+# Example usage:
+#   python -m backend.utils.fake_llm --port 8100 --latency-ms 800 --tokens-per-second 60
+#   python -m backend.utils.fake_llm --port 8100 --slow-rate 0.05 --slow-ms 20000   # 5% stuck calls
+#   HAMMERTIME_LLM_BASE_URL=http://127.0.0.1:8100 uvicorn backend.main:app
+if __name__ == "__main__":
+    main()
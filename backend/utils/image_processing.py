@@ -1,14 +1,222 @@
+import io
 import json
+import time
 import base64
+import hashlib
+import threading
+from collections import OrderedDict
 from pathlib import Path
-import anthropic
 import csv
-import yaml
-import request_agent as ra 
+from PIL import Image, ImageOps
 
+try:
+    from backend.utils import request_agent as ra
+except ImportError:  # run as a script from backend/utils
+    import request_agent as ra
 
-with open("secrets.yaml", "r", encoding="utf-8") as f:
-    secrets = yaml.safe_load(f)
+
+# Longest image side sent to the vision model. Claude downsizes anything larger
+# anyway, so bigger uploads only cost bandwidth and latency.
+MAX_IMAGE_SIDE = 1568
+JPEG_QUALITY = 85
+
+# Photos within this hamming distance of the 64 bit dHash count as near-duplicates in the
+# cache stats. Only a statistic: the dHash captures the page layout, not the text, so two
+# different lists on the same form can be this close.
+PHASH_MAX_DISTANCE = 6
+RESULT_CACHE_MAX_ENTRIES = 512
+RESULT_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+
+# What PIL raises for uploads it cannot (or must not) decode: truncated/unknown files,
+# malformed headers, and decompression bombs
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+def estimate_vision_tokens(width: int, height: int) -> int:
+    """Approximate Claude vision input tokens for an image (width * height / 750)."""
+    return max(1, round(width * height / 750))
+
+
+def perceptual_hash(img: Image.Image) -> int:
+    """
+    64 bit difference hash (dHash) of an image.
+
+    Robust to re-encoding, resizing and small brightness changes, so the same
+    box of screws photographed twice ends up a few bits apart at most.
+    """
+    small = img.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def preprocess_image(data: bytes, max_side: int = MAX_IMAGE_SIDE, enhance_contrast: bool = False) -> dict:
+    """
+    Normalize an uploaded image before it is sent to the vision model.
+
+    - applies the EXIF orientation (phone photos are often stored sideways)
+    - caps the longest side at `max_side`
+    - optionally boosts contrast (grayscale + autocontrast) for handwritten lists
+    - re-encodes as JPEG
+
+    Args:
+        data: Raw image bytes as uploaded by the client
+        max_side: Longest side in pixels after downscaling
+        enhance_contrast: Boost contrast for faint pencil/handwriting
+
+    Returns:
+        dict with 'data' (bytes), 'media_type', 'width', 'height', 'phash',
+        'vision_tokens', 'original_bytes' and 'bytes'
+    """
+    img = Image.open(io.BytesIO(data))
+    source_format = img.format
+    source_size = img.size
+    orientation = img.getexif().get(0x0112, 1)
+    img = ImageOps.exif_transpose(img)
+
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    untouched = img.size == source_size and orientation == 1 and not enhance_contrast
+
+    if enhance_contrast:
+        img = ImageOps.autocontrast(img.convert("L"), cutoff=1)
+    elif img.mode not in ("RGB", "L"):
+        # JPEG has no alpha channel - flatten transparent PNGs onto white
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        rgba = img.convert("RGBA")
+        background.paste(rgba, mask=rgba.split()[-1])
+        img = background
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    encoded = out.getvalue()
+    media_type = "image/jpeg"
+
+    # small, upright uploads (e.g. a screenshot PNG) can already be more compact than a re-encode
+    if untouched and source_format in ("JPEG", "PNG") and len(data) <= len(encoded):
+        encoded = data
+        media_type = f"image/{source_format.lower()}"
+
+    width, height = img.size
+    return {
+        "data": encoded,
+        "media_type": media_type,
+        "width": width,
+        "height": height,
+        "phash": perceptual_hash(img),
+        "vision_tokens": estimate_vision_tokens(width, height),
+        "original_bytes": len(data),
+        "bytes": len(encoded),
+    }
+
+
+def image_fingerprint(data: bytes) -> dict:
+    """Content hash, perceptual hash and vision token estimate of already normalized image bytes."""
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = img.size
+        return {
+            "content_hash": hashlib.sha256(data).hexdigest(),
+            "phash": perceptual_hash(img),
+            "vision_tokens": estimate_vision_tokens(width, height),
+        }
+
+
+class ImageResultCache:
+    """
+    Caches image analysis results by exact image content.
+
+    A lookup hits when the same normalized image bytes were analyzed with the same
+    conversation so far, so a re-upload of the same photo by another foreman skips
+    the vision call entirely. The perceptual hash is only used for the stats: misses
+    on an image within `max_distance` bits of a cached one count as near-duplicates.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, ttl_seconds: int = RESULT_CACHE_TTL_SECONDS,
+                 max_distance: int = PHASH_MAX_DISTANCE):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        # (conversation digest, content hash) -> {"result": dict, "phash": int, "created": float}
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.near_duplicates = 0
+        self.images = 0
+        self.vision_tokens = 0
+
+    @staticmethod
+    def conversation_key(messages: list, scope: str = "") -> str:
+        key = json.dumps([scope, messages] if scope else messages, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def lookup(self, content_hash: str, messages: list, scope: str = "", phash: int = None):
+        """
+        Return a copy of the cached result for the same image and conversation, or None.
+
+        Args:
+            content_hash: sha256 of the normalized image bytes
+            messages: Conversation so far
+            scope: e.g. the site
+            phash: perceptual hash, only for the near-duplicate stats
+        """
+        convo = self.conversation_key(messages, scope)
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            for key in list(self._entries):
+                if self._entries[key]["created"] < cutoff:
+                    del self._entries[key]
+            entry = self._entries.get((convo, content_hash))
+            if entry is not None:
+                self._entries.move_to_end((convo, content_hash))
+                self.hits += 1
+                return json.loads(json.dumps(entry["result"]))
+            self.misses += 1
+            if phash is not None and any(
+                entry_convo == convo and hamming_distance(entry["phash"], phash) <= self.max_distance
+                for (entry_convo, _), entry in self._entries.items()
+            ):
+                self.near_duplicates += 1
+        return None
+
+    def store(self, content_hash: str, messages: list, result: dict, scope: str = "", phash: int = 0):
+        key = (self.conversation_key(messages, scope), content_hash)
+        with self._lock:
+            self._entries[key] = {"result": json.loads(json.dumps(result)), "phash": phash, "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_image(self, vision_tokens: int):
+        """Count an image that was actually sent to the vision model."""
+        with self._lock:
+            self.images += 1
+            self.vision_tokens += vision_tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                # misses that a perceptual-hash match would have answered (possibly wrongly)
+                "near_duplicate_misses": self.near_duplicates,
+                "images_analyzed": self.images,
+                "vision_tokens_total": self.vision_tokens,
+                "vision_tokens_per_image": round(self.vision_tokens / self.images, 1) if self.images else 0.0,
+            }
 
 
 def describe_construction_site_image(image_path: str, additional_context: str = "") -> dict:
@@ -24,9 +232,7 @@ def describe_construction_site_image(image_path: str, additional_context: str =
         dict with 'description', 'tasks_identified', 'materials_needed', 'safety_concerns'
     """
     
-    # Resolve Anthropic API key
-    api_key = secrets.get('API_KEY')
-    client = anthropic.Anthropic(api_key=api_key)
+    client = ra.get_client()
     
     # Read and encode the image
     with open(image_path, "rb") as image_file:
@@ -59,8 +265,9 @@ def describe_construction_site_image(image_path: str, additional_context: str =
 
     # Call Claude API with image
     print("Analyzing construction site image...")
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
+    message = ra.call_llm(
+        client, "analyze_construction_image",
+        route_text=additional_context,
         max_tokens=2000,
         messages=[
             {
@@ -0,0 +1,151 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+# Defaults for the shared image store (overridable via environment)
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("HAMMERTIME_IMAGE_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+IMAGE_CACHE_TTL_SECONDS = int(os.environ.get("HAMMERTIME_IMAGE_CACHE_TTL", 60 * 60))
+IMAGE_CACHE_SPILL_DIR = os.environ.get(
+    "HAMMERTIME_IMAGE_SPILL_DIR",
+    os.path.join(tempfile.gettempdir(), "hammertime_images"),
+)
+
+
+def image_id_for(data: bytes) -> str:
+    """Content hash used as the `image_id` (same bytes -> same id)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageStore:
+    """
+    Byte-budgeted LRU cache for uploaded images.
+
+    Images are kept in memory up to `max_bytes`. Least recently used images are
+    spilled to `spill_dir` instead of being dropped, and are promoted back into
+    memory on the next access. Every entry (memory or disk) expires `ttl_seconds`
+    after it was last used.
+    """
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_MAX_BYTES, ttl_seconds: int = IMAGE_CACHE_TTL_SECONDS,
+                 spill_dir: str = IMAGE_CACHE_SPILL_DIR):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = spill_dir
+        self._lock = threading.Lock()
+        # image_id -> {"data": bytes, "media_type": str, "last_used": float}
+        self._memory = OrderedDict()
+        # image_id -> {"path": str, "media_type": str, "size": int, "last_used": float}
+        self._spilled = {}
+        self._memory_bytes = 0
+
+    def put(self, data: bytes, media_type: str, image_id: str = None) -> str:
+        """
+        Store image bytes and return their `image_id`.
+
+        The id defaults to the content hash of `data`. Pass an explicit id to store
+        derived bytes (e.g. a normalized re-encode) under the hash of the original upload.
+        """
+        image_id = image_id or image_id_for(data)
+        with self._lock:
+            self._purge_expired()
+            if image_id in self._memory:
+                self._memory[image_id]["last_used"] = time.time()
+                self._memory.move_to_end(image_id)
+                return image_id
+            self._drop_spilled(image_id)
+            self._memory[image_id] = {"data": data, "media_type": media_type, "last_used": time.time()}
+            self._memory_bytes += len(data)
+            self._enforce_budget()
+        return image_id
+
+    def get(self, image_id: str):
+        """
+        Look up an image by id.
+
+        Returns:
+            (data, media_type) tuple, or None if unknown or expired
+        """
+        with self._lock:
+            self._purge_expired()
+            entry = self._memory.get(image_id)
+            if entry is not None:
+                entry["last_used"] = time.time()
+                self._memory.move_to_end(image_id)
+                return entry["data"], entry["media_type"]
+
+            spilled = self._spilled.get(image_id)
+            if spilled is None:
+                return None
+            try:
+                with open(spilled["path"], "rb") as f:
+                    data = f.read()
+            except OSError:
+                self._spilled.pop(image_id, None)
+                return None
+
+            # promote back into memory
+            self._drop_spilled(image_id)
+            self._memory[image_id] = {"data": data, "media_type": spilled["media_type"], "last_used": time.time()}
+            self._memory_bytes += len(data)
+            self._enforce_budget()
+            return data, spilled["media_type"]
+
+    def stats(self) -> dict:
+        """Current cache occupancy."""
+        with self._lock:
+            return {
+                "memory_items": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "spilled_items": len(self._spilled),
+                "spilled_bytes": sum(s["size"] for s in self._spilled.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+    # --- internals (caller holds the lock) ---
+
+    def _enforce_budget(self):
+        # always keep the most recent image in memory, even if it alone exceeds the budget
+        while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+            image_id, entry = self._memory.popitem(last=False)
+            self._memory_bytes -= len(entry["data"])
+            self._spill(image_id, entry)
+
+    def _spill(self, image_id: str, entry: dict):
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, image_id)
+            with open(path, "wb") as f:
+                f.write(entry["data"])
+        except OSError as e:
+            print(f"Could not spill image {image_id[:12]} to disk: {e}")
+            return
+        self._spilled[image_id] = {
+            "path": path,
+            "media_type": entry["media_type"],
+            "size": len(entry["data"]),
+            "last_used": entry["last_used"],
+        }
+
+    def _drop_spilled(self, image_id: str):
+        spilled = self._spilled.pop(image_id, None)
+        if spilled:
+            try:
+                os.remove(spilled["path"])
+            except OSError:
+                pass
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        # memory is ordered by last use, so expired entries sit at the front
+        while self._memory:
+            image_id, entry = next(iter(self._memory.items()))
+            if entry["last_used"] >= cutoff:
+                break
+            self._memory.popitem(last=False)
+            self._memory_bytes -= len(entry["data"])
+        for image_id in [k for k, s in self._spilled.items() if s["last_used"] < cutoff]:
+            self._drop_spilled(image_id)
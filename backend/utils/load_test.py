@@ -0,0 +1,257 @@
+import io
+import os
+import sys
+import json
+import time
+import wave
+import base64
+import socket
+import argparse
+import itertools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from backend.utils.stats import LatencyStats
+
+
+# Concurrency levels driven against every scenario unless --levels is given
+DEFAULT_LEVELS = (1, 4, 16)
+DEFAULT_REQUESTS_PER_LEVEL = 40
+# /generate_contract writes contract_<order_number>.pdf into the backend's working directory
+CONTRACT_ORDER_NUMBER = "LOADTEST"
+
+_counter = itertools.count()
+
+
+def _unique() -> int:
+    # varies prompts so single-flight coalescing and result caches do not hide the real work
+    return next(_counter)
+
+
+def _png_bytes() -> bytes:
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (400, 300), "white")
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(["50x Schraube TX20 4x40", "2 Silikon transparent", "1 Zollstock"]):
+        draw.text((20, 30 + 40 * i), line, fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _silent_wav(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b"\x00\x00" * int(seconds * rate))
+    return buffer.getvalue()
+
+
+class Scenarios:
+    """One callable per backend endpoint; each performs a full user-visible request."""
+
+    def __init__(self, client: httpx.Client):
+        self.client = client
+        self.image = base64.b64encode(_png_bytes()).decode("ascii")
+        self.wav = _silent_wav()
+        self.image_id = None
+
+    def all(self) -> dict:
+        return {
+            "GET /": lambda: self.client.get("/"),
+            "POST /receive_user_prompt (llm)": lambda: self.client.post(
+                "/receive_user_prompt", json={"prompt": f"Badezimmer fliesen, Raum {_unique()}"}),
+            "POST /receive_user_prompt (express)": lambda: self.client.post(
+                "/receive_user_prompt", json={"prompt": f"{_unique() % 50 + 1}x Schraube TX20 4x40, 2 Silikon transparent"}),
+            "POST /chat_request (2 turns)": self.chat_two_turns,
+            "POST /clean_voice_input": lambda: self.client.post(
+                "/clean_voice_input", json={"text": f"äh ich brauche {_unique() % 90 + 10} Schrauben oder so"}),
+            "POST /transcribe": lambda: self.client.post(
+                "/transcribe", content=self.wav, headers={"Content-Type": "audio/wav"}),
+            "POST /upload_image": lambda: self.client.post(
+                "/upload_image", json={"image_base64": self.image, "media_type": "image/png"}),
+            "POST /analyze_image": self.analyze_image,
+            "POST /plan_batch": lambda: self.client.post("/plan_batch", json={"tasks": [
+                {"prompt": f"Trockenbau Wand {_unique()}"}, {"prompt": f"Fliesen Bad {_unique()}"}]}),
+            "POST /generate_contract": lambda: self.client.post("/generate_contract", json={
+                "order_number": CONTRACT_ORDER_NUMBER,
+                "parts_list": [{"id": "C001", "name": "Schraube TX20 4x40", "quantity": 50, "price": 0.08}]}),
+            "POST /send_foreman_approval": lambda: self.client.post("/send_foreman_approval", json={"ok": True}),
+            "GET /approval_list/foreman": lambda: self.client.get("/approval_list/foreman"),
+            "POST /procurement_approval": lambda: self.client.post("/procurement_approval", json={"ok": True}),
+            "GET /approval_list/procurement": lambda: self.client.get("/approval_list/procurement"),
+            "GET /agent_stats": lambda: self.client.get("/agent_stats"),
+            "GET /voice_stats": lambda: self.client.get("/voice_stats"),
+            "GET /image_stats": lambda: self.client.get("/image_stats"),
+            "GET /chat_stats": lambda: self.client.get("/chat_stats"),
+            "GET /metrics": lambda: self.client.get("/metrics"),
+        }
+
+    def chat_two_turns(self):
+        first = self.client.post("/chat_request", json={"message": f"Ich brauche Schrauben für Baustelle {_unique()}"})
+        if first.status_code != 200:
+            return first
+        return self.client.post("/chat_request", json={
+            "session_id": first.json()["session_id"], "message": "5x60, 200 Stück"})
+
+    def analyze_image(self):
+        if self.image_id is None:
+            upload = self.client.post("/upload_image", json={"image_base64": self.image, "media_type": "image/png"})
+            upload.raise_for_status()
+            self.image_id = upload.json()["image_id"]
+        return self.client.post("/analyze_image", json={
+            "image_id": self.image_id,
+            "messages": [{"role": "user", "content": f"What do I need? (run {_unique()})"}]})
+
+
+def run_level(fn, concurrency: int, total: int) -> dict:
+    """Fire `total` requests with `concurrency` in parallel; throughput, percentiles and error rate."""
+    stats = LatencyStats("load")
+
+    def one(_):
+        with stats.timer() as timer:
+            try:
+                response = fn()
+                timer.outcome = "ok" if response.status_code < 400 else f"http_{response.status_code}"
+            except httpx.HTTPError as e:
+                timer.outcome = type(e).__name__
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - start
+
+    summary = stats.summary()
+    errors = sum(n for outcome, n in summary["outcomes"].items() if outcome != "ok")
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": round(total / wall, 2) if wall > 0 else 0.0,
+        "p50_ms": summary["p50_ms"],
+        "p95_ms": summary["p95_ms"],
+        "p99_ms": summary["p99_ms"],
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "outcomes": summary["outcomes"],
+    }
+
+
+def run_suite(base_url: str, levels=DEFAULT_LEVELS, requests_per_level: int = DEFAULT_REQUESTS_PER_LEVEL,
+              only: str = None, timeout: float = 120.0) -> dict:
+    """Drive every scenario (or those containing `only`) at each concurrency level."""
+    limits = httpx.Limits(max_connections=max(levels) * 2, max_keepalive_connections=max(levels) * 2)
+    results = {}
+    with httpx.Client(base_url=base_url, timeout=timeout, limits=limits) as client:
+        for name, fn in Scenarios(client).all().items():
+            if only and only not in name:
+                continue
+            results[name] = []
+            for level in levels:
+                row = run_level(fn, level, max(requests_per_level, level))
+                results[name].append(row)
+                print(f"{name:<40} c={level:<3} {row['throughput_rps']:>8.2f} req/s  "
+                      f"p50 {row['p50_ms']:>8.1f}  p95 {row['p95_ms']:>8.1f}  p99 {row['p99_ms']:>8.1f} ms  "
+                      f"errors {row['error_rate']:.1%}")
+    return results
+
+
+def compare(results: dict, baseline: dict):
+    """Print p95 and throughput changes against a previous run."""
+    print("\nChange vs. baseline (p95 latency / throughput):")
+    for name, rows in results.items():
+        previous = {row["concurrency"]: row for row in baseline.get(name, [])}
+        for row in rows:
+            old = previous.get(row["concurrency"])
+            if not old or not old["p95_ms"] or not old["throughput_rps"]:
+                continue
+            p95 = (row["p95_ms"] - old["p95_ms"]) / old["p95_ms"]
+            rps = (row["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"]
+            print(f"{name:<40} c={row['concurrency']:<3} p95 {p95:+.1%}  throughput {rps:+.1%}")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def spawn_stack(fake_llm_args: list) -> tuple:
+    """Start the fake LLM and the backend (pointed at it) as subprocesses; returns (base_url, processes)."""
+    llm_port, api_port = _free_port(), _free_port()
+    fake = subprocess.Popen([sys.executable, "-m", "backend.utils.fake_llm", "--port", str(llm_port), *fake_llm_args])
+    env = {**os.environ, "HAMMERTIME_LLM_BASE_URL": f"http://127.0.0.1:{llm_port}",
+           "ANTHROPIC_API_KEY": os.environ.get("ANTHROPIC_API_KEY", "fake-key")}
+    api = subprocess.Popen([sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(api_port),
+                            "--log-level", "warning"], env=env)
+    processes = [fake, api]
+    try:
+        _wait_ready(f"http://127.0.0.1:{llm_port}/stats")
+        _wait_ready(f"http://127.0.0.1:{api_port}/")
+    except RuntimeError:
+        for process in processes:
+            process.terminate()
+        raise
+    return f"http://127.0.0.1:{api_port}", processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test every backend endpoint at rising concurrency.")
+    parser.add_argument("--base-url", default=None, help="running backend (default: spawn backend + fake LLM)")
+    parser.add_argument("--levels", default=",".join(map(str, DEFAULT_LEVELS)), help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS_PER_LEVEL, help="requests per level")
+    parser.add_argument("--only", default=None, help="run scenarios whose name contains this text")
+    parser.add_argument("--out", default="load_test_results.json", help="where to write the results")
+    parser.add_argument("--baseline", default=None, help="previous results to compare against")
+    parser.add_argument("--llm-latency-ms", type=float, default=400, help="fake LLM time to first token (spawn mode)")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=80, help="fake LLM output speed (spawn mode)")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0,
+                        help="fraction of fake LLM responses delayed by --llm-slow-ms (spawn mode)")
+    parser.add_argument("--llm-slow-ms", type=float, default=10000)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    processes = []
+    base_url = args.base_url
+    if base_url is None:
+        base_url, processes = spawn_stack(["--latency-ms", str(args.llm_latency_ms),
+                                           "--tokens-per-second", str(args.llm_tokens_per_second),
+                                           "--slow-rate", str(args.llm_slow_rate), "--slow-ms", str(args.llm_slow_ms)])
+    try:
+        results = run_suite(base_url, levels, args.requests, args.only)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+        if processes and os.path.exists(f"contract_{CONTRACT_ORDER_NUMBER}.pdf"):
+            os.remove(f"contract_{CONTRACT_ORDER_NUMBER}.pdf")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults -> {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+# Example usage:
+#   python -m backend.utils.load_test --levels 1,4,16 --requests 40
+#   python -m backend.utils.load_test --base-url http://localhost:8000 --baseline last_release.json
+#   python -m backend.utils.load_test --only chat --llm-slow-rate 0.05 --llm-slow-ms 20000   # tail latency / hedging
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import time
+import functools
+import threading
+from bisect import bisect_left
+
+
+# Latency buckets in seconds: sub-millisecond local paths up to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _label_pairs(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), register: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        if register:
+            with _registry_lock:
+                _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_pairs(self.labelnames, key)} {_format(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic counter, e.g. tokens or parse failures."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. requests in flight."""
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Cumulative latency histogram with fixed buckets (Prometheus semantics)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS,
+                 register: bool = True):
+        super().__init__(name, documentation, labelnames, register)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # per-bucket (non-cumulative) counts, the last slot is +Inf
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the elapsed seconds of the block."""
+        return _HistogramTimer(self, labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                labels = _label_pairs(self.labelnames + ("le",), key + (_format(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_pairs(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _HistogramTimer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self._start, **self.labels)
+        return False
+
+
+# Shared metrics for the app; modules add their own next to the code they measure
+STAGE_SECONDS = Histogram(
+    "hammertime_stage_seconds", "Latency of internal stages (prompt build, LLM call, parse, pricing, PDF)",
+    ("function", "stage"),
+)
+OVERHEAD_SECONDS = Gauge(
+    "hammertime_metrics_overhead_seconds", "Measured cost of one timed stage (two clock reads + observe)",
+)
+
+
+def stage(function: str, name: str):
+    """Time one stage of `function`, e.g. `with stage("chat_procurement_request", "llm_call"):`."""
+    return _HistogramTimer(STAGE_SECONDS, {"function": function, "stage": name})
+
+
+def timed(function: str, name: str):
+    """Decorator form of `stage` for functions that are a stage of their own."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(function, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def measure_overhead(iterations: int = 20000) -> float:
+    """Seconds spent per instrumented block on an empty body, measured on a private histogram."""
+    probe = Histogram("probe", "", ("function", "stage"), register=False)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with _HistogramTimer(probe, {"function": "probe", "stage": "probe"}):
+            pass
+    return (time.perf_counter() - start) / iterations
+
+
+_overhead_measured = False
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    global _overhead_measured
+    if not _overhead_measured:
+        OVERHEAD_SECONDS.set(measure_overhead())
+        _overhead_measured = True
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,152 @@
+import os
+import re
+import threading
+
+from backend.utils.metrics import Counter
+
+
+# Model per tier (overridable via environment)
+MODEL_TIERS = {
+    "small": os.environ.get("HAMMERTIME_MODEL_SMALL", "claude-3-5-haiku-20241022"),
+    "large": os.environ.get("HAMMERTIME_MODEL_LARGE", "claude-sonnet-4-20250514"),
+}
+
+# USD per million (input, output) tokens; unknown models are costed like the large tier
+MODEL_PRICES = {
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+    "claude-3-5-sonnet-20241022": (3.00, 15.00),
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+}
+
+# Seconds each route may spend in the LLM before the small model is preferred
+LATENCY_BUDGETS = {
+    "clean_voice_transcript": float(os.environ.get("HAMMERTIME_BUDGET_CLEAN_VOICE", 2.0)),
+    "process_procurement_request": float(os.environ.get("HAMMERTIME_BUDGET_PROCUREMENT", 15.0)),
+    "chat_procurement_request": float(os.environ.get("HAMMERTIME_BUDGET_CHAT", 8.0)),
+    "analyze_image_request": float(os.environ.get("HAMMERTIME_BUDGET_IMAGE", 15.0)),
+}
+
+# Starting latency estimates per tier, refined with observed call latencies
+INITIAL_LATENCY_SECONDS = {"small": 2.0, "large": 6.0}
+
+# Tasks that need the large model regardless of size (vision, open-ended site analysis)
+LARGE_ONLY_TASKS = {"analyze_image_request", "analyze_construction_image"}
+# Mechanical tasks the small model handles well, with the reason logged for them
+SMALL_ONLY_TASKS = {"clean_voice_transcript": "cleanup", "repair_order": "repair"}
+
+# Trade keywords; requests touching several trades need real planning
+TRADES = {
+    "drywall": ["trockenbau", "rigips", "gipskarton", "drywall", "ständerwerk"],
+    "tiling": ["fliese", "fliesen", "tiling", "tiles", "verfugen"],
+    "electrical": ["elektro", "kabel", "steckdose", "leitung", "installationsdraht", "electrical", "wiring"],
+    "plumbing": ["sanitär", "rohr", "wasserleitung", "abfluss", "plumbing", "pipe"],
+    "painting": ["streichen", "maler", "farbe", "lackieren", "painting", "paint"],
+    "carpentry": ["holz", "balken", "schreiner", "zimmer", "carpentry", "timber"],
+    "concrete": ["beton", "estrich", "mauern", "concrete", "screed"],
+    "roofing": ["dach", "ziegel", "roofing", "roof"],
+    "insulation": ["dämmung", "dämmen", "insulation"],
+}
+
+# Short requests with explicit quantities are simple lookups
+SHORT_REQUEST_WORDS = 15
+LONG_REQUEST_WORDS = 60
+# Every n-th over-budget request still goes to the large model so its latency estimate can recover
+PROBE_EVERY = 20
+
+ROUTES = Counter("hammertime_model_routes_total", "Routing decisions per task", ("task", "model", "reason"))
+COST_USD = Counter("hammertime_llm_cost_usd_total", "Estimated LLM spend", ("model",))
+
+_QUANTITY_RE = re.compile(r"\d")
+
+
+def trades_in(text: str) -> set:
+    text = text.lower()
+    return {trade for trade, words in TRADES.items() if any(word in text for word in words)}
+
+
+class ModelRouter:
+    """
+    Picks a model tier per LLM call from the task, the request text and the route's latency budget.
+
+    Keeps an exponentially weighted latency estimate per model from real calls, so a
+    slow large model automatically loses routes whose budget it no longer meets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {MODEL_TIERS[tier]: seconds for tier, seconds in INITIAL_LATENCY_SECONDS.items()}
+        self._calls = {}
+        self._over_budget = 0
+
+    def choose(self, task: str, text: str) -> tuple:
+        """
+        Args:
+            task: agent function name (route)
+            text: the user's request text (latest message for chats)
+
+        Returns:
+            (model, reason)
+        """
+        tier, reason = self._tier(task, text or "")
+        model = MODEL_TIERS[tier]
+        ROUTES.inc(task=task, model=model, reason=reason)
+        return model, reason
+
+    def _tier(self, task: str, text: str) -> tuple:
+        if task in LARGE_ONLY_TASKS:
+            return "large", "vision"
+        if task in SMALL_ONLY_TASKS:
+            return "small", SMALL_ONLY_TASKS[task]
+
+        words = len(text.split())
+        trades = trades_in(text)
+        if len(trades) >= 2:
+            return "large", "multi_trade"
+        if words >= LONG_REQUEST_WORDS:
+            return "large", "long_request"
+        if words <= SHORT_REQUEST_WORDS and _QUANTITY_RE.search(text):
+            return "small", "short_explicit"
+
+        budget = LATENCY_BUDGETS.get(task)
+        if budget is not None and self.expected_latency(MODEL_TIERS["large"]) > budget:
+            with self._lock:
+                self._over_budget += 1
+                probe = self._over_budget % PROBE_EVERY == 0
+            return ("large", "probe") if probe else ("small", "latency_budget")
+        return "large", "default"
+
+    def expected_latency(self, model: str) -> float:
+        with self._lock:
+            return self._latency.get(model, INITIAL_LATENCY_SECONDS["large"])
+
+    def record(self, task: str, model: str, reason: str, seconds: float, usage) -> float:
+        """Account one finished call; returns its estimated cost in USD."""
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+        price_in, price_out = MODEL_PRICES.get(model, MODEL_PRICES[MODEL_TIERS["large"]])
+        cost = (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+        COST_USD.inc(cost, model=model)
+
+        with self._lock:
+            previous = self._latency.get(model, seconds)
+            self._latency[model] = 0.8 * previous + 0.2 * seconds
+            entry = self._calls.setdefault((task, model), {"calls": 0, "seconds": 0.0, "cost_usd": 0.0})
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["cost_usd"] += cost
+        return cost
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "expected_latency_s": {m: round(s, 2) for m, s in self._latency.items()},
+                "routes": [
+                    {"task": task, "model": model, "calls": e["calls"],
+                     "mean_latency_s": round(e["seconds"] / e["calls"], 2), "cost_usd": round(e["cost_usd"], 5)}
+                    for (task, model), e in sorted(self._calls.items())
+                ],
+                "budgets_s": dict(LATENCY_BUDGETS),
+            }
+
+
+model_router = ModelRouter()
@@ -0,0 +1,63 @@
+import io
+from PIL import Image, ImageOps
+
+try:
+    import pytesseract
+except ImportError:  # optional: pip install pytesseract + apt-get install tesseract-ocr
+    pytesseract = None
+
+
+OCR_LANGUAGES = "deu+eng"
+
+_available = None
+
+
+def ocr_available() -> bool:
+    """True if pytesseract and the tesseract binary are both installed."""
+    global _available
+    if _available is None:
+        if pytesseract is None:
+            _available = False
+        else:
+            try:
+                pytesseract.get_tesseract_version()
+                _available = True
+            except Exception:
+                _available = False
+                print("tesseract binary not found - local OCR disabled")
+    return _available
+
+
+def ocr_lines(data: bytes, languages: str = OCR_LANGUAGES) -> list:
+    """
+    Run Tesseract on an image and return its text lines.
+
+    Args:
+        data: Image bytes (any format Pillow can read)
+        languages: Tesseract language codes
+
+    Returns:
+        list of {"text": str, "confidence": float in [0, 1]} in reading order
+    """
+    img = Image.open(io.BytesIO(data))
+    img = ImageOps.autocontrast(ImageOps.exif_transpose(img).convert("L"))
+
+    ocr = pytesseract.image_to_data(img, lang=languages, output_type=pytesseract.Output.DICT)
+
+    lines = {}
+    for i, word in enumerate(ocr["text"]):
+        word = word.strip()
+        conf = float(ocr["conf"][i])
+        if not word or conf < 0:
+            continue
+        key = (ocr["block_num"][i], ocr["par_num"][i], ocr["line_num"][i])
+        lines.setdefault(key, []).append((word, conf))
+
+    result = []
+    for key in sorted(lines):
+        words = lines[key]
+        result.append({
+            "text": " ".join(w for w, _ in words),
+            "confidence": round(sum(c for _, c in words) / len(words) / 100, 3),
+        })
+    return result
@@ -0,0 +1,325 @@
+import os
+import re
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+from backend.utils.event_queue import EventQueue, EVENT_DB_PATH
+
+
+# Events of the order pipeline:
+#   order.placed -> order stored, approved orders go on to order.approved
+#   order.approved -> contract PDF rendered
+#   aggregates.refresh (after every change, coalesced) -> report aggregates recomputed
+ORDER_PLACED = "order.placed"
+ORDER_APPROVED = "order.approved"
+AGGREGATES_REFRESH = "aggregates.refresh"
+
+# Order IDs as generated by the frontend; they become part of the contract file name
+ORDER_ID_PATTERN = r"^ORD-[A-F0-9]{8}$"
+ORDER_ID_RE = re.compile(ORDER_ID_PATTERN)
+
+APPROVED_STATUSES = ("Auto-Approved", "Admin Approved", "Approved")
+PENDING_STATUS = "Pending Approval"
+DECLINED_STATUS = "Order Declined"
+
+# Worker processes embedded in the API (uvicorn) or the gunicorn master; opt-in, as every
+# uvicorn process would start its own. Usually they run via `python -m backend.utils.order_pipeline`.
+PIPELINE_WORKERS = int(os.environ.get("HAMMERTIME_PIPELINE_WORKERS", 0))
+# Worker processes of `python -m backend.utils.order_pipeline`
+CLI_WORKERS = 2
+# How long an idle worker waits before looking for new events again
+PIPELINE_POLL_SECONDS = float(os.environ.get("HAMMERTIME_PIPELINE_POLL", 0.2))
+CONTRACTS_DIR = os.environ.get(
+    "HAMMERTIME_CONTRACTS_DIR", os.path.join(tempfile.gettempdir(), "hammertime_contracts")
+)
+# Finished events are purged about this often per worker
+PURGE_EVERY_SECONDS = 600
+
+_ORDER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    placed_at TEXT,
+    requester TEXT,
+    site TEXT,
+    total REAL NOT NULL,
+    status TEXT NOT NULL,
+    items TEXT NOT NULL,
+    contract_path TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS order_aggregates (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def get_queue(path: str = EVENT_DB_PATH) -> EventQueue:
+    """The event queue with the order tables next to it (same SQLite file)."""
+    queue = EventQueue(path)
+    conn = queue.connect()
+    try:
+        conn.executescript(_ORDER_SCHEMA)
+    finally:
+        conn.close()
+    return queue
+
+
+# --- order store (written by the workers, read by the API) ---
+
+def _order(row) -> dict:
+    return {
+        "order_id": row["order_id"],
+        "placed_at": row["placed_at"],
+        "requester": row["requester"],
+        "site": row["site"],
+        "total": row["total"],
+        "status": row["status"],
+        "items": json.loads(row["items"]),
+        "contract_ready": row["contract_path"] is not None,
+        "updated_at": row["updated_at"],
+    }
+
+
+def get_order(queue: EventQueue, order_id: str):
+    conn = queue.connect()
+    try:
+        row = conn.execute("SELECT * FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+        return dict(_order(row), contract_path=row["contract_path"]) if row is not None else None
+    finally:
+        conn.close()
+
+
+def list_orders(queue: EventQueue, limit: int = 100) -> list:
+    conn = queue.connect()
+    try:
+        rows = conn.execute("SELECT * FROM orders ORDER BY updated_at DESC LIMIT ?", (limit,)).fetchall()
+        return [_order(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def get_aggregates(queue: EventQueue) -> dict:
+    """Report numbers as of the last aggregates.refresh (empty before the first order)."""
+    conn = queue.connect()
+    try:
+        row = conn.execute("SELECT data, updated_at FROM order_aggregates WHERE id = 1").fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return {"total_orders": 0, "total_spend": 0.0, "pending_approvals": 0, "approved_orders": 0,
+                "contracts": 0, "spend_by_supplier": {}, "updated_at": None}
+    return {**json.loads(row["data"]), "updated_at": row["updated_at"]}
+
+
+# --- event handlers: idempotent (events may be delivered more than once); return follow-up events ---
+
+def handle_order_placed(queue: EventQueue, order: dict) -> list:
+    """Store the order; an approved order continues to order.approved."""
+    conn = queue.connect()
+    try:
+        # a redelivered order.placed must not undo a later approval
+        conn.execute(
+            "INSERT INTO orders (order_id, placed_at, requester, site, total, status, items, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(order_id) DO NOTHING",
+            (order["order_id"], order.get("placed_at"), order.get("requester"), order.get("site"),
+             float(order["total"]), order["status"], json.dumps(order["items"], ensure_ascii=False), time.time()),
+        )
+    finally:
+        conn.close()
+    follow_ups = [(AGGREGATES_REFRESH, {}, AGGREGATES_REFRESH)]
+    if order["status"] in APPROVED_STATUSES:
+        follow_ups.append((ORDER_APPROVED, {"order_id": order["order_id"], "status": order["status"]},
+                           f"{ORDER_APPROVED}:{order['order_id']}"))
+    return follow_ups
+
+
+def contract_path(order_id: str) -> str:
+    """Where the contract PDF of an order goes (ValueError for anything but an order ID)."""
+    if not ORDER_ID_RE.match(order_id):
+        raise ValueError(f"invalid order id {order_id!r}")
+    return os.path.join(CONTRACTS_DIR, f"contract_{order_id}.pdf")
+
+
+def handle_order_approved(queue: EventQueue, event: dict) -> list:
+    """Mark the order approved and render its contract PDF."""
+    order = get_order(queue, event["order_id"])
+    if order is None:
+        # order.placed not processed yet (a concurrent worker): retried with backoff
+        raise LookupError(f"order {event['order_id']} not stored yet")
+    path = contract_path(order["order_id"])
+    if order["contract_path"] is None or not os.path.exists(path):
+        render_contract(order, path)
+    conn = queue.connect()
+    try:
+        conn.execute(
+            "UPDATE orders SET status = ?, contract_path = ?, updated_at = ? WHERE order_id = ?",
+            (event.get("status", "Approved"), path, time.time(), order["order_id"]),
+        )
+    finally:
+        conn.close()
+    return [(AGGREGATES_REFRESH, {}, AGGREGATES_REFRESH)]
+
+
+def render_contract(order: dict, path: str):
+    """Contract PDF for an order, written atomically (a crash never leaves half a file)."""
+    from backend.pdf_generator import generate_pdf_contract  # reportlab only in the workers
+
+    parts_list = [{
+        "id": item.get("id", ""),
+        "name": item.get("name", ""),
+        "description": item.get("description", ""),
+        "quantity": item.get("qty", 0),
+        "price": item.get("price", 0.0),
+        "supplier": item.get("supplier", ""),
+    } for item in order["items"]]
+    os.makedirs(CONTRACTS_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    generate_pdf_contract(parts_list, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def refresh_aggregates(queue: EventQueue, _event: dict) -> list:
+    """Recompute the report numbers from the stored orders."""
+    conn = queue.connect()
+    try:
+        rows = conn.execute("SELECT total, status, items, contract_path FROM orders").fetchall()
+        spend_by_supplier = {}
+        for row in rows:
+            if row["status"] in APPROVED_STATUSES:
+                for item in json.loads(row["items"]):
+                    supplier = item.get("supplier") or "Other"
+                    spend_by_supplier[supplier] = round(
+                        spend_by_supplier.get(supplier, 0.0) + item.get("price", 0.0) * item.get("qty", 0), 2)
+        data = {
+            "total_orders": len(rows),
+            "total_spend": round(sum(row["total"] for row in rows if row["status"] != DECLINED_STATUS), 2),
+            "pending_approvals": sum(1 for row in rows if row["status"] == PENDING_STATUS),
+            "approved_orders": sum(1 for row in rows if row["status"] in APPROVED_STATUSES),
+            "contracts": sum(1 for row in rows if row["contract_path"] is not None),
+            "spend_by_supplier": spend_by_supplier,
+        }
+        conn.execute(
+            "INSERT INTO order_aggregates (id, data, updated_at) VALUES (1, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (json.dumps(data, ensure_ascii=False), time.time()),
+        )
+    finally:
+        conn.close()
+    return []
+
+
+HANDLERS = {
+    ORDER_PLACED: handle_order_placed,
+    ORDER_APPROVED: handle_order_approved,
+    AGGREGATES_REFRESH: refresh_aggregates,
+}
+
+
+# --- workers ---
+
+def process_one(queue: EventQueue, worker: str) -> bool:
+    """
+    Claim and handle one event.
+
+    Returns:
+        False when no event was ready
+    """
+    event = queue.claim(worker)
+    if event is None:
+        return False
+    handler = HANDLERS.get(event["topic"])
+    try:
+        follow_ups = handler(queue, event["payload"]) if handler is not None else []
+    except Exception as e:
+        dead = queue.fail(event, worker, f"{type(e).__name__}: {e}")
+        print(f"[{worker}] {event['topic']} #{event['id']} failed (attempt {event['attempts']}"
+              f"{', giving up' if dead else ''}): {e}")
+        return True
+    queue.complete(event, worker, follow_ups)
+    return True
+
+
+def run_worker(worker: str, stop=None, path: str = EVENT_DB_PATH, poll_seconds: float = PIPELINE_POLL_SECONDS):
+    """Drain the queue until `stop` is set (runs forever without one)."""
+    queue = get_queue(path)
+    stop = stop or threading.Event()
+    last_purge = time.monotonic()
+    print(f"[{worker}] order pipeline worker started on {path}")
+    while not stop.is_set():
+        try:
+            busy = process_one(queue, worker)
+        except Exception as e:  # queue unavailable (e.g. locked too long): back off, keep the worker alive
+            print(f"[{worker}] queue error: {e}")
+            busy = False
+        if not busy:
+            stop.wait(poll_seconds)
+        if time.monotonic() - last_purge > PURGE_EVERY_SECONDS:
+            queue.purge()
+            last_purge = time.monotonic()
+
+
+def worker_name(index: int) -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-w{index}"
+
+
+def _worker_main(index: int, stop, path: str):
+    run_worker(worker_name(index), stop, path)
+
+
+def start_workers(count: int = PIPELINE_WORKERS, path: str = EVENT_DB_PATH) -> tuple:
+    """
+    Start `count` worker processes (fresh interpreters: they only import the pipeline, not the API).
+
+    Returns:
+        (stop event, processes) for stop_workers()
+    """
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    get_queue(path)  # create the tables once, before the workers race for it
+    processes = []
+    for index in range(count):
+        process = context.Process(target=_worker_main, args=(index, stop, path), name=f"order-pipeline-{index}",
+                                  daemon=True)
+        process.start()
+        processes.append(process)
+    return stop, processes
+
+
+def stop_workers(workers: tuple, timeout: float = 10.0):
+    """Let the workers finish their current event and exit."""
+    stop, processes = workers
+    stop.set()
+    for process in processes:
+        process.join(timeout)
+        if process.is_alive():
+            process.terminate()  # its leased event is redelivered after the lease
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run order pipeline workers (placed -> approved -> contract, reports).")
+    parser.add_argument("--workers", type=int, default=CLI_WORKERS, help="worker processes")
+    parser.add_argument("--db", default=EVENT_DB_PATH, help="event queue database")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        run_worker(worker_name(0), path=args.db)
+        return
+    workers = start_workers(args.workers, args.db)
+    try:
+        for process in workers[1]:
+            process.join()
+    except KeyboardInterrupt:
+        stop_workers(workers)
+
+
+# Example usage:
+#   python -m backend.utils.order_pipeline --workers 4
+if __name__ == "__main__":
+    main()
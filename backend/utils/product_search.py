@@ -0,0 +1,99 @@
+import difflib
+from collections import defaultdict
+
+from backend.utils.catalog_matcher import PerCatalogCache, normalize_text
+
+
+# Searchable fields and how much a hit in each counts
+SEARCH_FIELDS = {"artikelname": 1.0, "artikel_id": 1.0, "kategorie": 0.6, "lieferant": 0.5}
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 50
+# Query tokens without any prefix hit are corrected to the closest indexed word (typos)
+TYPO_CUTOFF = 0.75
+
+
+class ProductIndex:
+    """
+    In-memory prefix and token index over the catalog for type-ahead search.
+
+    Every word of the searchable fields is indexed under all of its prefixes, so a
+    query is a handful of dict lookups. A row matches when every query word is a
+    prefix of one of its words; rows are ranked by how exactly and in which field
+    the words matched.
+    """
+
+    def __init__(self, catalog: list):
+        self.rows = list(catalog)
+        # prefix -> {row index: best field weight}, for exact words and for prefixes separately
+        self._exact = defaultdict(dict)
+        self._prefix = defaultdict(dict)
+        self._names = []
+        for i, row in enumerate(self.rows):
+            self._names.append(normalize_text(str(row.get("artikelname", ""))))
+            for field, weight in SEARCH_FIELDS.items():
+                for word in normalize_text(str(row.get(field, ""))).split():
+                    _keep_best(self._exact[word], i, weight)
+                    for end in range(1, len(word) + 1):
+                        _keep_best(self._prefix[word[:end]], i, weight)
+        self._vocabulary = sorted(self._exact)
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> list:
+        """
+        Args:
+            query: what the user typed so far
+            limit: maximum number of results
+
+        Returns:
+            [(row, score), ...] best first
+        """
+        words = normalize_text(query).split()
+        if not words:
+            return []
+
+        scores = None
+        for word in words:
+            hits = self._word_hits(word)
+            if scores is None:
+                scores = hits
+            else:
+                scores = {i: scores[i] + s for i, s in hits.items() if i in scores}
+            if not scores:
+                return []
+
+        phrase = " ".join(words)
+        ranked = []
+        for i, score in scores.items():
+            name = self._names[i]
+            if name.startswith(phrase):
+                score += 1.0
+            elif phrase in name:
+                score += 0.5
+            # shorter names first among equals ("Silikon" before "Silikonentferner")
+            score -= len(name) / 1000
+            ranked.append((round(score / len(words), 3), i))
+        ranked.sort(key=lambda x: (-x[0], x[1]))
+        return [(self.rows[i], score) for score, i in ranked[:limit]]
+
+    def _word_hits(self, word: str) -> dict:
+        hits = {i: 2.0 * weight for i, weight in self._exact.get(word, {}).items()}
+        for i, weight in self._prefix.get(word, {}).items():
+            hits.setdefault(i, (1.0 + len(word) / 20) * weight)
+        if hits:
+            return hits
+        for close in difflib.get_close_matches(word, self._vocabulary, n=3, cutoff=TYPO_CUTOFF):
+            for i, weight in self._exact[close].items():
+                hits[i] = max(hits.get(i, 0.0), 0.8 * weight)
+        return hits
+
+
+def _keep_best(entry: dict, i: int, weight: float):
+    if weight > entry.get(i, 0.0):
+        entry[i] = weight
+
+
+_indexes = PerCatalogCache(ProductIndex)
+
+
+def get_product_index(catalog: list) -> ProductIndex:
+    """ProductIndex for `catalog`, built once per catalog list (see PerCatalogCache)."""
+    return _indexes.get(catalog)
@@ -1,33 +1,304 @@
+import os
 import json
 import csv
+import time
+import base64
 import difflib
+import hashlib
+import functools
 import anthropic
 import yaml
+from backend.utils.catalog_matcher import (
+    PerCatalogCache, get_matcher, parse_order_line, parse_free_text_order, catalog_version,
+)
+from backend.utils.ocr import ocr_available, ocr_lines
+from backend.utils.single_flight import SingleFlight
+from backend.utils.cassette import get_cassette
+from backend.utils.admission import admission, llm_priority, Overloaded
+from backend.utils.model_router import model_router
+from backend.utils.resilience import breaker, hedged_call, deadline_for, record_degraded, LLM_UNAVAILABLE
+from backend.utils.structured_output import (
+    ORDER_TOOL_NAME, QUESTION_TOOL, REPAIRS, INVALID_LINES, StructuredOutputError, order_tool, extract, response_text,
+    validate_order, merge_lines, repair_prompt, repair_candidates, structured_stats,
+)
+from backend.utils.stats import LatencyStats
+from backend.utils.metrics import Counter, Gauge, STAGE_SECONDS, stage, timed
+from backend.utils.transcript_cleaner import clean_transcript
+
+
+# API key (and optionally BASE_URL) for the LLM; environment variables work without the file
+SECRETS_PATH = os.environ.get("HAMMERTIME_SECRETS", "secrets.yaml")
+
+
+def load_secrets(path: str = SECRETS_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+secrets = load_secrets()
+
+# Point the agent at another messages-API server, e.g. the local fake LLM for load tests
+LLM_BASE_URL = os.environ.get("HAMMERTIME_LLM_BASE_URL") or secrets.get("BASE_URL")
+
+_client = None
+
+
+def get_client():
+    """Shared Anthropic client (one connection pool per process)."""
+    global _client
+    if _client is None:
+        cassette = get_cassette()
+        # replaying needs no credentials; the client is never used for requests then
+        placeholder_key = "cassette-replay" if cassette is not None and cassette.replaying else None
+        _client = anthropic.Anthropic(
+            api_key=secrets.get("API_KEY") or os.environ.get("ANTHROPIC_API_KEY") or placeholder_key,
+            base_url=LLM_BASE_URL,
+            # hedged_call retries failed attempts within the route deadline (SDK retries would ignore it)
+            max_retries=0,
+        )
+    return _client
+
+
+# Local OCR fast path for photographed shopping lists: the vision model is only
+# called when OCR or catalog matching is not confident enough.
+OCR_MIN_CONFIDENCE = 0.7
+OCR_MATCH_MIN_CONFIDENCE = 0.8
+ocr_fast_path_stats = LatencyStats("local_ocr")
+# Express lane: fully specified orders ("50x Schraube TX20 4x40, 2 Silikon transparent")
+# are priced directly when every line resolves with at least this confidence
+EXPRESS_MATCH_MIN_CONFIDENCE = 0.85
+express_lane_stats = LatencyStats("express_lane")
+# Degraded mode (LLM down or too slow): lines matched at least this well are still offered
+DEGRADED_MATCH_MIN_CONFIDENCE = 0.5
+DEGRADED_NOTICE = ("The assistant is temporarily unavailable. Please list the items with quantities, "
+                   "e.g. '50x Schraube TX20 4x40, 2 Silikon transparent'.")
+# outcome "local" = rule-based cleaner, "llm" = Claude round trip (the only path before)
+clean_voice_stats = LatencyStats("clean_voice_input")
+
+# Prometheus metrics (served by /metrics); stage latencies go to hammertime_stage_seconds
+LLM_TOKENS = Counter("hammertime_llm_tokens_total", "Tokens billed per model", ("model", "direction"))
+LLM_IN_FLIGHT = Gauge("hammertime_llm_calls_in_flight", "LLM calls currently waiting for a response")
+PARSE_FAILURES = Counter(
+    "hammertime_llm_parse_failures_total", "Model responses that were not valid JSON", ("function",))
+FUZZY_FALLBACKS = Counter(
+    "hammertime_fuzzy_match_fallbacks_total", "Article IDs not in the catalog, by fuzzy match result", ("result",))
+TRANSCRIPT_ESCALATIONS = Counter(
+    "hammertime_transcript_escalations_total", "Transcripts the local cleaner passed to the LLM, by reason", ("reason",))
+
+
+def call_llm(client, function: str, route_text: str = None, **kwargs):
+    """
+    `client.messages.create(**kwargs)` with latency, in-flight and token metrics.
+
+    Calls pass the admission controller first (concurrency / per-minute caps, priority
+    queue) and raise `Overloaded` when shed. With HAMMERTIME_LLM_CASSETTE_MODE=record every
+    exchange is appended to the cassette; in replay mode the recorded response is returned
+    without touching the network (or queueing).
+
+    Without an explicit `model`, the model router picks one from the task and `route_text`
+    (the user's request); the decision, latency and cost are accounted per call.
+
+    Live calls run under the route's deadline with hedging (see resilience.hedged_call) and
+    raise `ProviderUnavailable` right away while the circuit breaker is open.
+    """
+    reason = None
+    if "model" not in kwargs:
+        kwargs["model"], reason = model_router.choose(function, route_text)
+    cassette = get_cassette()
+    start = time.perf_counter()
+    if cassette is not None and cassette.replaying:
+        with stage(function, "llm_call"):
+            response = cassette.replay(function, kwargs)
+    else:
+        breaker.before_call()
+        called = time.monotonic()
+        # the slot passes to the first attempt and is released when that attempt ends
+        admission.acquire(llm_priority.get(), max_wait=deadline_for(function))
+        LLM_IN_FLIGHT.inc()
+        try:
+            with stage(function, "llm_call"):
+                start = time.perf_counter()
+                # the route deadline counts from `called`, so it includes the admission wait
+                response = hedged_call(function, lambda timeout: client.messages.create(**kwargs, timeout=timeout),
+                                       started=called)
+                if cassette is not None:
+                    cassette.record(function, kwargs, response, time.perf_counter() - start)
+        finally:
+            LLM_IN_FLIGHT.dec()
+    seconds = time.perf_counter() - start
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.inc(getattr(usage, "input_tokens", 0) or 0, model=kwargs.get("model"), direction="input")
+        LLM_TOKENS.inc(getattr(usage, "output_tokens", 0) or 0, model=kwargs.get("model"), direction="output")
+    model_router.record(function, kwargs["model"], reason, seconds, usage)
+    return response
+
+
+# Identical requests arriving while the same LLM call is still running share its result
+agent_flights = SingleFlight()
+
+
+def _normalize(text: str) -> str:
+    return " ".join(str(text).lower().split())
+
+
+def _digest(value) -> str:
+    return hashlib.sha1(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def coalesced(kind: str, key_fn):
+    """Run the decorated agent function through `agent_flights`, keyed by `key_fn(*args)`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return agent_flights.do((kind, key_fn(*args, **kwargs)), fn, *args, **kwargs)
+        return wrapper
+    return decorator
 
 
-with open("secrets.yaml", "r", encoding="utf-8") as f:
-    secrets = yaml.safe_load(f)
+def _messages_key(messages: list) -> str:
+    return _digest([[m["role"], _normalize(m["content"])] for m in messages])
+
+
+def _user_text(messages: list) -> str:
+    """Everything the user said in a conversation (text parts only), for model routing."""
+    return "\n".join(m["content"] for m in messages or [] if m["role"] == "user" and isinstance(m["content"], str))
+
+
+def express_lane_request(foreman_message: str, c_materials_data: list):
+    """
+    Price an explicit order without the LLM.
+
+    Splits the message into quantity/item pairs and resolves each item by article ID,
+    name and size spec.
+
+    Returns:
+        detailed output (like process_procurement_request) if every line resolved
+        with high confidence and its catalog name accounts for the whole line, otherwise None
+    """
+    with express_lane_stats.timer() as timer:
+        timer.outcome = "fallback"
+        parsed = parse_free_text_order(foreman_message)
+        if not parsed:
+            return None
+        resolved = get_matcher(c_materials_data).resolve_lines(parsed)
+        # "0x Zollstock" is not an order line the rules can take literally
+        if any(r["artikel_id"] is None or r["confidence"] < EXPRESS_MATCH_MIN_CONFIDENCE or not r["covered"]
+               or r["anzahl"] < 1 for r in resolved):
+            return None
+
+        # the same article named twice is one line
+        result = {"materials": merge_lines([[r["artikel_id"], r["anzahl"]] for r in resolved])}
+        detailed = match_and_price(result, catalog=c_materials_data, approval_threshold=500.0)
+        names = ", ".join(f"{it['anzahl']}x {it['artikelname']}" for it in detailed["items"])
+        timer.outcome = "express"
+
+    return {
+        'explanation': f"Ordered exactly as requested: {names}",
+        **detailed,
+        'source': 'express',
+    }
+
+
+def degraded_request(text: str, c_materials_data: list):
+    """
+    Catalog-match-only answer used while the LLM is unavailable.
+
+    Like the express lane, but tidies the text with the local transcript cleaner, takes
+    the best catalog row even when several fit ("Schrauben" without a size) and lists
+    lines that matched nothing as not understood.
 
+    Returns:
+        detailed output with 'source': 'degraded', or None if nothing matched
+    """
+    parsed = parse_free_text_order(clean_transcript(text)["cleaned"])
+    resolved = get_matcher(c_materials_data).resolve_lines(parsed, allow_ambiguous=True) if parsed else []
+    matched = [r for r in resolved if r["artikel_id"] and r["confidence"] >= DEGRADED_MATCH_MIN_CONFIDENCE]
+    if not matched:
+        return None
+
+    result = {"materials": [[r["artikel_id"], r["anzahl"]] for r in matched]}
+    detailed = match_and_price(result, catalog=c_materials_data, approval_threshold=500.0)
+    explanation = ("The assistant is temporarily unavailable; matched your request against the catalog: "
+                   + ", ".join(f"{it['anzahl']}x {it['artikelname']}" for it in detailed["items"]))
+    skipped = [r["text"] for r in resolved if r not in matched]
+    if skipped:
+        explanation += ". Not matched: " + ", ".join(skipped)
+    return {'explanation': explanation, **detailed, 'source': 'degraded'}
+
+
+@coalesced("process_procurement_request",
+           lambda foreman_message, c_materials_data: (_normalize(foreman_message), catalog_version(c_materials_data)))
 def process_procurement_request(foreman_message: str, c_materials_data: list) -> dict:
     """
     Process a foreman's procurement request and return necessary C-materials.
     
+    Explicit orders are answered by the express lane; everything else goes to Claude.
+    
     Args:
         foreman_message: The foreman's task description
         c_materials_data: List of available C-materials (JSON data)
     
     Returns:
-        dict with 'materials' (list of [artikel_id, anzahl]) and 'explanation'
+        dict with 'explanation', 'total', 'requireApproval', 'items' and
+        'source' ("express", "llm" or "degraded" while the LLM is unavailable)
     """
+    express = express_lane_request(foreman_message, c_materials_data)
+    if express is not None:
+        return express
     
-    # Resolve Anthropic API key from secrets.yaml or environment
-    api_key = secrets.get('API_KEY')
 
-    client = anthropic.Anthropic(api_key=api_key)
-    
-    materials_json = json.dumps(c_materials_data, ensure_ascii=False, indent=2)
+    client = get_client()
     
-    prompt = f"""You are a procurement helper tool for onsite C material procurement. 
+    with stage("process_procurement_request", "prompt_build"):
+        materials_json = catalog_prompt_json(c_materials_data)
+        prompt = _procurement_prompt(materials_json, foreman_message)
+
+    # Call Claude API
+    try:
+        message = call_llm(
+            client, "process_procurement_request",
+            route_text=foreman_message,
+            max_tokens=4000,
+            tools=[catalog_order_tool(c_materials_data)],
+            tool_choice={"type": "tool", "name": ORDER_TOOL_NAME},
+            messages=[
+                {"role": "user", "content": prompt}
+            ]
+        )
+    except LLM_UNAVAILABLE as e:
+        record_degraded("process_procurement_request", e)
+        degraded = degraded_request(foreman_message, c_materials_data)
+        if degraded is None:
+            return {'explanation': DEGRADED_NOTICE, 'total': 0.0, 'requireApproval': False, 'items': [],
+                    'source': 'degraded'}
+        return degraded
+
+    try:
+        _, result = structured_result(client, "process_procurement_request", message, c_materials_data)
+    except StructuredOutputError:
+        # no tool call and no JSON: pass on what the model said, or match the request directly
+        text = response_text(message)
+        if text:
+            return {'explanation': text, 'total': 0.0, 'requireApproval': False, 'items': [], 'source': 'llm'}
+        return degraded_request(foreman_message, c_materials_data) or {
+            'explanation': DEGRADED_NOTICE, 'total': 0.0, 'requireApproval': False, 'items': [], 'source': 'degraded'}
+
+    # Enrich/match and price using the provided c_materials_data (avoid re-reading CSV)
+    detailed = match_and_price(result, catalog=c_materials_data, approval_threshold=500.0)
+    detailed_output = {
+        'explanation': result.get('explanation', ''),
+        **detailed,
+        'source': 'llm',
+    }
+
+    return detailed_output
+
+
+def _procurement_prompt(materials_json: str, foreman_message: str) -> str:
+    return f"""You are a procurement helper tool for onsite C material procurement. 
 
     Here is the available C-materials catalog:
     {materials_json}
@@ -38,15 +309,8 @@ def process_procurement_request(foreman_message: str, c_materials_data: list) ->
     Foreman's task: "{foreman_message}"
 
     
-    RETURN: ONLY JSON object with EXACTLY this structure:
-    {{
-    "materials": [
-        ["artikel_id", anzahl],
-        ["artikel_id", anzahl],
-        ...
-    ],
-    "explanation": "Brief explanation of what was ordered and why"
-    }}
+    RETURN: call the submit_order tool with the materials (artikel_id and quantity) and a brief
+    explanation of what was ordered and why.
 
     Consider:
     - Typical quantities needed for the task
@@ -55,66 +319,123 @@ def process_procurement_request(foreman_message: str, c_materials_data: list) ->
     - Cleaning and preparation materials
     - Consider the task type and select appropriate materials"""
 
-    # Call Claude API
-    print("prompting...")
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=4000,
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
-    )
 
-    print("Raw Response: ", message)
-    
-    # Extract response
-    response_text = message.content[0].text
-    
-    # Parse JSON response (handle potential markdown code blocks or surrounding text)
-    response_text = response_text.strip()
-
-    # Prefer an explicit ```json block, then any ``` block
-    start = None
-    idx_json = response_text.find("```json")
-    idx_code = response_text.find("```")
-    if idx_json != -1:
-        start = idx_json + len("```json")
-    elif idx_code != -1:
-        start = idx_code + 3
-
-    if start is not None:
-        # look for a closing fence after the start
-        end = response_text.find("```", start)
-        if end != -1:
-            response_text = response_text[start:end].strip()
-        else:
-            # no closing fence, take the rest
-            response_text = response_text[start:].strip()
-    else:
-        # no code fences found — try to extract a JSON object from the text
-        first_brace = response_text.find("{")
-        last_brace = response_text.rfind("}")
-        if first_brace != -1 and last_brace != -1 and last_brace > first_brace:
-            response_text = response_text[first_brace:last_brace+1].strip()
-
-    # final cleanup of any remaining backticks or surrounding whitespace
-    if response_text.startswith("```"):
-        response_text = response_text[3:].strip()
-    if response_text.endswith("```"):
-        response_text = response_text[:-3].strip()
-    
-    result = json.loads(response_text)
+def _article_ids(c_materials_data: list) -> list:
+    return [str(row.get("artikel_id", "")).strip().upper() for row in c_materials_data if row.get("artikel_id")]
 
-    # Enrich/match and price using the provided c_materials_data (avoid re-reading CSV)
-    detailed = match_and_price(result, catalog=c_materials_data, approval_threshold=500.0)
-    detailed_output = {
-        'explanation': result.get('explanation', ''),
-        **detailed,
-    }
 
-    return detailed_output
+# Prompt parts compiled once per catalog list (the base catalog or a site view)
+_materials_json = PerCatalogCache(lambda c_materials_data: json.dumps(c_materials_data, ensure_ascii=False, indent=2))
+_order_tools = PerCatalogCache(lambda c_materials_data: order_tool(_article_ids(c_materials_data)))
+_article_id_sets = PerCatalogCache(lambda c_materials_data: frozenset(_article_ids(c_materials_data)))
+
+
+def catalog_prompt_json(c_materials_data: list) -> str:
+    """The catalog as embedded in the prompts."""
+    return _materials_json.get(c_materials_data)
+
+
+def catalog_order_tool(c_materials_data: list) -> dict:
+    """submit_order tool restricted to the catalog's article IDs."""
+    return _order_tools.get(c_materials_data)
+
+
+def catalog_article_ids(c_materials_data: list) -> frozenset:
+    return _article_id_sets.get(c_materials_data)
 
 
+def structured_result(client, function: str, response, c_materials_data: list) -> tuple:
+    """
+    Read the tool call of an agent response and check the order against the catalog.
+
+    Lines with unknown article IDs or bad quantities are fixed in one small follow-up
+    call (see `repair_order_lines`); the rest of the order is kept as is. Invalid lines the
+    repair could not fix are named in the explanation.
+
+    Returns:
+        ("question", text) or ("order", {"materials": [[artikel_id, quantity], ...], "explanation": ...})
+    """
+    with stage(function, "parse"):
+        try:
+            kind, payload = extract(response)
+        except StructuredOutputError:
+            PARSE_FAILURES.inc(function=function)
+            structured_stats.add(function, responses=1, parse_failures=1)
+            raise
+    structured_stats.add(function, responses=1)
+    if kind == "question":
+        return kind, payload
+
+    explanation = payload.get("explanation", "")
+    valid, invalid = validate_order(payload, catalog_article_ids(c_materials_data))
+    if invalid:
+        repaired, unresolved = repair_order_lines(client, function, invalid, explanation, c_materials_data)
+        # a repaired line may name an article the order already has
+        valid = merge_lines(valid + repaired)
+        if unresolved:
+            skipped = ", ".join(f"{line['artikel_id'] or '?'} x{line['quantity']}" for line in unresolved)
+            explanation = f"{explanation} (Not ordered, no fitting catalog article: {skipped})".strip()
+    return "order", {"materials": valid, "explanation": explanation}
+
+
+def repair_order_lines(client, function: str, invalid: list, explanation: str, c_materials_data: list) -> tuple:
+    """
+    Ask the (small) model to correct only the invalid lines, given the closest catalog articles.
+
+    Lines that still have an unknown ID when the repair fails are passed on unchanged,
+    so `match_and_price` can fuzzy-match them or list them as unmatched.
+
+    Returns:
+        (lines, unresolved) - [artikel_id, quantity] lines to order, and the invalid
+        lines none of them stands for (to be reported to the user)
+    """
+    INVALID_LINES.inc(len(invalid), function=function)
+    structured_stats.add(function, invalid_lines=len(invalid))
+    passed_on = [line for line in invalid if line["artikel_id"] and line["problem"] == "unknown artikel_id"]
+    leftovers = [[line["artikel_id"], line["quantity"]] for line in passed_on]
+    dropped = [line for line in invalid if line not in passed_on]
+
+    matcher = get_matcher(c_materials_data)
+    candidates = repair_candidates(invalid, c_materials_data, matcher)
+    if not candidates:
+        REPAIRS.inc(function=function, outcome="no_candidates")
+        return leftovers, dropped
+
+    structured_stats.add(function, repair_calls=1)
+    try:
+        response = call_llm(
+            client, "repair_order",
+            max_tokens=500,
+            tools=[order_tool([str(row["artikel_id"]).upper() for row in candidates])],
+            tool_choice={"type": "tool", "name": ORDER_TOOL_NAME},
+            messages=[{"role": "user", "content": repair_prompt(invalid, candidates, explanation)}],
+        )
+        kind, payload = extract(response)
+    except Overloaded:
+        raise
+    except Exception as e:
+        REPAIRS.inc(function=function, outcome="error")
+        print(f"{function}: repair call failed ({e})")
+        return leftovers, dropped
+
+    repaired, _ = validate_order(payload, catalog_article_ids(c_materials_data)) if kind == "order" else ([], [])
+    structured_stats.add(function, repaired_lines=len(repaired))
+    if not repaired:
+        REPAIRS.inc(function=function, outcome="failed")
+        return leftovers, dropped
+
+    # a partial repair: the lines whose candidate articles got no corrected line stay unresolved
+    repaired_ids = {artikel_id for artikel_id, _ in repaired}
+    unresolved = [
+        line for line in invalid
+        if not repaired_ids & {str(row["artikel_id"]).upper()
+                               for row in repair_candidates([line], c_materials_data, matcher)}
+    ]
+    REPAIRS.inc(function=function, outcome="partial" if unresolved else "repaired")
+    return repaired, unresolved
+
+
+@timed("match_and_price", "total")
 def match_and_price(result_json: dict, csv_path: str = 'backend/data/sample.csv', approval_threshold: float = 500.0, catalog: list = None) -> dict:
     """
     Match product IDs from `result_json` to the CSV data, calculate per-item and total prices,
@@ -195,6 +516,7 @@ def match_and_price(result_json: dict, csv_path: str = 'backend/data/sample.csv'
             if close:
                 product = material_map.get(close[0])
                 matched = True
+            FUZZY_FALLBACKS.inc(result="matched" if close else "unmatched")
 
         if product:
             preis_stk = float(product.get('preis_eur') or 0.0)
@@ -246,11 +568,26 @@ def match_and_price(result_json: dict, csv_path: str = 'backend/data/sample.csv'
 
 def clean_voice_transcript(raw_text: str) -> str:
     """
-    Uses Claude to clean up raw voice-to-text input, removing filler words
-    and extracting the core intent.
+    Cleans up raw voice-to-text input, removing filler words and extracting the core intent.
+
+    The rule-based cleaner handles the common case locally; Claude is only asked
+    when it flags the transcript as ambiguous (vague quantities, corrections, sentences).
     """
-    api_key = secrets.get('API_KEY')
-    client = anthropic.Anthropic(api_key=api_key)
+    with clean_voice_stats.timer() as timer:
+        local = clean_transcript(raw_text)
+        if not local["ambiguous"]:
+            timer.outcome = "local"
+            return local["cleaned"]
+        timer.outcome = "llm"
+        for reason in local["reasons"]:
+            TRANSCRIPT_ESCALATIONS.inc(reason=reason)
+        return _clean_voice_transcript_llm(raw_text)
+
+
+@coalesced("clean_voice_transcript", lambda raw_text: _normalize(raw_text))
+def _clean_voice_transcript_llm(raw_text: str) -> str:
+    """Uses Claude to clean up a raw voice transcript."""
+    client = get_client()
 
     prompt = f"""You are a helpful assistant. Clean up this raw voice transcription for a construction procurement app. 
     Remove filler words (um, uh, like), greetings, and politeness markers. 
@@ -261,8 +598,9 @@ def clean_voice_transcript(raw_text: str) -> str:
     RETURN: ONLY the cleaned text string. Do not add quotes."""
 
     try:
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
+        message = call_llm(
+            client, "clean_voice_transcript",
+            route_text=raw_text,
             max_tokens=1000,
             messages=[{"role": "user", "content": prompt}]
         )
@@ -272,11 +610,16 @@ def clean_voice_transcript(raw_text: str) -> str:
         else:
             cleaned_text = str(message.content[0]).strip()
         return cleaned_text
+    except LLM_UNAVAILABLE as e:
+        record_degraded("clean_voice_transcript", e)
+        return clean_transcript(raw_text)["cleaned"]
     except Exception as e:
         print(f"Error cleaning text: {e}")
         return raw_text
 
 
+@coalesced("chat_procurement_request",
+           lambda messages, c_materials_data: (_messages_key(messages), catalog_version(c_materials_data)))
 def chat_procurement_request(messages: list, c_materials_data: list) -> dict:
     """
     Process a conversational procurement request. AI will either ask clarifying 
@@ -291,10 +634,10 @@ def chat_procurement_request(messages: list, c_materials_data: list) -> dict:
         - {"type": "question", "content": "clarifying question text"}
         - {"type": "recommendations", "content": {...materials data...}}
     """
-    api_key = secrets.get('API_KEY')
-    client = anthropic.Anthropic(api_key=api_key)
+    client = get_client()
     
-    materials_json = json.dumps(c_materials_data, ensure_ascii=False, indent=2)
+    build_start = time.perf_counter()
+    materials_json = catalog_prompt_json(c_materials_data)
     
     system_prompt = f"""You are a helpful construction procurement assistant. Your job is to help workers order the right materials.
 
@@ -313,17 +656,8 @@ RULES FOR CLARIFYING QUESTIONS:
 - After 2 clarifying exchanges, just make a reasonable choice
 
 RESPONSE FORMAT:
-If asking a question, respond with ONLY:
-QUESTION: <your brief question>
-
-If ready to recommend, respond with ONLY a JSON object:
-{{
-    "materials": [
-        ["artikel_id", quantity],
-        ...
-    ],
-    "explanation": "Brief explanation"
-}}
+If asking a question, call the ask_question tool with your brief question.
+If ready to recommend, call the submit_order tool with the materials and a brief explanation.
 
 Remember: Be conversational but efficient. Construction workers are busy!"""
 
@@ -335,60 +669,103 @@ Remember: Be conversational but efficient. Construction workers are busy!"""
             "content": msg["content"]
         })
     
+    STAGE_SECONDS.observe(time.perf_counter() - build_start, function="chat_procurement_request", stage="prompt_build")
+
     try:
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
+        response = call_llm(
+            client, "chat_procurement_request",
+            route_text=_user_text(messages),
             max_tokens=2000,
             system=system_prompt,
+            tools=[catalog_order_tool(c_materials_data), QUESTION_TOOL],
+            tool_choice={"type": "any"},
             messages=claude_messages
         )
         
-        response_text = response.content[0].text.strip()
-        print(f"Chat response: {response_text}")
+        try:
+            kind, result = structured_result(client, "chat_procurement_request", response, c_materials_data)
+        except StructuredOutputError:
+            # no tool call and no JSON: show whatever the model said
+            return {"type": "question", "content": response_text(response)}
+        if kind == "question":
+            return {"type": "question", "content": result}
         
-        # Check if it's a question
-        if response_text.upper().startswith("QUESTION:"):
-            question = response_text[9:].strip()
-            return {"type": "question", "content": question}
+        # Enrich with pricing
+        detailed = match_and_price(result, catalog=c_materials_data, approval_threshold=500.0)
+        detailed_output = {
+            'explanation': result.get('explanation', ''),
+            **detailed,
+        }
         
-        # Try to parse as JSON (final recommendations)
-        try:
-            # Extract JSON from response
-            json_text = response_text
-            if "```json" in json_text:
-                start = json_text.find("```json") + 7
-                end = json_text.find("```", start)
-                json_text = json_text[start:end].strip()
-            elif "```" in json_text:
-                start = json_text.find("```") + 3
-                end = json_text.find("```", start)
-                json_text = json_text[start:end].strip()
-            elif "{" in json_text:
-                first = json_text.find("{")
-                last = json_text.rfind("}")
-                if first != -1 and last != -1:
-                    json_text = json_text[first:last+1]
-            
-            result = json.loads(json_text)
-            
-            # Enrich with pricing
-            detailed = match_and_price(result, catalog=c_materials_data, approval_threshold=500.0)
-            detailed_output = {
-                'explanation': result.get('explanation', ''),
-                **detailed,
-            }
-            
-            return {"type": "recommendations", "content": detailed_output}
-            
-        except json.JSONDecodeError:
-            # If it's not valid JSON, treat it as a question/response
-            return {"type": "question", "content": response_text}
+        return {"type": "recommendations", "content": detailed_output}
             
+    except Overloaded:
+        raise  # becomes 429 + Retry-After
+    except LLM_UNAVAILABLE as e:
+        record_degraded("chat_procurement_request", e)
+        return _degraded_reply(_user_text(messages), c_materials_data)
     except Exception as e:
         print(f"Error in chat: {e}")
         return {"type": "error", "content": str(e)}
 
 
+def _degraded_reply(text: str, c_materials_data: list) -> dict:
+    """Chat/image answer while the LLM is unavailable: catalog matches, or ask for an explicit list."""
+    degraded = degraded_request(text, c_materials_data)
+    if degraded is None:
+        return {"type": "question", "content": DEGRADED_NOTICE, "source": "degraded"}
+    source = degraded.pop("source")
+    return {"type": "recommendations", "content": degraded, "source": source}
+
+
+def local_ocr_request(image_base64: str, c_materials_data: list):
+    """
+    Try to answer an image request locally: OCR the list, parse "quantity item" lines
+    and resolve them against the catalog.
+
+    Returns:
+        {"type": "recommendations", ...} if every line was read and matched confidently,
+        otherwise None (caller falls back to the vision model)
+    """
+    if not ocr_available():
+        return None
+
+    with ocr_fast_path_stats.timer() as timer:
+        timer.outcome = "fallback"
+        try:
+            lines = ocr_lines(base64.b64decode(image_base64))
+        except Exception as e:
+            print(f"Local OCR failed: {e}")
+            return None
+
+        # drop specks and stray characters
+        lines = [line for line in lines if len(line["text"].strip(" -•*.,")) >= 2]
+        if not lines or min(line["confidence"] for line in lines) < OCR_MIN_CONFIDENCE:
+            return None
+
+        parsed = [entry for entry in (parse_order_line(line["text"]) for line in lines) if entry]
+        resolved = get_matcher(c_materials_data).resolve_lines(parsed)
+        if not resolved or any(r["artikel_id"] is None or r["confidence"] < OCR_MATCH_MIN_CONFIDENCE
+                               or not r["covered"] or r["anzahl"] < 1 for r in resolved):
+            return None
+
+        result = {
+            "materials": merge_lines([[r["artikel_id"], r["anzahl"]] for r in resolved]),
+            "explanation": "Read from the list: " + ", ".join(f"{r['anzahl']}x {r['text']}" for r in resolved),
+        }
+        detailed = match_and_price(result, catalog=c_materials_data, approval_threshold=500.0)
+        timer.outcome = "local"
+
+    return {
+        "type": "recommendations",
+        "content": {'explanation': result['explanation'], **detailed},
+        "source": "local_ocr",
+    }
+
+
+@coalesced("analyze_image_request",
+           lambda image_base64, media_type, messages, c_materials_data: (
+               hashlib.sha1(image_base64.encode("ascii")).hexdigest(), _messages_key(messages), catalog_version(c_materials_data)))
 def analyze_image_request(image_base64: str, media_type: str, messages: list, c_materials_data: list) -> dict:
     """
     Analyze an uploaded image (handwritten list or photo of parts) and have a conversation
@@ -405,10 +782,16 @@ def analyze_image_request(image_base64: str, media_type: str, messages: list, c_
         - {"type": "question", "content": "clarifying question"}
         - {"type": "recommendations", "content": {...}}
     """
-    api_key = secrets.get('API_KEY')
-    client = anthropic.Anthropic(api_key=api_key)
+    # First turn: a clearly written list can be read and matched without the vision model
+    if not any(msg["role"] == "assistant" for msg in messages):
+        local_result = local_ocr_request(image_base64, c_materials_data)
+        if local_result is not None:
+            return local_result
+
+    client = get_client()
     
-    materials_json = json.dumps(c_materials_data, ensure_ascii=False, indent=2)
+    build_start = time.perf_counter()
+    materials_json = catalog_prompt_json(c_materials_data)
     
     system_prompt = f"""You are a helpful construction procurement assistant with vision capabilities.
 
@@ -427,22 +810,13 @@ WORKFLOW:
 5. When ready, provide recommendations from the catalog
 
 RESPONSE FORMAT:
-If describing/asking questions, respond with ONLY:
-QUESTION: <your response using bullet points>
-
-Format your response with bullet points for clarity:
+If describing/asking questions, call the ask_question tool. Format the question with bullet points for clarity:
 • What I see: [brief description]
 • Identified: [item type]
 • Need to know: [your question]
 
-If ready to recommend, respond with ONLY a JSON object:
-{{
-    "materials": [
-        ["artikel_id", quantity],
-        ...
-    ],
-    "explanation": "Brief explanation of what was identified and ordered"
-}}
+If ready to recommend, call the submit_order tool with the materials and a brief explanation of what was
+identified and ordered.
 
 Keep responses SHORT and use bullet points. Construction workers are busy!"""
 
@@ -497,54 +871,47 @@ Keep responses SHORT and use bullet points. Construction workers are busy!"""
             ]
         })
     
+    STAGE_SECONDS.observe(time.perf_counter() - build_start, function="analyze_image_request", stage="prompt_build")
+
     try:
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
+        response = call_llm(
+            client, "analyze_image_request",
+            route_text=_user_text(messages),
             max_tokens=2000,
             system=system_prompt,
+            tools=[catalog_order_tool(c_materials_data), QUESTION_TOOL],
+            tool_choice={"type": "any"},
             messages=claude_messages
         )
         
-        response_text = response.content[0].text.strip()
-        print(f"Image analysis response: {response_text}")
+        try:
+            kind, result = structured_result(client, "analyze_image_request", response, c_materials_data)
+        except StructuredOutputError:
+            # no tool call and no JSON: show whatever the model said
+            return {"type": "question", "content": response_text(response)}
+        if kind == "question":
+            return {"type": "question", "content": result}
         
-        # Check if it's a question/description
-        if response_text.upper().startswith("QUESTION:"):
-            question = response_text[9:].strip()
-            return {"type": "question", "content": question}
+        # Enrich with pricing
+        detailed = match_and_price(result, catalog=c_materials_data, approval_threshold=500.0)
+        detailed_output = {
+            'explanation': result.get('explanation', ''),
+            **detailed,
+        }
         
-        # Try to parse as JSON (final recommendations)
-        try:
-            json_text = response_text
-            if "```json" in json_text:
-                start = json_text.find("```json") + 7
-                end = json_text.find("```", start)
-                json_text = json_text[start:end].strip()
-            elif "```" in json_text:
-                start = json_text.find("```") + 3
-                end = json_text.find("```", start)
-                json_text = json_text[start:end].strip()
-            elif "{" in json_text:
-                first = json_text.find("{")
-                last = json_text.rfind("}")
-                if first != -1 and last != -1:
-                    json_text = json_text[first:last+1]
-            
-            result = json.loads(json_text)
-            
-            # Enrich with pricing
-            detailed = match_and_price(result, catalog=c_materials_data, approval_threshold=500.0)
-            detailed_output = {
-                'explanation': result.get('explanation', ''),
-                **detailed,
-            }
-            
-            return {"type": "recommendations", "content": detailed_output}
-            
-        except json.JSONDecodeError:
-            # If not valid JSON, treat as question/description
-            return {"type": "question", "content": response_text}
+        return {"type": "recommendations", "content": detailed_output}
             
+    except Overloaded:
+        raise  # becomes 429 + Retry-After
+    except LLM_UNAVAILABLE as e:
+        record_degraded("analyze_image_request", e)
+        text = _user_text(messages)
+        if ocr_available():
+            try:
+                text = "\n".join([line["text"] for line in ocr_lines(base64.b64decode(image_base64))] + [text])
+            except Exception as ocr_error:
+                print(f"Local OCR failed: {ocr_error}")
+        return _degraded_reply(text, c_materials_data)
     except Exception as e:
         print(f"Error in image analysis: {e}")
         return {"type": "error", "content": str(e)}
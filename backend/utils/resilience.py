@@ -0,0 +1,304 @@
+import os
+import time
+import random
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import anthropic
+
+from backend.utils.admission import admission, llm_priority, Overloaded, LLM_MAX_CONCURRENCY
+from backend.utils.metrics import Counter, Gauge
+
+
+# Seconds a route may wait for the LLM in total, from the moment the call is made (admission
+# queue and all hedged attempts included; the SDK does not retry on its own)
+ROUTE_DEADLINES = {
+    "clean_voice_transcript": float(os.environ.get("HAMMERTIME_DEADLINE_CLEAN_VOICE", 8)),
+    "process_procurement_request": float(os.environ.get("HAMMERTIME_DEADLINE_PROCUREMENT", 45)),
+    "chat_procurement_request": float(os.environ.get("HAMMERTIME_DEADLINE_CHAT", 30)),
+    "analyze_image_request": float(os.environ.get("HAMMERTIME_DEADLINE_IMAGE", 45)),
+    "repair_order": float(os.environ.get("HAMMERTIME_DEADLINE_REPAIR", 15)),
+}
+DEFAULT_DEADLINE = float(os.environ.get("HAMMERTIME_DEADLINE_DEFAULT", 60))
+
+# A duplicate request goes out once a call runs longer than the route's p95 latency
+HEDGE_ENABLED = os.environ.get("HAMMERTIME_LLM_HEDGE", "1") != "0"
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20  # no hedging until the p95 is known
+HEDGE_MIN_DELAY = 1.0
+LATENCY_WINDOW = 200
+
+# Failed attempts (connection errors, 429, 5xx/529) are retried this often, after 0.5s, 1s, ...
+# with jitter, as long as the retry can still finish before the deadline
+LLM_MAX_RETRIES = int(os.environ.get("HAMMERTIME_LLM_RETRIES", 2))
+RETRY_BASE_SECONDS = 0.5
+RETRY_MIN_REMAINING = 1.0
+
+# Circuit breaker: open after this many consecutive provider failures, probe again after the cooldown
+BREAKER_FAILURES = int(os.environ.get("HAMMERTIME_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.environ.get("HAMMERTIME_BREAKER_COOLDOWN", 30))
+
+HEDGES = Counter("hammertime_llm_hedges_total", "Hedged LLM requests by winner", ("function", "winner"))
+HEDGES_STARTED = Counter("hammertime_llm_hedges_started_total", "Hedge attempts started", ("function",))
+RETRIES = Counter("hammertime_llm_retries_total", "LLM attempts retried after a provider error", ("function", "error"))
+DEADLINES_EXCEEDED = Counter(
+    "hammertime_llm_deadline_exceeded_total", "LLM calls abandoned at the route deadline", ("function",))
+BREAKER_STATE = Gauge("hammertime_llm_breaker_open", "1 while the LLM circuit breaker is open")
+DEGRADED = Counter("hammertime_degraded_responses_total", "Answers served by the local fallback", ("function", "reason"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """The route's deadline passed before any attempt answered."""
+
+
+class ProviderUnavailable(Exception):
+    """The circuit breaker is open; `retry_after` is the remaining cooldown in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM provider unavailable, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+# Provider errors worth another attempt: connection problems, 429 and 5xx (incl. 529 overloaded)
+_RETRYABLE_STATUS = (408, 409, 429)
+# 529/503 have their own classes in newer SDKs (older ones raise InternalServerError)
+_PROVIDER_STATUS_ERRORS = tuple(getattr(anthropic, name) for name in ("OverloadedError", "ServiceUnavailableError")
+                                if hasattr(anthropic, name))
+
+# Errors that mean the provider is unhealthy (not that our request was wrong); agents answer these in degraded mode
+LLM_UNAVAILABLE = (ProviderUnavailable, DeadlineExceeded, anthropic.APIConnectionError,
+                   anthropic.InternalServerError, anthropic.RateLimitError) + _PROVIDER_STATUS_ERRORS
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (anthropic.APIConnectionError, anthropic.RateLimitError, anthropic.InternalServerError)
+                  + _PROVIDER_STATUS_ERRORS):
+        return True
+    status = getattr(exc, "status_code", None)
+    return isinstance(exc, anthropic.APIStatusError) and (status in _RETRYABLE_STATUS or (status or 0) >= 500)
+
+
+def is_provider_failure(exc: Exception) -> bool:
+    return (isinstance(exc, LLM_UNAVAILABLE) and not isinstance(exc, ProviderUnavailable)) or is_retryable(exc)
+
+
+class CircuitBreaker:
+    """
+    Fails LLM calls fast while the provider is unhealthy.
+
+    closed -> open after `failures` consecutive provider failures; after `cooldown`
+    seconds one trial call is let through (half-open) and its outcome closes or
+    re-opens the breaker.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial_started = None
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def before_call(self):
+        """Raises ProviderUnavailable while open (except for the half-open trial call)."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(now)
+            if state == "closed":
+                return
+            # one trial at a time; a trial that never reported back is replaced after another cooldown
+            if state == "half_open" and (self._trial_started is None or now - self._trial_started > self.cooldown):
+                self._trial_started = now
+                return
+            retry_after = max(1, int(self._opened_at + self.cooldown - now + 0.999))
+        raise ProviderUnavailable(retry_after)
+
+    def success(self):
+        with self._lock:
+            self._consecutive = 0
+            if self._opened_at is not None:
+                print("LLM circuit breaker closed")
+            self._opened_at = None
+            self._trial_started = None
+        BREAKER_STATE.set(0)
+
+    def failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._trial_started is not None or (self._opened_at is None and self._consecutive >= self.failures):
+                self._opened_at = time.monotonic()
+                self._trial_started = None
+                self.trips += 1
+                print(f"LLM circuit breaker open for {self.cooldown:.0f}s after {self._consecutive} failures")
+                BREAKER_STATE.set(1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self._state(time.monotonic()), "consecutive_failures": self._consecutive,
+                    "trips": self.trips, "failures_to_open": self.failures, "cooldown_s": self.cooldown}
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "open" if now - self._opened_at < self.cooldown else "half_open"
+
+
+class LatencyWindow:
+    """Recent successful call latencies per route, for the hedging threshold."""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=size))
+
+    def add(self, function: str, seconds: float):
+        with self._lock:
+            self._samples[function].append(seconds)
+
+    def quantile(self, function: str, q: float):
+        with self._lock:
+            samples = sorted(self._samples.get(function, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+breaker = CircuitBreaker()
+latencies = LatencyWindow()
+# attempts run here so the caller can stop waiting; abandoned attempts end at their own timeout.
+# Every attempt holds an admission slot until it finishes, so this never needs more threads.
+_attempts = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm-attempt")
+
+
+def deadline_for(function: str) -> float:
+    return ROUTE_DEADLINES.get(function, DEFAULT_DEADLINE)
+
+
+def _submit(attempt, timeout: float):
+    """Start an attempt that already holds an admission slot; the slot is released when it ends."""
+    started = time.monotonic()
+    future = _attempts.submit(attempt, timeout)
+    # also runs for a cancelled attempt that never started
+    future.add_done_callback(lambda _: admission.release(time.monotonic() - started))
+    return future
+
+
+def _retry_delay(retry: int) -> float:
+    return RETRY_BASE_SECONDS * 2 ** (retry - 1) * random.uniform(0.8, 1.2)
+
+
+def hedged_call(function: str, attempt, started: float = None):
+    """
+    Run `attempt(timeout)` under the route's deadline, retrying failed attempts and hedging slow ones.
+
+    The caller holds one admission slot; it passes to the first attempt. The deadline
+    counts from `started` (time.monotonic() when the caller made the call, default
+    now), so time spent in the admission queue is part of it.
+    An attempt failing with a provider error (connection, 429, 5xx) is retried up to
+    LLM_MAX_RETRIES times with exponential backoff, while enough of the deadline is
+    left and the circuit breaker lets calls through; each retry takes a new admission slot.
+    When an attempt is still running after the route's p95 latency (and the
+    admission controller has a free slot right now), a second identical attempt is
+    started; the first response wins. The losing attempt is cancelled: if it has not
+    started it never runs, otherwise its result is discarded and its HTTP request is
+    closed by its own per-request timeout (the time left until the deadline). Each
+    attempt keeps its admission slot until it has really finished, also after the
+    caller gave up on it, so abandoned attempts never exceed the concurrency limit.
+
+    Args:
+        function: agent function name (route)
+        attempt: callable(timeout_seconds) -> response
+        started: time.monotonic() when the call was made
+
+    Returns:
+        the first successful response; raises DeadlineExceeded or the attempt's error
+    """
+    deadline = deadline_for(function)
+    end = (time.monotonic() if started is None else started) + deadline
+    start = time.monotonic()
+    if start >= end:
+        admission.release(0.0)
+        DEADLINES_EXCEEDED.inc(function=function)
+        raise DeadlineExceeded(f"{function}: admitted after the {deadline:g}s deadline")
+    priority = llm_priority.get()
+    p95 = latencies.quantile(function, HEDGE_QUANTILE) if HEDGE_ENABLED else None
+    hedge_at = start + max(HEDGE_MIN_DELAY, p95) if p95 is not None else None
+
+    pending = {_submit(attempt, end - start): "primary"}
+    hedged = False
+    retries = 0
+    retry_at = None
+    error = None
+    try:
+        while pending or retry_at is not None:
+            now = time.monotonic()
+            if now >= end:
+                DEADLINES_EXCEEDED.inc(function=function)
+                breaker.failure()
+                raise DeadlineExceeded(f"{function}: no LLM response within {deadline:g}s")
+            wake = min(t for t in (end, hedge_at, retry_at) if t is not None)
+            if pending:
+                done, _ = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+            else:  # backing off before a retry
+                time.sleep(max(0.0, wake - now))
+                done = ()
+            for future in done:
+                name = pending.pop(future)
+                if future.exception() is None:
+                    if hedged:
+                        HEDGES.inc(function=function, winner=name)
+                    latencies.add(function, time.monotonic() - start)
+                    breaker.success()
+                    return future.result()
+                error = future.exception()
+                if is_provider_failure(error):
+                    breaker.failure()
+                delay = _retry_delay(retries + 1)
+                if (not pending and retry_at is None and retries < LLM_MAX_RETRIES and is_retryable(error)
+                        and time.monotonic() + delay + RETRY_MIN_REMAINING < end):
+                    retry_at = time.monotonic() + delay
+            now = time.monotonic()
+            if retry_at is not None and now >= retry_at:
+                retry_at = None
+                try:
+                    breaker.before_call()  # stop retrying once the breaker opened
+                    admission.acquire(priority, max_wait=max(0.0, end - now - RETRY_MIN_REMAINING))
+                except (ProviderUnavailable, Overloaded):
+                    break
+                retries += 1
+                RETRIES.inc(function=function, error=type(error).__name__)
+                pending[_submit(attempt, max(0.1, end - time.monotonic()))] = f"retry{retries}"
+            if hedge_at is not None and time.monotonic() >= hedge_at and pending:
+                hedge_at = None
+                if admission.try_acquire(priority):
+                    hedged = True
+                    HEDGES_STARTED.inc(function=function)
+                    pending[_submit(attempt, max(0.1, end - time.monotonic()))] = "hedge"
+        raise error
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def record_degraded(function: str, exc: Exception):
+    if isinstance(exc, ProviderUnavailable):
+        reason = "breaker_open"
+    elif isinstance(exc, DeadlineExceeded):
+        reason = "deadline"
+    else:
+        reason = "provider_error"
+    DEGRADED.inc(function=function, reason=reason)
+
+
+def stats() -> dict:
+    return {
+        "breaker": breaker.stats(),
+        "deadlines_s": dict(ROUTE_DEADLINES),
+        "hedge_after_s": {f: round(latencies.quantile(f, HEDGE_QUANTILE) or 0, 2) or None for f in ROUTE_DEADLINES},
+    }
@@ -0,0 +1,174 @@
+import os
+import mmap
+import array
+import struct
+import hashlib
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+
+# Memory-mapped state shared by all workers on this machine (/dev/shm keeps it in RAM on Linux)
+STOCK_STATE_PATH = os.environ.get(
+    "HAMMERTIME_STATE_FILE",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "hammertime_stock.state"),
+)
+
+_MAGIC = b"HMRSTK02"
+# magic, catalog fingerprint (ids + seed source), version, epoch, article count (+ padding to 40 bytes);
+# followed by the stock (int32) and the version each article last changed at (uint64)
+_HEADER = struct.Struct("<8s8sQQI4x")
+_VERSION_OFFSET = 16
+# Largest stock an int32 slot holds
+MAX_STOCK = 2 ** 31 - 1
+
+
+def catalog_fingerprint(article_ids: list, source: bytes = b"") -> bytes:
+    """Identifies the catalog a state file was seeded from (article ids and the seed source)."""
+    digest = hashlib.sha1("\n".join(article_ids).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(source)
+    return digest.digest()[:8]
+
+
+class SharedStock:
+    """
+    Stock levels and a catalog version shared by every worker process.
+
+    The numbers live in a small memory-mapped file: the first worker to start
+    initializes it (under an exclusive file lock), later workers attach to the same
+    pages. Every change bumps the version, so workers can cheaply check whether
+    their local view of the catalog is still current. Each article also records the
+    version it last changed at, which makes "what changed since version v" exact no
+    matter which worker made the change. The epoch is random per initialization, so
+    clients can tell a restarted (re-initialized) state from an older version.
+
+    The file outlives restarts; it is re-seeded when the catalog it was seeded from
+    (the article ids and `source`) is not the current one.
+    """
+
+    def __init__(self, article_ids: list, initial_stock, path: str = STOCK_STATE_PATH, source: bytes = b""):
+        """
+        Args:
+            article_ids: catalog article ids, in catalog order
+            initial_stock: callable(article_ids) -> list of ints, used when the state is (re-)seeded
+            path: state file shared by the workers
+            source: what the initial stock derives from (e.g. the catalog file's bytes)
+        """
+        self.path = path
+        self.article_ids = list(article_ids)
+        self._index = {artikel_id: i for i, artikel_id in enumerate(self.article_ids)}
+        self._thread_lock = threading.Lock()
+        count = len(self.article_ids)
+        changed_offset = _HEADER.size + 8 * ((4 * count + 7) // 8)
+        size = changed_offset + 8 * count
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._pid = os.getpid()
+        with self._locked(exclusive=True):
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+            magic, fingerprint, _, _, stored_count = _HEADER.unpack_from(self._map, 0)
+            expected = catalog_fingerprint(self.article_ids, source)
+            if magic != _MAGIC or fingerprint != expected or stored_count != count:
+                # first worker since boot, or the state was seeded from another catalog: (re-)seed
+                stock = array.array("i", [int(q) for q in initial_stock(self.article_ids)])
+                self._map[_HEADER.size:_HEADER.size + 4 * count] = stock.tobytes()
+                self._map[changed_offset:size] = bytes(8 * count)
+                epoch = int.from_bytes(os.urandom(8), "little")
+                _HEADER.pack_into(self._map, 0, _MAGIC, expected, 1, epoch, count)
+                print(f"Initialized shared stock for {count} articles at {path}")
+        self._stock = memoryview(self._map)[_HEADER.size:_HEADER.size + 4 * count].cast("i")
+        self._changed = memoryview(self._map)[changed_offset:size].cast("Q")
+
+    def __contains__(self, artikel_id: str) -> bool:
+        return artikel_id in self._index
+
+    def version(self) -> int:
+        """Catalog version; changes whenever any worker updates stock."""
+        return struct.unpack_from("<Q", self._map, _VERSION_OFFSET)[0]
+
+    def epoch(self) -> int:
+        """Random id of this initialization of the shared state (changes when it is re-created)."""
+        return struct.unpack_from("<Q", self._map, _VERSION_OFFSET + 8)[0]
+
+    def changes_since(self, version: int) -> tuple:
+        """
+        Articles whose stock changed after `version`.
+
+        Returns:
+            (current version, [(catalog index, stock), ...])
+        """
+        with self._locked(exclusive=False):
+            changed = [(i, self._stock[i]) for i, at in enumerate(self._changed) if at > version]
+            return self.version(), changed
+
+    def snapshot(self) -> tuple:
+        """Consistent (version, [stock per article]) read."""
+        with self._locked(exclusive=False):
+            return self.version(), self._stock.tolist()
+
+    def get(self, artikel_id: str) -> int:
+        return self._stock[self._index[artikel_id]]
+
+    def set(self, artikel_id: str, quantity: int) -> int:
+        """
+        Set the stock of one article; returns the new catalog version.
+
+        Raises:
+            ValueError: if the quantity is outside 0..MAX_STOCK
+        """
+        return self._update(artikel_id, lambda _: quantity)
+
+    def adjust(self, artikel_id: str, delta: int) -> int:
+        """
+        Add `delta` (negative to take out, floored at 0); returns the new catalog version.
+
+        Raises:
+            ValueError: if the new stock would exceed MAX_STOCK (the stock is left unchanged)
+        """
+        return self._update(artikel_id, lambda current: max(0, current + delta))
+
+    def _update(self, artikel_id: str, change) -> int:
+        i = self._index[artikel_id]
+        with self._locked(exclusive=True):
+            quantity = int(change(self._stock[i]))
+            if not 0 <= quantity <= MAX_STOCK:
+                raise ValueError(f"Stock of {artikel_id} must be between 0 and {MAX_STOCK}, got {quantity}")
+            self._stock[i] = quantity
+            version = self.version() + 1
+            self._changed[i] = version
+            struct.pack_into("<Q", self._map, _VERSION_OFFSET, version)
+        return version
+
+    def _locked(self, exclusive: bool):
+        if self._pid != os.getpid():
+            # forked worker (gunicorn --preload): flock is per open file, so each process needs its own fd.
+            # The MAP_SHARED mapping itself is inherited and stays shared.
+            self._fd = os.open(self.path, os.O_RDWR)
+            self._pid = os.getpid()
+        return _FileLock(self._fd, self._thread_lock, exclusive)
+
+
+class _FileLock:
+    def __init__(self, fd: int, thread_lock: threading.Lock, exclusive: bool):
+        self.fd = fd
+        self.thread_lock = thread_lock
+        self.exclusive = exclusive
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.thread_lock.release()
+        return False
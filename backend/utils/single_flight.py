@@ -0,0 +1,61 @@
+import copy
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into one.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running wait for that result instead of starting their own. Every
+    caller gets its own deep copy, so nobody can mutate another caller's result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counts = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        kind = key[0] if isinstance(key, tuple) else "default"
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            counts = self._counts.setdefault(kind, {"calls": 0, "coalesced": 0})
+            counts["calls" if leader else "coalesced"] += 1
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return copy.deepcopy(call.result)
+
+    def stats(self) -> dict:
+        """Per kind: calls actually executed and calls that joined an in-flight one."""
+        with self._lock:
+            stats = {kind: dict(counts) for kind, counts in self._counts.items()}
+            for key in self._calls:
+                kind = key[0] if isinstance(key, tuple) else "default"
+                stats.setdefault(kind, {"calls": 0, "coalesced": 0})
+                stats[kind]["in_flight"] = stats[kind].get("in_flight", 0) + 1
+        return stats
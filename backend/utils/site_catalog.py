@@ -0,0 +1,161 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+from backend.utils.catalog_matcher import CATALOG_VIEW_CACHE_SIZE
+
+
+# Per-site assortments, prices and suppliers (see backend/data/sites.json)
+SITES_PATH = os.environ.get("HAMMERTIME_SITES_FILE", "backend/data/sites.json")
+
+# Catalog rows with this typische_baustelle belong to every site's assortment
+ALL_SITES = "Alle"
+
+
+class SiteOverlay:
+    """
+    What one construction site changes about the base catalog; only the differences are stored.
+
+    A site may restrict the assortment to some `typische_baustelle` values (rows marked
+    "Alle" always stay), override prices per article, replace the preferred suppliers
+    and override lead times per supplier. Anything not mentioned comes from the base catalog.
+    """
+
+    __slots__ = ("site_id", "name", "baustellen", "prices", "preferred_suppliers", "lead_times")
+
+    def __init__(self, site_id: str, name: str = None, baustellen=None, prices: dict = None,
+                 preferred_suppliers=None, lead_times: dict = None):
+        self.site_id = site_id
+        self.name = name or site_id
+        self.baustellen = frozenset(baustellen) if baustellen else None
+        self.prices = {artikel_id: float(price) for artikel_id, price in (prices or {}).items()}
+        self.preferred_suppliers = frozenset(preferred_suppliers) if preferred_suppliers is not None else None
+        self.lead_times = {supplier: int(days) for supplier, days in (lead_times or {}).items()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SiteOverlay":
+        return cls(
+            data["site_id"],
+            name=data.get("name"),
+            baustellen=data.get("baustellen"),
+            prices=data.get("prices"),
+            preferred_suppliers=data.get("preferred_suppliers"),
+            lead_times=data.get("lead_times"),
+        )
+
+    def changes(self, row: dict) -> dict:
+        """Fields of `row` this site overrides (empty when the base row applies as is)."""
+        changes = {}
+        price = self.prices.get(row.get("artikel_id"))
+        if price is not None and price != row.get("preis_eur"):
+            changes["preis_eur"] = price
+        supplier = row.get("lieferant", "")
+        if self.preferred_suppliers is not None and (supplier in self.preferred_suppliers) != row.get("is_preferred"):
+            changes["is_preferred"] = supplier in self.preferred_suppliers
+        lead_time = self.lead_times.get(supplier)
+        if lead_time is not None and lead_time != row.get("lead_time_days"):
+            changes["lead_time_days"] = lead_time
+        return changes
+
+    def apply(self, rows: list) -> list:
+        """
+        The site's view of `rows` (copy-on-write).
+
+        Rows the site does not change are the base row objects themselves; only
+        overridden rows are copied. Treat the result as read-only, like the base rows.
+        """
+        view = []
+        for row in rows:
+            if self.baustellen is not None and row.get("typische_baustelle") not in self.baustellen \
+                    and row.get("typische_baustelle") != ALL_SITES:
+                continue
+            changes = self.changes(row)
+            view.append({**row, **changes} if changes else row)
+        return view
+
+    def summary(self) -> dict:
+        return {
+            "site_id": self.site_id,
+            "name": self.name,
+            "baustellen": sorted(self.baustellen) if self.baustellen is not None else None,
+            "price_overrides": len(self.prices),
+            "preferred_suppliers": sorted(self.preferred_suppliers) if self.preferred_suppliers is not None else None,
+            "lead_time_overrides": len(self.lead_times),
+        }
+
+
+def load_site_overlays(path: str = SITES_PATH) -> dict:
+    """site_id -> SiteOverlay from a JSON file ({"sites": [...]}); no file means no sites."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    overlays = [SiteOverlay.from_dict(site) for site in data.get("sites", [])]
+    return {overlay.site_id: overlay for overlay in overlays}
+
+
+class SiteCatalogs:
+    """
+    Site views of the base catalog, built on first use and kept for the most recently used sites.
+
+    A view is rebuilt only when the base rows change (a new snapshot after a stock
+    change). Each view is a stable list object, so the per-catalog caches (matcher,
+    search index, prompt JSON) stay warm per site. Memory grows with the overlays'
+    differences and the `size` cached views, not with the number of sites.
+    """
+
+    def __init__(self, overlays: dict, size: int = CATALOG_VIEW_CACHE_SIZE):
+        self.overlays = overlays
+        self.size = size
+        self._views = OrderedDict()  # (site_id, id(base rows)) -> (base rows, view, copied rows)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def __contains__(self, site_id: str) -> bool:
+        return site_id in self.overlays
+
+    def view(self, site_id: str, rows: list) -> list:
+        """
+        The rows as seen by `site_id` (the base rows themselves for no site).
+
+        Raises:
+            KeyError: unknown site_id
+        """
+        if site_id is None:
+            return rows
+        overlay = self.overlays[site_id]
+        key = (site_id, id(rows))
+        with self._lock:
+            entry = self._views.get(key)
+            if entry is not None and entry[0] is rows:
+                self._views.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        view = overlay.apply(rows)
+        base_ids = {id(row) for row in rows}
+        copied = sum(1 for row in view if id(row) not in base_ids)
+        with self._lock:
+            self._views[key] = (rows, view, copied)
+            self._views.move_to_end(key)
+            while len(self._views) > self.size:
+                self._views.popitem(last=False)
+            self.builds += 1
+        return view
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.builds
+            return {
+                "sites": len(self.overlays),
+                "cached_views": len(self._views),
+                "max_cached_views": self.size,
+                "hits": self.hits,
+                "builds": self.builds,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                # rows copied because a site overrides them; all other view rows are shared with the base
+                "copied_rows": sum(entry[2] for entry in self._views.values()),
+            }
+
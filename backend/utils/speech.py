@@ -0,0 +1,185 @@
+import io
+import os
+import json
+import math
+import time
+import wave
+import array
+import shutil
+import threading
+import subprocess
+
+try:
+    from vosk import Model, KaldiRecognizer, SetLogLevel
+except ImportError:  # optional: pip install vosk + download a model
+    Model = KaldiRecognizer = SetLogLevel = None
+
+from backend.utils.stats import LatencyStats
+
+
+# Offline model directory, e.g. https://alphacephei.com/vosk/models -> vosk-model-small-de-0.15
+VOSK_MODEL_PATH = os.environ.get("HAMMERTIME_VOSK_MODEL", "models/vosk-model-small-de-0.15")
+
+# Voice activity detection (energy based)
+VAD_FRAME_MS = 30
+VAD_PADDING_MS = 300
+VAD_MIN_RMS = 300  # 16 bit samples; anything below is treated as silence
+VAD_NOISE_FACTOR = 3.0
+
+# Audio fed to the recognizer per step; one partial transcript per chunk
+STREAM_CHUNK_MS = 250
+
+stt_stats = LatencyStats("stt")
+_rtf_lock = threading.Lock()
+_rtf_totals = {"audio_seconds": 0.0, "processing_seconds": 0.0, "trimmed_seconds": 0.0}
+
+_model = None
+_model_lock = threading.Lock()
+
+
+class SpeechUnavailableError(RuntimeError):
+    pass
+
+
+def get_model():
+    """Load the Vosk model once per process."""
+    global _model
+    if Model is None:
+        raise SpeechUnavailableError("vosk is not installed")
+    with _model_lock:
+        if _model is None:
+            if not os.path.isdir(VOSK_MODEL_PATH):
+                raise SpeechUnavailableError(f"Vosk model not found at {VOSK_MODEL_PATH}")
+            SetLogLevel(-1)
+            _model = Model(VOSK_MODEL_PATH)
+    return _model
+
+
+def decode_audio(data: bytes, content_type: str = "audio/wav"):
+    """
+    Decode uploaded audio to mono 16 bit PCM.
+
+    WAV is read directly; other formats (webm/ogg from browsers) go through ffmpeg if installed.
+
+    Returns:
+        (pcm bytes, sample rate)
+    """
+    if "wav" not in (content_type or "") and data[:4] != b"RIFF":
+        if not shutil.which("ffmpeg"):
+            raise ValueError(f"Unsupported audio format {content_type} (install ffmpeg or send WAV)")
+        proc = subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-i", "pipe:0", "-ac", "1", "-ar", "16000", "-f", "wav", "pipe:1"],
+            input=data, capture_output=True, check=True,
+        )
+        data = proc.stdout
+
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width != 2:
+        raise ValueError("Only 16 bit PCM audio is supported")
+
+    if channels > 1:
+        samples = array.array("h", frames)
+        mono = array.array("h", (
+            int(sum(samples[i:i + channels]) / channels) for i in range(0, len(samples), channels)
+        ))
+        frames = mono.tobytes()
+    return frames, rate
+
+
+def _frame_rms(frame: bytes) -> float:
+    # every 4th sample is plenty for a speech/silence decision
+    samples = array.array("h", frame)[::4]
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+def trim_silence(pcm: bytes, rate: int, frame_ms: int = VAD_FRAME_MS, padding_ms: int = VAD_PADDING_MS) -> bytes:
+    """
+    Cut leading and trailing silence with a simple energy VAD.
+
+    A frame counts as speech when its RMS is above VAD_NOISE_FACTOR times the noise
+    floor (10th percentile of all frames) and above VAD_MIN_RMS.
+    """
+    frame_bytes = int(rate * frame_ms / 1000) * 2
+    if frame_bytes == 0 or len(pcm) < frame_bytes:
+        return pcm
+
+    rms = [_frame_rms(pcm[i:i + frame_bytes]) for i in range(0, len(pcm), frame_bytes)]
+    noise_floor = sorted(rms)[len(rms) // 10]
+    threshold = max(VAD_MIN_RMS, noise_floor * VAD_NOISE_FACTOR)
+
+    voiced = [i for i, value in enumerate(rms) if value >= threshold]
+    if not voiced:
+        return b""
+
+    pad = padding_ms // frame_ms
+    start = max(0, voiced[0] - pad) * frame_bytes
+    end = min(len(rms), voiced[-1] + 1 + pad) * frame_bytes
+    return pcm[start:end]
+
+
+def transcribe_stream(pcm: bytes, rate: int):
+    """
+    Transcribe PCM audio with Vosk, yielding events as recognition proceeds.
+
+    Yields:
+        {"partial": "..."} while decoding and a final
+        {"text": "...", "latency_ms": ..., "audio_seconds": ..., "rtf": ...}
+    """
+    model = get_model()
+    start = time.perf_counter()
+    audio_seconds = len(pcm) / 2 / rate
+
+    trimmed = trim_silence(pcm, rate)
+    trimmed_seconds = len(trimmed) / 2 / rate
+
+    with stt_stats.timer() as timer:
+        recognizer = KaldiRecognizer(model, rate)
+        segments = []
+        chunk_bytes = int(rate * STREAM_CHUNK_MS / 1000) * 2
+        for i in range(0, len(trimmed), chunk_bytes):
+            if recognizer.AcceptWaveform(trimmed[i:i + chunk_bytes]):
+                text = json.loads(recognizer.Result()).get("text", "")
+                if text:
+                    segments.append(text)
+                yield {"partial": " ".join(segments)}
+            else:
+                partial = json.loads(recognizer.PartialResult()).get("partial", "")
+                yield {"partial": " ".join(segments + ([partial] if partial else []))}
+
+        final = json.loads(recognizer.FinalResult()).get("text", "")
+        if final:
+            segments.append(final)
+        timer.outcome = "ok" if segments else "empty"
+
+    elapsed = time.perf_counter() - start
+    with _rtf_lock:
+        _rtf_totals["audio_seconds"] += audio_seconds
+        _rtf_totals["processing_seconds"] += elapsed
+        _rtf_totals["trimmed_seconds"] += audio_seconds - trimmed_seconds
+
+    yield {
+        "text": " ".join(segments),
+        "latency_ms": round(elapsed * 1000, 1),
+        "audio_seconds": round(audio_seconds, 2),
+        "speech_seconds": round(trimmed_seconds, 2),
+        "rtf": round(elapsed / audio_seconds, 3) if audio_seconds else 0.0,
+    }
+
+
+def stt_summary() -> dict:
+    """Latency percentiles plus the overall real-time factor (processing time / audio time)."""
+    with _rtf_lock:
+        totals = dict(_rtf_totals)
+    return {
+        **stt_stats.summary(),
+        "audio_seconds_total": round(totals["audio_seconds"], 2),
+        "silence_trimmed_seconds_total": round(totals["trimmed_seconds"], 2),
+        "rtf": round(totals["processing_seconds"] / totals["audio_seconds"], 3) if totals["audio_seconds"] else 0.0,
+    }
@@ -0,0 +1,79 @@
+import time
+import threading
+from collections import deque
+
+
+class LatencyStats:
+    """
+    Thread-safe latency and outcome counters for a single code path.
+
+    Keeps a count per outcome (e.g. "local" / "fallback") and a bounded window
+    of recent latencies for percentiles.
+    """
+
+    def __init__(self, name: str, window: int = 2048):
+        self.name = name
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self._outcomes = {}
+        self._total_seconds = 0.0
+        self._count = 0
+
+    def record(self, seconds: float, outcome: str = "ok"):
+        with self._lock:
+            self._samples.append((seconds, outcome))
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+            self._total_seconds += seconds
+            self._count += 1
+
+    def timer(self):
+        """Context manager that records the elapsed time; set `.outcome` inside the block."""
+        return _Timer(self)
+
+    def summary(self) -> dict:
+        """Counts per outcome and latency percentiles, overall and per outcome."""
+        with self._lock:
+            samples = list(self._samples)
+            outcomes = dict(self._outcomes)
+            count = self._count
+            total = self._total_seconds
+
+        summary = {
+            "count": count,
+            "outcomes": outcomes,
+            "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+            **_percentiles([s for s, _ in samples]),
+        }
+        if len(outcomes) > 1:
+            summary["by_outcome"] = {
+                outcome: _percentiles([s for s, o in samples if o == outcome]) for outcome in outcomes
+            }
+        return summary
+
+
+def _percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+
+    def pct(p):
+        if not samples:
+            return 0.0
+        idx = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return round(samples[idx] * 1000, 3)
+
+    return {"p50_ms": pct(50), "p95_ms": pct(95), "p99_ms": pct(99)}
+
+
+class _Timer:
+    def __init__(self, stats: LatencyStats):
+        self.stats = stats
+        self.outcome = "ok"
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.outcome == "ok":
+            self.outcome = "error"
+        self.stats.record(time.perf_counter() - self._start, self.outcome)
+        return False
@@ -0,0 +1,209 @@
+import re
+import json
+import difflib
+import threading
+
+from backend.utils.metrics import Counter
+
+
+ORDER_TOOL_NAME = "submit_order"
+QUESTION_TOOL_NAME = "ask_question"
+
+QUESTION_TOOL = {
+    "name": QUESTION_TOOL_NAME,
+    "description": "Ask the worker ONE short clarifying question before ordering.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "question": {"type": "string", "description": "The question, as shown to the worker"},
+        },
+        "required": ["question"],
+    },
+}
+
+# Repair calls only see the candidates closest to each broken line
+REPAIR_CANDIDATES = 5
+
+REPAIRS = Counter("hammertime_llm_repairs_total", "Follow-up calls fixing invalid order lines", ("function", "outcome"))
+INVALID_LINES = Counter("hammertime_llm_invalid_lines_total", "Order lines with unknown IDs or bad quantities",
+                        ("function",))
+
+_ARTICLE_ID_RE = re.compile(r"^C\d{3,}$")
+
+
+class StructuredOutputError(ValueError):
+    """The model answered without a usable tool call (and no parseable text either)."""
+
+
+def order_tool(article_ids: list) -> dict:
+    """`submit_order` tool whose schema only admits the given catalog article IDs."""
+    return {
+        "name": ORDER_TOOL_NAME,
+        "description": "Submit the final order: catalog articles and quantities.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "materials": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "artikel_id": {"type": "string", "enum": list(article_ids)},
+                            "quantity": {"type": "integer", "minimum": 1},
+                        },
+                        "required": ["artikel_id", "quantity"],
+                    },
+                },
+                "explanation": {"type": "string", "description": "Brief explanation of what was ordered and why"},
+            },
+            "required": ["materials", "explanation"],
+        },
+    }
+
+
+def response_text(response) -> str:
+    """All text blocks of a response."""
+    return "\n".join(block.text for block in response.content if getattr(block, "type", None) == "text").strip()
+
+
+def extract(response) -> tuple:
+    """
+    The tool call in a model response.
+
+    Responses without a tool call (older cassettes, models ignoring tool_choice) are
+    read the old way: "QUESTION: ..." text or a JSON object in the text.
+
+    Returns:
+        ("order", {"materials": [...], "explanation": ...}) or ("question", "text")
+    """
+    for block in response.content:
+        if getattr(block, "type", None) == "tool_use":
+            if block.name == QUESTION_TOOL_NAME:
+                return "question", str(block.input.get("question", "")).strip()
+            if block.name == ORDER_TOOL_NAME:
+                return "order", dict(block.input)
+
+    text = response_text(response)
+    if text.upper().startswith("QUESTION:"):
+        return "question", text[9:].strip()
+    try:
+        return "order", _json_object(text)
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"no tool call and no JSON in response: {text[:200]!r}") from e
+
+
+def _json_object(text: str) -> dict:
+    # JSON inside a ``` fence or between the outermost braces
+    fence = re.search(r"```(?:json)?\s*(.*?)(?:```|$)", text, re.S)
+    if fence:
+        text = fence.group(1)
+    first, last = text.find("{"), text.rfind("}")
+    if first != -1 and last > first:
+        text = text[first:last + 1]
+    return json.loads(text)
+
+
+def validate_order(order: dict, article_ids) -> tuple:
+    """
+    Split order lines into valid [artikel_id, quantity] pairs and invalid lines.
+
+    Accepts lines as {"artikel_id", "quantity"} objects or legacy [artikel_id, quantity] pairs.
+
+    Returns:
+        (valid, invalid) - invalid entries are {"artikel_id", "quantity", "problem"}
+    """
+    valid, invalid = [], []
+    for line in order.get("materials") or []:
+        if isinstance(line, dict):
+            artikel_id, quantity = line.get("artikel_id"), line.get("quantity")
+        elif isinstance(line, (list, tuple)) and len(line) == 2:
+            artikel_id, quantity = line
+        else:
+            invalid.append({"artikel_id": None, "quantity": None, "problem": f"unreadable line {line!r}"})
+            continue
+        artikel_id = str(artikel_id or "").strip().upper()
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            quantity = None
+
+        if artikel_id not in article_ids:
+            invalid.append({"artikel_id": artikel_id, "quantity": quantity, "problem": "unknown artikel_id"})
+        elif quantity is None or quantity < 1:
+            invalid.append({"artikel_id": artikel_id, "quantity": quantity, "problem": "quantity must be a positive integer"})
+        else:
+            valid.append([artikel_id, quantity])
+    return valid, invalid
+
+
+def merge_lines(lines: list) -> list:
+    """Sum the quantities of [artikel_id, quantity] lines naming the same article (first position kept)."""
+    merged = {}
+    for artikel_id, quantity in lines:
+        # unknown IDs passed on to fuzzy matching may come without a usable quantity
+        merged[artikel_id] = (merged[artikel_id] or 0) + (quantity or 0) if artikel_id in merged else quantity
+    return [[artikel_id, quantity] for artikel_id, quantity in merged.items()]
+
+
+def repair_prompt(invalid: list, candidates: list, explanation: str) -> str:
+    """Prompt for the follow-up call fixing only the invalid lines."""
+    lines = "\n".join(f"- artikel_id={line['artikel_id']!r}, quantity={line['quantity']!r}: {line['problem']}"
+                      for line in invalid)
+    catalog = "\n".join(f"- {row['artikel_id']}: {row.get('artikelname', '')}" for row in candidates)
+    return f"""These lines of an order could not be accepted:
+{lines}
+
+The order was explained as: "{explanation}"
+
+Closest catalog articles:
+{catalog}
+
+Submit corrected lines for ONLY these entries with the submit_order tool (leave out lines that have no fitting article)."""
+
+
+def repair_candidates(invalid: list, catalog: list, matcher) -> list:
+    """Catalog rows likely meant by the invalid lines (by ID similarity and name match)."""
+    by_id = {str(row.get("artikel_id", "")).upper(): row for row in catalog}
+    ids = sorted(by_id)
+    chosen = {}
+    for line in invalid:
+        artikel_id = line["artikel_id"] or ""
+        if artikel_id in by_id:
+            chosen[artikel_id] = by_id[artikel_id]
+            continue
+        if not _ARTICLE_ID_RE.match(artikel_id):
+            # the model wrote a product name instead of an ID
+            row, _ = matcher.resolve(artikel_id, allow_ambiguous=True)
+            if row is not None:
+                chosen[str(row["artikel_id"]).upper()] = row
+        for close in difflib.get_close_matches(artikel_id, ids, n=REPAIR_CANDIDATES, cutoff=0.5):
+            chosen[close] = by_id[close]
+    return list(chosen.values())[:REPAIR_CANDIDATES * max(1, len(invalid))]
+
+
+class StructuredOutputStats:
+    """Per-function counts of structured responses, parse failures, invalid lines and repair calls."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def add(self, function: str, **counts):
+        with self._lock:
+            entry = self._counts.setdefault(function, {
+                "responses": 0, "parse_failures": 0, "invalid_lines": 0, "repair_calls": 0, "repaired_lines": 0})
+            for name, amount in counts.items():
+                entry[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = {}
+            for function, c in self._counts.items():
+                responses = c["responses"] or 1
+                out[function] = {**c,
+                                 "parse_failure_rate": round(c["parse_failures"] / responses, 4),
+                                 "repair_rate": round(c["repair_calls"] / responses, 4)}
+            return out
+
+
+structured_stats = StructuredOutputStats()
@@ -0,0 +1,211 @@
+import re
+
+
+# Filler words dropped from voice transcripts (German + English)
+FILLERS = [
+    "äh", "ähm", "öh", "öhm", "hm", "hmm", "mhm", "also", "halt", "quasi", "sozusagen", "irgendwie",
+    "naja", "na ja", "genau", "eigentlich", "mal", "ja",
+    "um", "uh", "uhm", "erm", "er", "like", "you know", "i guess", "basically", "well", "so", "okay", "ok",
+]
+
+# Greetings, politeness and request phrasing that carry no order information
+POLITENESS = [
+    "guten morgen", "guten tag", "hallo", "servus", "moin", "grüß gott", "grüß dich", "hi", "hey",
+    "vielen dank", "danke schön", "dankeschön", "danke", "bitte schön", "bitte",
+    "ich bräuchte", "ich brauche", "wir bräuchten", "wir brauchen", "ich hätte gerne", "ich hätte gern",
+    "ich möchte", "wir möchten", "könnten sie mir", "könnten sie", "kannst du mir", "kannst du",
+    "können sie mir", "können sie", "bestellen sie", "bestell mal", "bestellen", "bestell",
+    "good morning", "hello", "thank you very much", "thank you", "thanks", "please",
+    "i would like", "i'd like", "we would like", "we'd like", "i need", "we need",
+    "could you please", "could you", "can you please", "can you", "order me", "get me", "order",
+]
+
+# Vague quantities and self-corrections need real language understanding
+AMBIGUOUS_PHRASES = [
+    "ein paar", "einige", "mehrere", "ein bisschen", "etwas", "genug",
+    "a few", "a couple", "some", "several", "a bit", "enough",
+    "nein", "doch nicht", "ich meine", "ich mein", "sorry", "oder", "statt", "lieber",
+    "no wait", "i mean", "actually", "or", "instead", "rather",
+]
+
+# Left-over sentence structure means the transcript describes a task, not a list
+SENTENCE_WORDS = {
+    "ich", "wir", "du", "er", "sie", "es", "man", "muss", "müssen", "soll", "sollen", "will", "wollen",
+    "haben", "habe", "hat", "machen", "mache", "wird", "werden", "ist", "sind", "weil", "damit", "wenn",
+    "i", "we", "you", "he", "she", "it", "they", "must", "should", "want", "have", "has", "is", "are",
+    "because", "when", "if", "going", "gonna", "do", "does",
+}
+
+MAX_LOCAL_WORDS = 40
+
+GERMAN_UNITS = {
+    "null": 0, "eins": 1, "ein": 1, "eine": 1, "einen": 1, "zwei": 2, "zwo": 2, "drei": 3, "vier": 4,
+    "fünf": 5, "sechs": 6, "sieben": 7, "acht": 8, "neun": 9, "zehn": 10, "elf": 11, "zwölf": 12,
+    "dreizehn": 13, "vierzehn": 14, "fünfzehn": 15, "sechzehn": 16, "siebzehn": 17, "achtzehn": 18,
+    "neunzehn": 19, "dutzend": 12,
+}
+GERMAN_TENS = {
+    "zwanzig": 20, "dreißig": 30, "dreissig": 30, "vierzig": 40, "fünfzig": 50, "sechzig": 60,
+    "siebzig": 70, "achtzig": 80, "neunzig": 90,
+}
+
+ENGLISH_UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19, "dozen": 12,
+}
+ENGLISH_TENS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+
+# Spoken unit -> catalog abbreviation
+UNITS = [
+    (r"millimeter|millimetern|millimeters|millimetre|millimetres|mm", "mm"),
+    (r"zentimeter|zentimetern|centimeters|centimetres|centimeter|cm", "cm"),
+    (r"meter|metern|meters|metres|m", "m"),
+    (r"liter|litern|liters|litres|l", "L"),
+    (r"stück|stueck|stk|pieces|piece|pcs", "Stk"),
+]
+
+
+def _phrase_re(phrases):
+    ordered = sorted(phrases, key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(re.escape(p) for p in ordered) + r")(?!\w)", re.IGNORECASE)
+
+
+_FILLER_RE = _phrase_re(FILLERS)
+_POLITENESS_RE = _phrase_re(POLITENESS)
+_AMBIGUOUS_RE = _phrase_re(AMBIGUOUS_PHRASES)
+
+
+def german_number(word: str):
+    """Parse a German number word ("fünfzig", "einundzwanzig", "zweihundertfünfzig") or return None."""
+    word = word.lower()
+    if not word:
+        return None
+    if word in GERMAN_UNITS:
+        return GERMAN_UNITS[word]
+    if word in GERMAN_TENS:
+        return GERMAN_TENS[word]
+    for sep, factor in (("tausend", 1000), ("hundert", 100)):
+        if sep in word:
+            head, tail = word.split(sep, 1)
+            head_value = german_number(head) if head else 1
+            tail_value = german_number(tail) if tail else 0
+            if head_value is None or tail_value is None:
+                return None
+            return head_value * factor + tail_value
+    if "und" in word:
+        units, tens = word.split("und", 1)
+        if units in GERMAN_UNITS and GERMAN_UNITS[units] < 10 and tens in GERMAN_TENS:
+            return GERMAN_UNITS[units] + GERMAN_TENS[tens]
+    return None
+
+
+def _english_number(words: list, i: int):
+    """Parse an English number starting at words[i]; returns (value, words consumed) or (None, 0)."""
+    value, current, consumed = 0, 0, 0
+    while i + consumed < len(words):
+        w = words[i + consumed].lower()
+        if w in ENGLISH_UNITS:
+            current += ENGLISH_UNITS[w]
+        elif w in ENGLISH_TENS:
+            current += ENGLISH_TENS[w]
+        elif w == "hundred" and consumed:
+            current = (current or 1) * 100
+        elif w == "thousand" and consumed:
+            value += (current or 1) * 1000
+            current = 0
+        elif w == "and" and consumed and i + consumed + 1 < len(words) and (
+                words[i + consumed + 1].lower() in ENGLISH_UNITS or words[i + consumed + 1].lower() in ENGLISH_TENS):
+            pass
+        else:
+            break
+        consumed += 1
+    if not consumed:
+        return None, 0
+    return value + current, consumed
+
+
+def normalize_numbers(text: str) -> str:
+    """Replace spoken numbers with digits ("fünfzig" -> 50, "twenty-five" -> 25, "eins komma fünf" -> 1.5)."""
+    words = []
+    for word in text.split():
+        parts = word.split("-")
+        # "twenty-five" -> "twenty five", but keep "gelb-grün" and "WD-40" intact
+        if len(parts) > 1 and all(p.lower().strip(",.;:!?") in ENGLISH_UNITS or p.lower().strip(",.;:!?") in ENGLISH_TENS
+                                  for p in parts):
+            words.extend(parts)
+        else:
+            words.append(word)
+    out = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        stripped = word.strip(",.;:!?")
+        value = german_number(stripped)
+        consumed = 1
+        if value is None:
+            value, consumed = _english_number([w.strip(",.;:!?") for w in words], i)
+        if value is None:
+            out.append(word)
+            i += 1
+            continue
+        trailing = words[i + consumed - 1][len(words[i + consumed - 1].rstrip(",.;:!?")):]
+        out.append(f"{value}{trailing}")
+        i += consumed
+
+    text = " ".join(out)
+    # decimals and size specs: "1 komma 5" -> "1.5", "4 mal 40" / "4 by 40" -> "4x40"
+    text = re.sub(r"(\d+)\s+(?:komma|point)\s+(\d+)", r"\1.\2", text, flags=re.IGNORECASE)
+    text = re.sub(r"(?<!\w)(\d+)\s*(?:mal|by|x|×)\s*(\d+)", r"\1x\2", text, flags=re.IGNORECASE)
+    return text
+
+
+def normalize_units(text: str) -> str:
+    """Attach spoken units to their number ("50 millimeter" -> "50mm", "10 liter" -> "10L", "50 stück" -> "50 Stk")."""
+    for pattern, unit in UNITS:
+        sep = " " if unit == "Stk" else ""
+        text = re.sub(rf"(\d+(?:\.\d+)?)\s*(?:{pattern})(?!\w)", rf"\1{sep}{unit}", text, flags=re.IGNORECASE)
+    return text
+
+
+def clean_transcript(raw_text: str) -> dict:
+    """
+    Clean a raw voice transcript without calling the LLM.
+
+    Removes fillers, greetings and politeness phrases, converts number words to digits
+    and normalizes units. Flags transcripts the rules cannot be trusted with (vague
+    quantities, self-corrections, full sentences describing a task).
+
+    Returns:
+        {"cleaned": str, "ambiguous": bool, "reasons": [str, ...]}
+    """
+    reasons = []
+    text = " ".join(raw_text.split())
+
+    if len(text.split()) > MAX_LOCAL_WORDS:
+        reasons.append("too_long")
+    if _AMBIGUOUS_RE.search(text):
+        reasons.append("vague_or_corrected")
+
+    text = _POLITENESS_RE.sub(" ", text)
+    # numbers first, so "vier mal vierzig" becomes 4x40 before "mal" is dropped as a filler
+    text = normalize_numbers(text)
+    text = _FILLER_RE.sub(" ", text)
+    text = normalize_units(text)
+
+    # "50 Schrauben und 2 Silikon" -> one list entry per item
+    text = re.sub(r"\s+(?:und|and)\s+(?=\d)", ", ", text, flags=re.IGNORECASE)
+
+    # tidy punctuation left behind by removed words
+    text = re.sub(r"\s+([,.;:!?])", r"\1", text)
+    text = re.sub(r"([,.;:!?])(?:\s*[,.;:!?])+", r"\1", text)
+    text = " ".join(text.split()).strip(" ,.;:!?")
+
+    if not text:
+        reasons.append("empty")
+    elif any(w.lower().strip(",.;:!?") in SENTENCE_WORDS for w in text.split()):
+        reasons.append("sentence")
+
+    return {"cleaned": text, "ambiguous": bool(reasons), "reasons": reasons}
@@ -0,0 +1,33 @@
+import csv
+import os
+import tempfile
+
+import pytest
+
+# Keep the API's shared state (stock file, event queue, contracts) out of the real locations
+_STATE_DIR = tempfile.mkdtemp(prefix="hammertime_tests_")
+os.environ.setdefault("HAMMERTIME_STATE_FILE", os.path.join(_STATE_DIR, "stock.state"))
+os.environ.setdefault("HAMMERTIME_EVENT_DB", os.path.join(_STATE_DIR, "events.sqlite3"))
+os.environ.setdefault("HAMMERTIME_CONTRACTS_DIR", os.path.join(_STATE_DIR, "contracts"))
+
+CATALOG_CSV = os.path.join(os.path.dirname(__file__), "..", "backend", "data", "sample.csv")
+
+
+@pytest.fixture(scope="session")
+def catalog():
+    """The sample catalog rows, prices as floats."""
+    with open(CATALOG_CSV, "r", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        row["preis_eur"] = float(row["preis_eur"])
+    return rows
+
+
+@pytest.fixture(scope="session")
+def api():
+    """TestClient for the backend app (no LLM calls unless a test makes one)."""
+    from fastapi.testclient import TestClient
+    from backend.main import app
+
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+
+from backend.utils.admission import AdmissionController, Overloaded
+
+
+def _queued(controller, count):
+    deadline = time.monotonic() + 2
+    while len(controller._queue) < count:
+        assert time.monotonic() < deadline, "callers did not queue up"
+        time.sleep(0.005)
+
+
+def test_interactive_is_served_before_bulk():
+    controller = AdmissionController(max_concurrency=1, per_minute=1000)
+    controller.acquire("interactive")
+    served = []
+
+    def call(priority):
+        controller.acquire(priority)
+        served.append(priority)
+        controller.release(0.01)
+
+    bulk = threading.Thread(target=call, args=("bulk",))
+    bulk.start()
+    _queued(controller, 1)
+    interactive = threading.Thread(target=call, args=("interactive",))
+    interactive.start()
+    _queued(controller, 2)
+
+    controller.release(0.01)
+    bulk.join(2)
+    interactive.join(2)
+    assert served == ["interactive", "bulk"]
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_full_queue_and_long_waits_are_shed():
+    controller = AdmissionController(max_concurrency=1, per_minute=1000, max_queue=1)
+    controller.acquire("interactive")
+    shed_waiters = []
+
+    def wait():
+        try:
+            controller.acquire("bulk", max_wait=0.3)
+        except Overloaded as e:
+            shed_waiters.append(e.reason)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    _queued(controller, 1)
+
+    with pytest.raises(Overloaded) as shed:
+        controller.acquire("interactive")
+    assert shed.value.reason == "queue_full"
+    assert shed.value.retry_after >= 1
+    waiter.join(2)
+    assert shed_waiters == ["timeout"]
+
+    with pytest.raises(Overloaded) as shed:
+        controller.acquire("interactive", max_wait=0.05)
+    assert shed.value.reason == "timeout"
+    assert controller.stats()["rejected"] == 3
+
+
+def test_try_acquire_never_queues():
+    controller = AdmissionController(max_concurrency=2, per_minute=1000)
+    assert controller.try_acquire("interactive")
+    assert controller.try_acquire("interactive")
+    assert not controller.try_acquire("interactive")
+    controller.release(0.01)
+    controller.release(0.01)
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_per_minute_budget():
+    controller = AdmissionController(max_concurrency=10, per_minute=2)
+    with controller.slot("bulk"), controller.slot("bulk"):
+        pass
+    assert not controller.try_acquire("bulk")
+    with pytest.raises(Overloaded):
+        controller.acquire("bulk", max_wait=0.05)
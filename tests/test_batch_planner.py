@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from backend.utils import batch_planner
+
+
+def _result(source):
+    item = {"artikel_id": "C-001", "anzahl": 2, "preis_stk": 1.5, "lagerbestand": 0, "lieferant": "Würth"}
+    return {"explanation": "", "items": [item], "source": source}
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    """Fake agent: prompts containing 'down' get the degraded keyword fallback."""
+    calls = []
+
+    def process(prompt, catalog):
+        calls.append(prompt)
+        return _result("degraded" if "down" in prompt else "llm")
+
+    monkeypatch.setattr(batch_planner, "process_procurement_request", process)
+    return calls
+
+
+def test_degraded_results_are_not_ordered_and_rerun_on_resume(agent, tmp_path):
+    checkpoint = str(tmp_path / "run.checkpoint.jsonl")
+    tasks = [{"id": "a", "prompt": "Schrauben"}, {"id": "b", "prompt": "Dübel while down"}]
+
+    plan = batch_planner.plan_tasks(tasks, [], checkpoint_path=checkpoint)
+    assert plan["stats"]["completed"] == 1
+    assert plan["stats"]["degraded"] == 1
+    assert plan["order"]["line_count"] == 1
+    assert plan["order"]["suppliers"][0]["items"][0]["tasks"] == ["a"]
+
+    agent.clear()
+    plan = batch_planner.plan_tasks(tasks, [], checkpoint_path=checkpoint)
+    assert agent == ["Dübel while down"]
+    assert plan["stats"]["resumed"] == 1
+
+
+def test_edited_prompt_is_not_resumed(agent, tmp_path):
+    checkpoint = tmp_path / "run.checkpoint.jsonl"
+    batch_planner.plan_tasks([{"id": "a", "prompt": "Schrauben"}], [], checkpoint_path=str(checkpoint))
+    agent.clear()
+    batch_planner.plan_tasks([{"id": "a", "prompt": "Schrauben und Dübel"}], [], checkpoint_path=str(checkpoint))
+    assert agent == ["Schrauben und Dübel"]
+    assert [json.loads(line)["status"] for line in checkpoint.read_text().splitlines()] == ["ok", "ok"]
+
+
+def test_duplicate_tasks(agent):
+    same = [{"id": "a", "prompt": "Schrauben"}, {"id": "a", "prompt": "Schrauben"}]
+    assert batch_planner.plan_tasks(same, [])["stats"]["tasks"] == 1
+    assert agent == ["Schrauben"]
+
+    with pytest.raises(ValueError, match="'a'"):
+        batch_planner.plan_tasks([{"id": "a", "prompt": "Schrauben"}, {"id": "a", "prompt": "Dübel"}], [])
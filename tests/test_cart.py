@@ -0,0 +1,47 @@
+import pytest
+
+from Frontend.cart import Cart
+
+SCREWS = {"id": "C001", "name": "Schraube TX20 4x40", "price": 0.08, "supplier": "Würth"}
+ANCHORS = {"id": "C004", "name": "Dübel 6mm", "price": 0.10, "supplier": "Fischer"}
+TAPE = {"id": "C027", "name": "Panzertape silber", "price": 6.50, "supplier": "Würth"}
+
+
+def _resummed(cart):
+    return round(sum(line["price"] * line["qty"] for line in cart), 2)
+
+
+def test_lines_are_keyed_by_product():
+    cart = Cart()
+    cart.add(SCREWS, 50)
+    cart.add(ANCHORS, 20)
+    cart.add(SCREWS, 25)
+    assert len(cart) == 2
+    assert cart.get("C001")["qty"] == 75
+    assert [line["id"] for line in cart] == ["C001", "C004"]
+    assert cart.pieces == 95
+    assert cart.total == pytest.approx(_resummed(cart))
+
+
+def test_totals_follow_every_change():
+    cart = Cart([{**SCREWS, "qty": 100}, {**TAPE, "qty": 2}, {**ANCHORS, "qty": 10}])
+    assert cart.supplier_totals == pytest.approx({"Würth": 21.0, "Fischer": 1.0})
+
+    cart.set(TAPE, 1)
+    cart.set(ANCHORS, 0)  # removes the line
+    assert "C004" not in cart
+    assert cart.supplier_totals == pytest.approx({"Würth": 14.5})
+    assert cart.total == pytest.approx(_resummed(cart))
+
+    cart.remove("C001")
+    cart.remove("C001")  # no-op
+    cart.remove("C027")
+    assert len(cart) == 0 and cart.total == 0.0 and cart.pieces == 0 and cart.supplier_totals == {}
+
+
+def test_lines_are_copies():
+    cart = Cart()
+    cart.add(SCREWS, 5)
+    cart.lines()[0]["qty"] = 500
+    assert cart.get("C001")["qty"] == 5
+    assert cart.total == pytest.approx(0.4)
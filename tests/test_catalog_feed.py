@@ -0,0 +1,38 @@
+def _stock(api, artikel_id, lagerbestand):
+    response = api.post("/stock", json={"artikel_id": artikel_id, "lagerbestand": lagerbestand})
+    assert response.status_code == 200
+
+
+def test_catalog_page_is_conditional_and_compressed(api):
+    first = api.get("/catalog", params={"page_size": 50}, headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200
+    assert first.headers["Content-Encoding"] == "gzip"
+    page = first.json()
+    assert len(page["items"]) == min(50, page["total"]) and page["pages"] == -(-page["total"] // 50)
+
+    etag = first.headers["ETag"]
+    again = api.get("/catalog", params={"page_size": 50}, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+
+    _stock(api, page["items"][0]["artikel_id"], 7)
+    changed = api.get("/catalog", params={"page_size": 50}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["items"][0]["lagerbestand"] == 7
+
+    assert api.get("/catalog", params={"page": 999}).status_code == 404
+
+
+def test_delta_feed(api):
+    page = api.get("/catalog", params={"page_size": 5}).json()
+    epoch, version = page["epoch"], page["version"]
+    assert api.get("/catalog/changes", params={"since": version, "epoch": epoch}).status_code == 304
+
+    _stock(api, "C004", 11)
+    _stock(api, "C004", 12)
+    delta = api.get("/catalog/changes", params={"since": version, "epoch": epoch}).json()
+    assert delta["reset"] is False and delta["version"] == version + 2
+    assert [(row["artikel_id"], row["lagerbestand"]) for row in delta["items"]] == [("C004", 12)]
+
+    assert api.get("/catalog/changes", params={"since": version, "epoch": "0"}).json()["reset"] is True
+    assert api.get("/catalog/changes", params={"since": version + 100, "epoch": epoch}).json()["reset"] is True
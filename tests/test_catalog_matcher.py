@@ -0,0 +1,68 @@
+import pytest
+
+from backend.utils.catalog_matcher import CatalogMatcher, parse_free_text_order, parse_order_line
+from backend.utils.request_agent import express_lane_request
+
+
+@pytest.fixture(scope="module")
+def matcher(catalog):
+    return CatalogMatcher(catalog)
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("50x Schraube TX20 4x40", (50, "Schraube TX20 4x40")),
+    ("2 Silikon transparent", (2, "Silikon transparent")),
+    ("Zollstock x2", (2, "Zollstock")),
+    ("Zollstock 2 Stk", (2, "Zollstock")),
+    ("Panzertape silber 2", (2, "Panzertape silber")),
+    ("Zollstock", (1, "Zollstock")),
+    # a trailing number that completes a size spec is not a quantity
+    ("Bit TX 20", (1, "Bit TX 20")),
+    ("Schraube 4 x 40", (1, "Schraube 4 x 40")),
+])
+def test_parse_order_line(line, expected):
+    assert parse_order_line(line) == expected
+
+
+def test_article_id_alone_resolves(matcher):
+    row, confidence = matcher.resolve("C001")
+    assert row["artikel_id"] == "C001"
+    assert confidence == 1.0
+
+
+@pytest.mark.parametrize("text", ["C001 ersetzen durch etwas besseres", "no C021 please"])
+def test_article_id_amid_other_words_does_not_resolve(matcher, text):
+    assert matcher.resolve(text) == (None, 0.0)
+
+
+def test_covers_rejects_words_the_name_does_not_explain(matcher, catalog):
+    row, _ = matcher.resolve("Kabelbinder für 200 Kabel")
+    assert not matcher.covers(row, "Kabelbinder für 200 Kabel")
+    assert matcher.covers(row, "Kabelbinder 200mm")
+
+
+@pytest.mark.parametrize("message", [
+    "C001 ersetzen durch etwas besseres",
+    "no C021 please",
+    "Kabelbinder für 200 Kabel",
+    "0x Zollstock",
+])
+def test_express_lane_falls_back_to_llm(catalog, message):
+    assert express_lane_request(message, catalog) is None
+
+
+@pytest.mark.parametrize("message, materials", [
+    ("Panzertape silber 2", [("C027", 2)]),
+    ("3 C001", [("C001", 3)]),
+    ("50x Schraube TX20 4x40, 2 Silikon transparent und Zollstock", [("C001", 50), ("C039", 2), ("C047", 1)]),
+    ("20x C001, 2 Zollstock, 30x Schraube TX20 4x40", [("C001", 50), ("C047", 2)]),
+])
+def test_express_lane_orders_explicit_lists(catalog, message, materials):
+    result = express_lane_request(message, catalog)
+    assert result["source"] == "express"
+    assert [(item["artikel_id"], item["anzahl"]) for item in result["items"]] == materials
+
+
+def test_free_text_split():
+    assert parse_free_text_order("zwei Silikon transparent und Zollstock") == [
+        (2, "Silikon transparent"), (1, "Zollstock")]
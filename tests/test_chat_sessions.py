@@ -0,0 +1,55 @@
+import time
+
+from backend.utils.chat_sessions import KEEP_RECENT_MESSAGES, ChatSessionStore, estimate_tokens
+
+
+def _chat(store, session_id, turns, words=20):
+    for turn in range(turns):
+        store.add_message(session_id, "assistant", f"Antwort {turn}: " + "Schrauben " * words)
+        store.add_message(session_id, "user", f"Frage {turn}: " + "Dübel " * words)
+
+
+def test_history_stays_within_the_token_budget():
+    store = ChatSessionStore(token_budget=400)
+    session_id = store.create([{"role": "user", "content": "Wir bauen eine Trockenbauwand"}])
+    _chat(store, session_id, 10)
+
+    history = store.history(session_id)
+    assert store.history_tokens(session_id) <= 400
+    assert 1 + KEEP_RECENT_MESSAGES <= len(history) < 1 + 2 * 10
+    # the original request is kept, with older turns summarized under it
+    assert history[0]["content"].startswith("Wir bauen eine Trockenbauwand")
+    assert "[Earlier in this conversation]" in history[0]["content"]
+    assert history[-1]["content"].startswith("Frage 9:")
+    assert [m["role"] for m in history] == ["user", "assistant"] * (len(history) // 2) + ["user"]
+    assert store.stats()["compactions"] > 0
+
+
+def test_summary_drops_its_oldest_lines():
+    store = ChatSessionStore(token_budget=400)
+    session_id = store.create([{"role": "user", "content": "Start"}])
+    _chat(store, session_id, 30)
+    first = store.history(session_id)[0]["content"]
+    summary = first.split("[Earlier in this conversation]\n", 1)[1]
+    assert estimate_tokens(summary) <= 400 // 4
+    assert "Antwort 0:" not in summary
+
+
+def test_unknown_and_expired_sessions():
+    store = ChatSessionStore(ttl_seconds=60)
+    assert store.history("nope") is None
+    assert not store.add_message("nope", "user", "hallo")
+
+    session_id = store.create([{"role": "user", "content": "hallo"}], image_id="img-1")
+    assert store.context(session_id) == {"image_id": "img-1"}
+    store._sessions[session_id]["last_used"] = time.time() - 61
+    assert not store.exists(session_id)
+
+
+def test_oldest_sessions_are_evicted():
+    store = ChatSessionStore(max_sessions=2)
+    first = store.create()
+    second = store.create()
+    store.history(first)  # recently used again
+    store.create()
+    assert store.exists(first) and not store.exists(second)
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from backend.utils import event_queue
+from backend.utils.event_queue import EventQueue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(event_queue, "RETRY_BASE_SECONDS", 0.0)
+    return EventQueue(str(tmp_path / "events.sqlite3"), lease_seconds=1, max_attempts=3)
+
+
+def test_claim_complete_with_follow_ups(queue):
+    queue.publish("order.placed", {"order_id": "ORD-00000001"})
+    event = queue.claim("w1")
+    assert event["topic"] == "order.placed"
+    assert event["payload"] == {"order_id": "ORD-00000001"}
+    assert queue.claim("w2") is None  # leased
+
+    assert queue.complete(event, "w1", [("aggregates.refresh", {}, "aggregates.refresh")])
+    follow_up = queue.claim("w2")
+    assert follow_up["topic"] == "aggregates.refresh"
+    assert queue.claim("w2") is None
+
+
+def test_expired_lease_is_redelivered(queue):
+    queue.publish("order.placed", {"order_id": "ORD-00000001"})
+    first = queue.claim("crashed-worker")
+    assert queue.claim("w2") is None
+    time.sleep(1.1)
+
+    second = queue.claim("w2")
+    assert second["id"] == first["id"]
+    assert second["attempts"] == 2
+    assert queue.complete(second, "w2")
+    # the original worker finishing late does not complete it twice
+    assert not queue.complete(first, "crashed-worker")
+
+
+def test_late_worker_cannot_touch_a_reclaimed_event(queue):
+    queue.publish("order.placed", {"order_id": "ORD-00000001"})
+    first = queue.claim("slow-worker")
+    time.sleep(1.1)
+    second = queue.claim("w2")
+
+    # neither releasing nor completing it takes the event away from w2
+    assert not queue.fail(first, "slow-worker", "boom")
+    assert not queue.complete(first, "slow-worker")
+    assert queue.stats()["topics"]["order.placed"]["in_flight"] == 1
+    assert queue.complete(second, "w2")
+
+
+def test_failed_event_is_retried_then_dead(queue):
+    queue.publish("order.approved", {"order_id": "ORD-00000001"})
+    for attempt in range(1, 4):
+        event = queue.claim("w1")
+        assert event["attempts"] == attempt
+        dead = queue.fail(event, "w1", "boom")
+        assert dead == (attempt == 3)
+    assert queue.claim("w1") is None
+    assert queue.stats()["topics"]["order.approved"]["dead"] == 1
+
+
+def test_dedupe_while_unclaimed(queue):
+    assert queue.publish("aggregates.refresh", {}, "aggregates.refresh") is not None
+    assert queue.publish("aggregates.refresh", {}, "aggregates.refresh") is None
+
+    event = queue.claim("w1")
+    # once claimed, a new refresh may queue up behind it
+    assert queue.publish("aggregates.refresh", {}, "aggregates.refresh") is not None
+    queue.complete(event, "w1")
+    assert queue.claim("w1") is not None
+    assert queue.claim("w1") is None
+
+
+def test_failed_duplicate_is_superseded(queue):
+    queue.publish("aggregates.refresh", {}, "aggregates.refresh")
+    event = queue.claim("w1")
+    queue.publish("aggregates.refresh", {}, "aggregates.refresh")
+    assert not queue.fail(event, "w1", "boom")
+    waiting = queue.claim("w2")
+    assert waiting["id"] != event["id"]
+    assert queue.claim("w2") is None
@@ -0,0 +1,49 @@
+import io
+
+from PIL import Image, ImageDraw
+
+from backend.utils.image_processing import ImageResultCache, image_fingerprint, preprocess_image
+
+
+def _shopping_list(lines) -> bytes:
+    """A photographed-list stand-in: same form and layout, different handwriting."""
+    img = Image.new("RGB", (600, 800), "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((20, 20, 580, 780), outline="black", width=4)
+    for i, line in enumerate(lines):
+        draw.text((60, 80 + 60 * i), line, fill="black")
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return preprocess_image(out.getvalue())["data"]
+
+
+MESSAGES = [{"role": "user", "content": "What do I need?"}]
+
+
+def test_distinct_lists_do_not_share_a_result():
+    first = image_fingerprint(_shopping_list(["50x Schraube TX20 4x40", "2 Silikon transparent"]))
+    second = image_fingerprint(_shopping_list(["10 Schutzbrille klar", "3 Zollstock"]))
+    cache = ImageResultCache()
+    cache.store(first["content_hash"], MESSAGES, {"items": ["C001"]}, phash=first["phash"])
+
+    assert cache.lookup(second["content_hash"], MESSAGES, phash=second["phash"]) is None
+    assert cache.lookup(first["content_hash"], MESSAGES, phash=first["phash"]) == {"items": ["C001"]}
+
+
+def test_same_image_needs_same_conversation_and_scope():
+    image = image_fingerprint(_shopping_list(["Zollstock"]))
+    cache = ImageResultCache()
+    cache.store(image["content_hash"], MESSAGES, {"items": ["C047"]}, scope="site-a")
+
+    assert cache.lookup(image["content_hash"], MESSAGES, scope="site-b") is None
+    assert cache.lookup(image["content_hash"], MESSAGES + [{"role": "user", "content": "more"}],
+                        scope="site-a") is None
+    assert cache.lookup(image["content_hash"], MESSAGES, scope="site-a") == {"items": ["C047"]}
+
+
+def test_cached_result_is_a_copy():
+    image = image_fingerprint(_shopping_list(["Zollstock"]))
+    cache = ImageResultCache()
+    cache.store(image["content_hash"], MESSAGES, {"items": ["C047"]})
+    cache.lookup(image["content_hash"], MESSAGES)["items"].append("C001")
+    assert cache.lookup(image["content_hash"], MESSAGES) == {"items": ["C047"]}
@@ -0,0 +1,30 @@
+import base64
+import io
+
+from PIL import Image
+
+
+def _png(width: int, height: int) -> str:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), "white").save(out, format="PNG")
+    return base64.b64encode(out.getvalue()).decode("ascii")
+
+
+def test_upload_normalizes_and_dedupes(api):
+    image = _png(40, 30)
+    first = api.post("/upload_image", json={"image_base64": image, "media_type": "image/png"})
+    assert first.status_code == 200
+    second = api.post("/upload_image", json={"image_base64": image, "media_type": "image/png"})
+    assert second.json()["image_id"] == first.json()["image_id"]
+
+
+def test_corrupt_image_is_rejected(api):
+    corrupt = base64.b64encode(b"\x89PNG\r\n\x1a\n" + b"not really a png" * 10).decode("ascii")
+    response = api.post("/upload_image", json={"image_base64": corrupt, "media_type": "image/png"})
+    assert response.status_code == 400
+
+
+def test_decompression_bomb_is_rejected(api, monkeypatch):
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    response = api.post("/upload_image", json={"image_base64": _png(100, 100), "media_type": "image/png"})
+    assert response.status_code == 400
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import anthropic
+import httpx
+import pytest
+
+from backend.utils import resilience
+from backend.utils.admission import admission
+from backend.utils.resilience import CircuitBreaker, DeadlineExceeded, LatencyWindow, ProviderUnavailable, hedged_call
+
+
+def _connection_error():
+    return anthropic.APIConnectionError(request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+
+
+class Attempts:
+    """attempt(timeout) stand-in answering from a script: exceptions are raised, callables run, values returned."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, timeout):
+        with self._lock:
+            step = self.script[min(self.calls, len(self.script) - 1)]
+            self.calls += 1
+        if isinstance(step, BaseException):
+            raise step
+        return step() if callable(step) else step
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(resilience, "breaker", CircuitBreaker(failures=5, cooldown=30))
+    monkeypatch.setattr(resilience, "latencies", LatencyWindow())
+    monkeypatch.setattr(resilience, "RETRY_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(resilience, "RETRY_MIN_REMAINING", 0.0)
+    monkeypatch.setitem(resilience.ROUTE_DEADLINES, "test_route", 2.0)
+    yield
+    # every attempt gave its admission slot back
+    for _ in range(100):
+        if admission.stats()["in_flight"] == 0:
+            break
+        time.sleep(0.02)
+    assert admission.stats()["in_flight"] == 0
+
+
+def _call(attempt, function="test_route"):
+    admission.acquire("interactive")  # like call_llm: the slot passes to the first attempt
+    return hedged_call(function, attempt)
+
+
+def test_provider_error_is_retried():
+    attempt = Attempts(_connection_error(), "ok")
+    assert _call(attempt) == "ok"
+    assert attempt.calls == 2
+
+
+def test_retries_are_bounded(monkeypatch):
+    monkeypatch.setattr(resilience, "LLM_MAX_RETRIES", 2)
+    attempt = Attempts(_connection_error())
+    with pytest.raises(anthropic.APIConnectionError):
+        _call(attempt)
+    assert attempt.calls == 3
+
+
+def test_request_errors_are_not_retried():
+    attempt = Attempts(ValueError("bad request"), "ok")
+    with pytest.raises(ValueError):
+        _call(attempt)
+    assert attempt.calls == 1
+
+
+def test_no_retry_once_the_breaker_opened(monkeypatch):
+    monkeypatch.setattr(resilience, "breaker", CircuitBreaker(failures=1, cooldown=30))
+    attempt = Attempts(_connection_error(), "ok")
+    with pytest.raises(anthropic.APIConnectionError):
+        _call(attempt)
+    assert attempt.calls == 1
+    with pytest.raises(ProviderUnavailable):
+        resilience.breaker.before_call()
+
+
+def test_abandoned_attempt_keeps_its_slot(monkeypatch):
+    monkeypatch.setitem(resilience.ROUTE_DEADLINES, "test_route", 0.2)
+    attempt = Attempts(lambda: time.sleep(0.6) or "late")
+    with pytest.raises(DeadlineExceeded):
+        _call(attempt)
+    assert admission.stats()["in_flight"] == 1
+    time.sleep(0.6)
+    assert admission.stats()["in_flight"] == 0
+
+
+def test_deadline_counts_from_the_call():
+    admission.acquire("interactive")
+    with pytest.raises(DeadlineExceeded):
+        hedged_call("test_route", Attempts("ok"), started=time.monotonic() - 5)
+
+
+def test_slow_call_is_hedged(monkeypatch):
+    monkeypatch.setattr(resilience, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(resilience, "HEDGE_MIN_DELAY", 0.05)
+    for _ in range(resilience.HEDGE_MIN_SAMPLES):
+        resilience.latencies.add("test_route", 0.01)
+    attempt = Attempts(lambda: time.sleep(0.5) or "primary", "hedge")
+    started = time.monotonic()
+    assert _call(attempt) == "hedge"
+    assert time.monotonic() - started < 0.4
+    assert resilience.HEDGES._values[("test_route", "hedge")] >= 1
+
+
+def test_breaker_opens_and_recovers(monkeypatch):
+    breaker = CircuitBreaker(failures=2, cooldown=0.1)
+    breaker.failure()
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "open"
+    with pytest.raises(ProviderUnavailable):
+        breaker.before_call()
+
+    time.sleep(0.15)
+    breaker.before_call()  # the half-open trial call
+    with pytest.raises(ProviderUnavailable):
+        breaker.before_call()  # only one trial at a time
+    breaker.success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failures=1, cooldown=0.05)
+    breaker.failure()
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.failure()
+    assert breaker.state == "open"
@@ -0,0 +1,83 @@
+import multiprocessing
+
+import pytest
+
+from backend.utils.shared_stock import MAX_STOCK, SharedStock
+
+ARTICLES = ["C001", "C002", "C003"]
+
+
+def _initial_stock(article_ids):
+    return [100] * len(article_ids)
+
+
+def _take_out(path, count):
+    stock = SharedStock(ARTICLES, _initial_stock, path)
+    for _ in range(count):
+        stock.adjust("C001", -1)
+
+
+def test_adjust_across_processes(tmp_path):
+    path = str(tmp_path / "stock.state")
+    stock = SharedStock(ARTICLES, _initial_stock, path)
+    version = stock.version()
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_take_out, args=(path, 20)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    # every adjustment of every process is seen here, and none got lost
+    assert stock.get("C001") == 20
+    assert stock.version() == version + 80
+    stock.adjust("C001", 30)
+    assert SharedStock(ARTICLES, _initial_stock, path).get("C001") == 50
+
+
+def test_changes_since(tmp_path):
+    stock = SharedStock(ARTICLES, _initial_stock, str(tmp_path / "stock.state"))
+    version = stock.version()
+    stock.set("C002", 7)
+    current, changed = stock.changes_since(version)
+    assert current == version + 1
+    assert changed == [(1, 7)]
+    assert stock.changes_since(current)[1] == []
+
+
+def test_adjust_floors_at_zero(tmp_path):
+    stock = SharedStock(ARTICLES, _initial_stock, str(tmp_path / "stock.state"))
+    stock.adjust("C003", -500)
+    assert stock.get("C003") == 0
+
+
+def test_out_of_range_stock_is_rejected(tmp_path):
+    stock = SharedStock(ARTICLES, _initial_stock, str(tmp_path / "stock.state"))
+    version = stock.set("C001", MAX_STOCK)
+    with pytest.raises(ValueError):
+        stock.adjust("C001", 1)
+    with pytest.raises(ValueError):
+        stock.set("C002", MAX_STOCK + 1)
+    assert stock.get("C001") == MAX_STOCK
+    assert stock.version() == version
+
+
+def test_stock_endpoint_answers_400_beyond_int32(api):
+    response = api.post("/stock", json={"artikel_id": "C001", "lagerbestand": 2 ** 40})
+    assert response.status_code == 400
+    assert api.post("/stock", json={"artikel_id": "C001", "lagerbestand": 5}).json()["lagerbestand"] == 5
+    assert api.post("/stock", json={"artikel_id": "C001", "delta": MAX_STOCK}).status_code == 400
+
+
+def test_reseeded_when_the_catalog_source_changes(tmp_path):
+    path = str(tmp_path / "stock.state")
+    stock = SharedStock(ARTICLES, _initial_stock, path, source=b"catalog v1")
+    stock.set("C001", 1)
+    epoch = stock.epoch()
+
+    assert SharedStock(ARTICLES, _initial_stock, path, source=b"catalog v1").get("C001") == 1
+    reopened = SharedStock(ARTICLES, _initial_stock, path, source=b"catalog v2")
+    assert reopened.get("C001") == 100
+    assert reopened.epoch() != epoch
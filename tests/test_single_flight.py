@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from backend.utils.single_flight import SingleFlight
+
+
+def _wait_for_waiters(flights, count):
+    deadline = time.monotonic() + 2
+    while flights.stats().get("chat", {}).get("coalesced", 0) < count:
+        assert time.monotonic() < deadline, "callers did not join the flight"
+        time.sleep(0.005)
+
+
+def _run_concurrently(flights, key, fn, callers):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flights.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_identical_calls_share_one_execution():
+    flights = SingleFlight()
+    release = threading.Event()
+    executed = []
+
+    def agent():
+        executed.append(1)
+        release.wait(2)
+        return {"items": [{"artikel_id": "C001", "anzahl": 5}]}
+
+    threads, results, errors = _run_concurrently(flights, ("chat", "same prompt"), agent, 5)
+    _wait_for_waiters(flights, 4)
+    assert flights.stats()["chat"]["in_flight"] == 1
+    release.set()
+    for thread in threads:
+        thread.join(2)
+
+    assert executed == [1]
+    assert errors == [] and len(results) == 5
+    # every caller owns its copy
+    results[0]["items"][0]["anzahl"] = 99
+    assert results[1]["items"][0]["anzahl"] == 5
+    assert flights.stats() == {"chat": {"calls": 1, "coalesced": 4}}
+
+
+def test_errors_reach_every_waiter_and_the_next_call_runs_again():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(2)
+        raise RuntimeError("provider down")
+
+    threads, results, errors = _run_concurrently(flights, ("chat", "x"), failing, 3)
+    _wait_for_waiters(flights, 2)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert results == [] and [str(e) for e in errors] == ["provider down"] * 3
+
+    assert flights.do(("chat", "x"), lambda: "ok") == "ok"
+    assert flights.stats()["chat"]["calls"] == 2
+
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+    assert flights.do(("chat", "a"), lambda: 1) == 1
+    assert flights.do(("chat", "b"), lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flights.do("plain-key", lambda: int("x"))
+    assert flights.stats() == {"chat": {"calls": 2, "coalesced": 0}, "default": {"calls": 1, "coalesced": 0}}
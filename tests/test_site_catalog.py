@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from backend.utils.request_agent import catalog_article_ids, catalog_prompt_json
+from backend.utils.site_catalog import SiteCatalogs, SiteOverlay, load_site_overlays
+
+ROWS = [
+    {"artikel_id": "C001", "preis_eur": 0.08, "lieferant": "Würth", "is_preferred": True, "lead_time_days": 2,
+     "typische_baustelle": "Hochbau"},
+    {"artikel_id": "C004", "preis_eur": 0.10, "lieferant": "Fischer", "is_preferred": True, "lead_time_days": 3,
+     "typische_baustelle": "Innenausbau"},
+    {"artikel_id": "C027", "preis_eur": 6.50, "lieferant": "Tesa", "is_preferred": False, "lead_time_days": 5,
+     "typische_baustelle": "Alle"},
+]
+
+
+def test_overlay_copies_only_changed_rows():
+    overlay = SiteOverlay("muc", baustellen=["Hochbau"], prices={"C001": 0.07, "C027": 6.50},
+                          preferred_suppliers=["Würth"], lead_times={"Tesa": 1})
+    view = overlay.apply(ROWS)
+
+    assert [row["artikel_id"] for row in view] == ["C001", "C027"]  # "Alle" rows stay on every site
+    assert view[0] == {**ROWS[0], "preis_eur": 0.07}
+    assert view[1]["lead_time_days"] == 1 and view[1]["preis_eur"] == 6.50
+    assert ROWS[0]["preis_eur"] == 0.08  # base rows untouched
+
+    untouched = SiteOverlay("plain").apply(ROWS)
+    assert all(a is b for a, b in zip(untouched, ROWS))
+
+
+def test_views_are_cached_per_snapshot():
+    sites = SiteCatalogs({"muc": SiteOverlay("muc", prices={"C001": 0.07})}, size=2)
+    assert sites.view(None, ROWS) is ROWS
+    view = sites.view("muc", ROWS)
+    assert sites.view("muc", ROWS) is view
+
+    snapshot = [dict(row) for row in ROWS]  # e.g. after a stock change
+    assert sites.view("muc", snapshot) is not view
+    stats = sites.stats()
+    assert (stats["hits"], stats["builds"], stats["copied_rows"]) == (1, 2, 2)
+    with pytest.raises(KeyError):
+        sites.view("unknown", ROWS)
+
+
+def test_prompts_are_compiled_per_view():
+    view = SiteOverlay("ber", baustellen=["Innenausbau"]).apply(ROWS)
+    assert catalog_article_ids(view) == {"C004", "C027"}
+    assert catalog_article_ids(ROWS) == {"C001", "C004", "C027"}
+    assert catalog_prompt_json(view) is catalog_prompt_json(view)
+    assert [row["artikel_id"] for row in json.loads(catalog_prompt_json(view))] == ["C004", "C027"]
+
+
+def test_load_site_overlays(tmp_path):
+    assert load_site_overlays(str(tmp_path / "missing.json")) == {}
+    path = tmp_path / "sites.json"
+    path.write_text(json.dumps({"sites": [{"site_id": "muc", "prices": {"C001": "0.07"}, "lead_times": {"Würth": "1"}}]}))
+    overlay = load_site_overlays(str(path))["muc"]
+    assert overlay.summary() == {"site_id": "muc", "name": "muc", "baustellen": None, "price_overrides": 1,
+                                 "preferred_suppliers": None, "lead_time_overrides": 1}
+    assert overlay.prices == {"C001": 0.07} and overlay.lead_times == {"Würth": 1}
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+
+from backend.utils import request_agent
+from backend.utils.structured_output import (ORDER_TOOL_NAME, QUESTION_TOOL_NAME, StructuredOutputError, extract,
+                                             merge_lines, validate_order)
+
+
+def _tool(name, **payload):
+    return SimpleNamespace(content=[SimpleNamespace(type="tool_use", name=name, input=payload)])
+
+
+def _text(text):
+    return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)])
+
+
+def test_extract_tool_calls_and_legacy_text():
+    assert extract(_tool(QUESTION_TOOL_NAME, question=" Welche Länge? ")) == ("question", "Welche Länge?")
+    assert extract(_tool(ORDER_TOOL_NAME, materials=[], explanation="x")) == (
+        "order", {"materials": [], "explanation": "x"})
+    assert extract(_text("QUESTION: Welche Länge?")) == ("question", "Welche Länge?")
+    assert extract(_text('Here you go:\n```json\n{"materials": [["C001", 5]]}\n```')) == (
+        "order", {"materials": [["C001", 5]]})
+    with pytest.raises(StructuredOutputError):
+        extract(_text("Sorry, I cannot help with that."))
+
+
+def test_validate_order_splits_lines():
+    order = {"materials": [{"artikel_id": "c001", "quantity": "5"}, ["C999", 2], ["C002", 0], "junk"]}
+    valid, invalid = validate_order(order, {"C001", "C002"})
+    assert valid == [["C001", 5]]
+    assert [line["problem"] for line in invalid] == [
+        "unknown artikel_id", "quantity must be a positive integer", "unreadable line 'junk'"]
+
+
+def test_merge_lines():
+    assert merge_lines([["C001", 5], ["C002", 1], ["C001", 3]]) == [["C001", 8], ["C002", 1]]
+    assert merge_lines([["Schraube", None]]) == [["Schraube", None]]
+
+
+@pytest.fixture
+def repair_llm(monkeypatch):
+    """call_llm answering the repair call with the given order lines."""
+    answers = []
+
+    def call_llm(client, function, route_text=None, **kwargs):
+        assert function == "repair_order"
+        return _tool(ORDER_TOOL_NAME, materials=answers.pop(0), explanation="")
+
+    monkeypatch.setattr(request_agent, "call_llm", call_llm)
+    return answers
+
+
+def test_repaired_line_is_merged_with_the_order(catalog, repair_llm):
+    repair_llm.append([{"artikel_id": "C001", "quantity": 10}])
+    response = _tool(ORDER_TOOL_NAME, explanation="Schrauben",
+                     materials=[{"artikel_id": "C001", "quantity": 50}, {"artikel_id": "C0001", "quantity": 10}])
+    kind, order = request_agent.structured_result(None, "test_fn", response, catalog)
+    assert kind == "order"
+    assert order["materials"] == [["C001", 60]]
+    assert order["explanation"] == "Schrauben"
+
+
+def test_failed_repair_reports_unresolved_lines(catalog, repair_llm):
+    repair_llm.append([])
+    response = _tool(ORDER_TOOL_NAME, explanation="Dübel",
+                     materials=[{"artikel_id": "C004", "quantity": 20}, {"artikel_id": "C004", "quantity": -1}])
+    _, order = request_agent.structured_result(None, "test_fn", response, catalog)
+    assert order["materials"] == [["C004", 20]]
+    assert "Not ordered" in order["explanation"] and "C004 x-1" in order["explanation"]
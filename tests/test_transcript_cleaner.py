@@ -0,0 +1,50 @@
+import pytest
+
+from backend.utils import request_agent
+from backend.utils.transcript_cleaner import clean_transcript, german_number, normalize_numbers
+
+
+@pytest.mark.parametrize("word, value", [
+    ("fünfzig", 50), ("einundzwanzig", 21), ("zweihundertfünfzig", 250), ("dutzend", 12), ("schraube", None),
+])
+def test_german_number(word, value):
+    assert german_number(word) == value
+
+
+def test_numbers_and_sizes():
+    assert normalize_numbers("twenty-five WD-40 und eins komma fünf") == "25 WD-40 und 1.5"
+    assert normalize_numbers("vier mal vierzig") == "4x40"
+
+
+@pytest.mark.parametrize("raw, cleaned", [
+    ("Äh hallo, ich bräuchte fünfzig Schrauben vier mal vierzig und zwei Silikon bitte", "50 Schrauben 4x40, 2 Silikon"),
+    ("twenty-five screws and ten liter paint please", "25 screws, 10L paint"),
+])
+def test_clean_list_stays_local(raw, cleaned):
+    result = clean_transcript(raw)
+    assert result == {"cleaned": cleaned, "ambiguous": False, "reasons": []}
+
+
+@pytest.mark.parametrize("raw, reason", [
+    ("ähm ein paar Dübel", "vague_or_corrected"),
+    ("zehn Dübel, nein doch nicht, zwanzig", "vague_or_corrected"),
+    ("wir müssen morgen die Wand im zweiten Stock verputzen", "sentence"),
+    ("also äh bitte", "empty"),
+    (" ".join(["Schraube"] * 41), "too_long"),
+])
+def test_ambiguous_transcripts(raw, reason):
+    result = clean_transcript(raw)
+    assert result["ambiguous"]
+    assert reason in result["reasons"]
+
+
+def test_only_ambiguous_transcripts_reach_the_llm(monkeypatch):
+    asked = []
+    monkeypatch.setattr(request_agent, "_clean_voice_transcript_llm", lambda raw: asked.append(raw) or "20 Dübel")
+    escalations = request_agent.TRANSCRIPT_ESCALATIONS._values.get(("sentence",), 0)
+
+    assert request_agent.clean_voice_transcript("zehn Dübel bitte") == "10 Dübel"
+    assert asked == []
+    assert request_agent.clean_voice_transcript("wir müssen die Wand dübeln") == "20 Dübel"
+    assert asked == ["wir müssen die Wand dübeln"]
+    assert request_agent.TRANSCRIPT_ESCALATIONS._values[("sentence",)] == escalations + 1